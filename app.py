@@ -1,13 +1,26 @@
 import os
 import json
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
+import hmac
+import math
+import time
+import threading
+from flask import Flask, Response, render_template, request, redirect, url_for, session, flash, jsonify
 from dotenv import load_dotenv
 from barcode_sync import send_sql_query
-from job_manager import get_job_manager, initialize_jobs
+from job_manager import get_job_controller, initialize_jobs, start_scheduler
+from scheduler_leader import SchedulerUnavailable, describe_leadership
+from sap_budget import sap_consumer
+from dead_letter import list_dead_letters, retry_items
+from priority_sync import (normalise_item_codes, max_items, inline_limit, inline_timeout, take_rate_tokens,
+                           start_priority_sync, get_priority_sync, wait_for_priority_sync)
+from sync_logging import setup_logging
 
 # Load environment variables
 load_dotenv()
 
+# Web process logs go to web_ui.log - the job log files belong to the job processes
+setup_logging('web_ui')
+
 app = Flask(__name__)
 app.secret_key = os.getenv('FLASK_SECRET_KEY', 'your-default-secret-key')
 
@@ -18,6 +31,26 @@ WEB_PASSWORD = os.getenv('WEB_PASSWORD', 'd1sapsync2024')
 # Initialize background jobs (must be after app creation for logging to work)
 initialize_jobs()
 
+_scheduler_pid = None
+
+@app.before_request
+def ensure_scheduler():
+    """Join scheduler leader election from the serving process (never the gunicorn master), once"""
+    global _scheduler_pid
+    if _scheduler_pid == os.getpid():
+        return
+    _scheduler_pid = os.getpid()
+    try:
+        start_scheduler()
+    except Exception as e:
+        # Serve the UI regardless - job pages report the scheduler as unavailable
+        app.logger.error(f"❌ Could not start the scheduler in this process: {e}")
+
+@app.errorhandler(SchedulerUnavailable)
+def scheduler_unavailable(e):
+    """Report an unreachable scheduler leader instead of a generic 500"""
+    return jsonify({'error': str(e)}), 503
+
 def login_required(f):
     """Decorator to require login for protected routes"""
     def decorated_function(*args, **kwargs):
@@ -64,6 +97,13 @@ def query_page():
     """Main SQL query interface"""
     return render_template('query.html', username=session.get('username'))
 
+def record_console_query(duration_seconds, rows, status):
+    """Report a console query to the metrics (kept by the scheduler leader)"""
+    try:
+        get_job_controller().record_console_query(duration_seconds, rows, status)
+    except SchedulerUnavailable:
+        pass
+
 @app.route('/execute_query', methods=['POST'])
 @login_required
 def execute_query():
@@ -77,8 +117,13 @@ def execute_query():
                 'error': 'No query provided'
             })
 
-        # Execute the query
-        result = send_sql_query(query)
+        # Execute the query - console queries go ahead of queued job calls in the SAP request budget
+        started = time.perf_counter()
+        with sap_consumer('console', 'interactive'):
+            result = send_sql_query(query)
+        record_console_query(time.perf_counter() - started,
+                             len(result) if isinstance(result, list) else 0,
+                             'success' if result is not None else 'error')
 
         if result is not None:
             # Convert result to a more manageable format
@@ -151,15 +196,126 @@ def sample_queries():
 @login_required
 def get_jobs():
     """Get status of all background jobs"""
-    job_manager = get_job_manager()
+    job_manager = get_job_controller()
     jobs = job_manager.get_all_jobs_status()
     return jsonify({'jobs': jobs})
 
+@app.route('/api/jobs/graph')
+@login_required
+def get_job_graph():
+    """Get the job dependency graph and its critical path"""
+    return jsonify({'graph': get_job_controller().get_dependency_graph()})
+
+def _parse_event_cursor(value):
+    """
+    Per-job log cursors [buffer epoch, sequence number] from an event id like
+    'barcode_sync=3f2a9c1e.120;staff_sync=3f2a9c1e.33'
+    """
+    cursors = {}
+    for part in (value or '').split(';'):
+        job_id, _, position = part.partition('=')
+        epoch, _, seq = position.rpartition('.')
+        if job_id and seq.isdigit():
+            cursors[job_id] = [epoch, int(seq)]
+    return cursors
+
+def _format_event_cursor(cursors):
+    return ';'.join(f"{job_id}={epoch}.{seq}" for job_id, (epoch, seq) in sorted(cursors.items()))
+
+def _sse_event(event, data, event_id=None):
+    lines = [f"event: {event}"]
+    if event_id:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data, default=str)}")
+    return '\n'.join(lines) + '\n\n'
+
+# Each open event stream holds a gunicorn thread; capping them per process keeps
+# threads free for every other request
+_event_streams = threading.BoundedSemaphore(max(1, int(os.getenv('SSE_MAX_STREAMS', 4))))
+
+@app.route('/api/jobs/events')
+@login_required
+def stream_job_events():
+    """
+    Server-Sent Events stream of job status changes and new log entries
+    ?logs=job_a,job_b picks the jobs whose logs are streamed; the event id carries each
+    job's log buffer epoch and last sequence number, so a reconnect (Last-Event-ID, or
+    ?cursor= when the page reconnects itself) resumes without gaps or repeats - or, when
+    the buffer is a different one (restart, leadership move), starts over with reset
+    """
+    if not _event_streams.acquire(blocking=False):
+        # Every stream slot is taken - have the browser come back later rather than hold a thread
+        retry_seconds = int(os.getenv('SSE_BUSY_RETRY_SECONDS', 30))
+        return Response(f'retry: {retry_seconds * 1000}\n\n' + _sse_event('busy', {'retry_seconds': retry_seconds}),
+                        mimetype='text/event-stream', headers={'Cache-Control': 'no-cache'})
+
+    log_jobs = [job_id for job_id in request.args.get('logs', '').split(',') if job_id]
+    resume = _parse_event_cursor(request.headers.get('Last-Event-ID') or request.args.get('cursor'))
+    max_seconds = float(os.getenv('SSE_MAX_STREAM_SECONDS', 300))
+
+    def generate():
+        job_manager = get_job_controller()
+        # New subscriptions have no epoch, so the first update starts them with the recent tail
+        cursors = {job_id: resume.get(job_id, ['', 0]) for job_id in log_jobs}
+        # Reconnect after 2s; the stream also ends itself after max_seconds so it never pins a thread for long
+        yield 'retry: 2000\n\n'
+
+        try:
+            last_status = None
+            last_budget = None
+            last_status_check = 0.0
+            last_sent = time.monotonic()
+            change_seq = -1
+            started = time.monotonic()
+            while time.monotonic() - started < max_seconds:
+                now = time.monotonic()
+                if now - last_status_check >= 1.0:
+                    last_status_check = now
+                    jobs = job_manager.get_all_jobs_status()
+                    # Log buffer counters move with every line - they alone don't make a status change
+                    snapshot = [{key: value for key, value in job.items() if key not in ('log_count', 'log_buffer')}
+                                for job in jobs]
+                    if snapshot != last_status:
+                        last_status = snapshot
+                        last_sent = now
+                        yield _sse_event('status', {'jobs': jobs})
+
+                    budget = job_manager.get_sap_budget()
+                    # Hold times tick every second - only who holds a slot counts as a change
+                    budget_snapshot = (budget['in_use'], budget['waiting'],
+                                       [(holder['slot'], holder['consumer'], holder['pid']) for holder in budget['holders']])
+                    if budget_snapshot != last_budget:
+                        last_budget = budget_snapshot
+                        last_sent = now
+                        yield _sse_event('budget', budget)
+
+                updates = job_manager.wait_for_updates(cursors, change_seq, 5.0)
+                change_seq = updates['change_seq']
+                for job_id, entries in updates['logs'].items():
+                    reset = job_id in updates['reset']
+                    cursors[job_id] = [updates['epochs'][job_id], max([entry.get('seq', 0) for entry in entries] or [0])]
+                    last_sent = time.monotonic()
+                    yield _sse_event('log', {'job_id': job_id, 'logs': entries, 'reset': reset},
+                                     _format_event_cursor(cursors))
+
+                if time.monotonic() - last_sent > 15:
+                    # Comment line keeps proxies from closing an idle stream
+                    last_sent = time.monotonic()
+                    yield ': keepalive\n\n'
+        except SchedulerUnavailable as e:
+            yield _sse_event('unavailable', {'error': str(e)})
+
+    response = Response(generate(), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+    # Runs once the stream ends, also when the client went away mid-stream
+    response.call_on_close(_event_streams.release)
+    return response
+
 @app.route('/api/jobs/<job_id>')
 @login_required
 def get_job(job_id):
     """Get status of a specific job"""
-    job_manager = get_job_manager()
+    job_manager = get_job_controller()
     job = job_manager.get_job_status(job_id)
     if job:
         return jsonify({'job': job})
@@ -170,16 +326,91 @@ def get_job(job_id):
 @login_required
 def get_job_logs(job_id):
     """Get logs for a specific job"""
-    job_manager = get_job_manager()
+    job_manager = get_job_controller()
     lines = request.args.get('lines', 100, type=int)
-    logs = job_manager.get_job_logs(job_id, lines)
+    if 'before' in request.args:
+        # Entries from the log file: ?before= for the newest page, then the returned cursor to page back
+        before = request.args.get('before') or None
+        return jsonify(job_manager.get_log_history(job_id, min(max(lines, 1), 1000), before))
+    # ?since=<seq> returns only entries newer than the last one the client has seen
+    since = request.args.get('since', type=int)
+    logs = job_manager.get_job_logs(job_id, lines, since)
     return jsonify({'logs': logs})
 
+@app.route('/api/jobs/<job_id>/history')
+@login_required
+def get_job_history(job_id):
+    """Get a job's run duration and throughput trends from the run history"""
+    job_manager = get_job_controller()
+    days = min(max(request.args.get('days', 30, type=int), 1), 365)
+    trends = job_manager.get_run_trends(job_id, days)
+    if trends is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(trends)
+
+@app.route('/api/jobs/<job_id>/dead-letters')
+@login_required
+def get_job_dead_letters(job_id):
+    """Get the items a job has parked in the dead letter queue"""
+    if not get_job_controller().get_job_status(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    limit = min(max(request.args.get('limit', 200, type=int), 1), 1000)
+    dead_letters = list_dead_letters(job_id, limit)
+    if dead_letters is None:
+        return jsonify({'error': 'Dead letter queue unavailable'}), 503
+    return jsonify(dead_letters)
+
+@app.route('/api/jobs/<job_id>/dead-letters/retry', methods=['POST'])
+@login_required
+def retry_job_dead_letters(job_id):
+    """Make parked items due on the job's next run (the listed item_ids, or all of them)"""
+    if not get_job_controller().get_job_status(job_id):
+        return jsonify({'error': 'Job not found'}), 404
+    item_ids = (request.get_json(silent=True) or {}).get('item_ids')
+    if item_ids is not None:
+        try:
+            item_ids = [int(item_id) for item_id in item_ids]
+        except (TypeError, ValueError):
+            return jsonify({'error': 'item_ids must be a list of product ids'}), 400
+    retried = retry_items(job_id, item_ids)
+    return jsonify({'message': f'{retried} item(s) will be retried on the next run of {job_id}', 'retried': retried})
+
+@app.route('/api/jobs/<job_id>/trace')
+@login_required
+def get_job_trace(job_id):
+    """Get the slowest spans from a job's last traced run"""
+    job_manager = get_job_controller()
+    limit = min(max(request.args.get('limit', 20, type=int), 1), 200)
+    trace = job_manager.get_slowest_spans(job_id, limit)
+    if trace is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(trace)
+
+@app.route('/api/jobs/<job_id>/profile', methods=['POST'])
+@login_required
+def profile_job(job_id):
+    """Profile the next run of a job"""
+    job_manager = get_job_controller()
+    if job_manager.profile_next_run(job_id):
+        return jsonify({'message': f'Next run of {job_id} will be profiled'})
+    return jsonify({'error': 'Job not found'}), 404
+
+@app.route('/api/jobs/<job_id>/profile')
+@login_required
+def get_job_profile(job_id):
+    """Get the top functions by cumulative time from a job's latest profile"""
+    job_manager = get_job_controller()
+    limit = min(max(request.args.get('limit', 25, type=int), 1), 200)
+    profile = job_manager.get_job_profile(job_id, limit)
+    if profile is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(profile)
+
 @app.route('/api/jobs/<job_id>/start', methods=['POST'])
 @login_required
 def start_job(job_id):
     """Start a background job"""
-    job_manager = get_job_manager()
+    job_manager = get_job_controller()
     success = job_manager.start_job(job_id)
     if success:
         return jsonify({'message': f'Job {job_id} started successfully'})
@@ -190,7 +421,7 @@ def start_job(job_id):
 @login_required
 def stop_job(job_id):
     """Stop a background job"""
-    job_manager = get_job_manager()
+    job_manager = get_job_controller()
     success = job_manager.stop_job(job_id)
     if success:
         return jsonify({'message': f'Job {job_id} stopped successfully'})
@@ -201,13 +432,95 @@ def stop_job(job_id):
 @login_required
 def restart_job(job_id):
     """Restart a background job"""
-    job_manager = get_job_manager()
+    job_manager = get_job_controller()
     success = job_manager.restart_job(job_id)
     if success:
         return jsonify({'message': f'Job {job_id} restarted successfully'})
     else:
         return jsonify({'error': f'Failed to restart job {job_id}'}), 500
 
+@app.route('/api/scheduler')
+@login_required
+def get_scheduler():
+    """Get scheduler leadership state for this process"""
+    return jsonify({'scheduler': describe_leadership()})
+
+@app.route('/api/sap-budget')
+@login_required
+def get_sap_budget():
+    """Get SAP request budget usage (slot holders and queued priorities)"""
+    return jsonify({'budget': get_job_controller().get_sap_budget()})
+
+def priority_sync_client():
+    """
+    Rate-limit key of an authenticated priority sync caller, or None
+    Callers log in to the web UI or send PRIORITY_SYNC_TOKEN as a bearer token
+    """
+    token = os.getenv('PRIORITY_SYNC_TOKEN')
+    supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    if token and supplied and hmac.compare_digest(supplied, token):
+        return 'token'
+    if session.get('logged_in'):
+        return f"user:{session.get('username')}"
+    return None
+
+@app.route('/api/priority-sync', methods=['POST'])
+def priority_sync():
+    """
+    Sync the barcodes of {"item_codes": [...]} now through the express lane
+    Every request runs in its own worker process; small lists that finish within the inline
+    timeout get their per-item results back, anything else gets 202 with a request id to poll
+    """
+    client = priority_sync_client()
+    if not client:
+        return jsonify({'error': 'Unauthorized'}), 401
+
+    item_codes = (request.get_json(silent=True) or {}).get('item_codes')
+    if not isinstance(item_codes, list) or not item_codes:
+        return jsonify({'error': 'item_codes must be a non-empty list of SAP item codes'}), 400
+    item_codes, invalid = normalise_item_codes(item_codes)
+    if invalid:
+        return jsonify({'error': 'Not valid SAP item codes', 'invalid': invalid[:50]}), 400
+    if len(item_codes) > max_items():
+        return jsonify({'error': f'At most {max_items()} item codes per request'}), 400
+
+    wait = take_rate_tokens(client, len(item_codes))
+    if wait:
+        response = jsonify({'error': 'Rate limit exceeded', 'retry_after_seconds': math.ceil(wait)})
+        response.headers['Retry-After'] = str(math.ceil(wait))
+        return response, 429
+
+    request_id = start_priority_sync(item_codes)
+    if len(item_codes) <= inline_limit():
+        outcome = wait_for_priority_sync(request_id, inline_timeout())
+        if outcome is not None:
+            return jsonify(outcome), 200 if outcome['status'] == 'complete' else 500
+
+    return jsonify({'request_id': request_id, 'status': 'running', 'items': len(item_codes),
+                    'status_url': url_for('get_priority_sync_result', request_id=request_id)}), 202
+
+@app.route('/api/priority-sync/<request_id>')
+def get_priority_sync_result(request_id):
+    """Get the progress or per-item results of a background priority sync"""
+    if not priority_sync_client():
+        return jsonify({'error': 'Unauthorized'}), 401
+    result = get_priority_sync(request_id)
+    if result is None:
+        return jsonify({'error': 'Priority sync request not found'}), 404
+    return jsonify(result)
+
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics (requires METRICS_TOKEN as a bearer token when it is set)"""
+    token = os.getenv('METRICS_TOKEN')
+    if token:
+        supplied = request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+        if not hmac.compare_digest(supplied, token):
+            return Response('Unauthorized\n', status=401, mimetype='text/plain')
+
+    body = get_job_controller().render_metrics()
+    return Response(body, content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/jobs')
 @login_required
 def jobs_page():
@@ -1,42 +1,47 @@
 import json
-import requests
+import hashlib
 import os
-import mysql.connector
+import uuid
+import socket
+import time
+import functools
+import multiprocessing
 from mysql.connector import Error
 from dotenv import load_dotenv
-from datetime import datetime, timezone, timedelta
+from datetime import timezone, timedelta
 import logging
+from sync_logging import setup_logging, flush_logging
+from sync_runtime import (connect_mysql, sap_post, sql_literal, emit_status, run_daemon, is_daemon_mode,
+                          stage, timed_run, reset_stage_timings, get_stage_timer)
+from sync_state import lock_sync_state, store_sync_state, RunCheckpoint, checkpoint_interval
+from tracing import get_tracer, start_run_trace, end_run_trace
+from product_index import lookup_product_id, item_code_key, ProductIndexUnavailable
+from dead_letter import (dead_letter_enabled, retry_backoff, ensure_dead_letter_table, parked_condition,
+                         record_failure, resolve_items)
 
 # Load environment variables
 load_dotenv()
 
-# Setup logging with AEST timezone
+# AEST timezone for timestamps
 AEST = timezone(timedelta(hours=10))
 
-class AESTFormatter(logging.Formatter):
-    def formatTime(self, record, datefmt=None):
-        ct = datetime.fromtimestamp(record.created, AEST)
-        if datefmt:
-            s = ct.strftime(datefmt)
-        else:
-            s = ct.strftime('%Y-%m-%d %H:%M:%S')
-        return s
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('barcode_sync.log'),
-        logging.StreamHandler()
-    ]
-)
-
-# Apply AEST formatter to all handlers
-for handler in logging.getLogger().handlers:
-    handler.setFormatter(AESTFormatter('%(asctime)s - %(levelname)s - %(message)s'))
 logger = logging.getLogger(__name__)
 
+SYNC_JOB_NAME = 'barcode_sync'
+
+# Barcode columns in products (barcode, barcode1-3)
+MAX_BARCODES = 4
+
+# Item codes per SAP / MySQL IN (...) query in the batched lookups
+LOOKUP_CHUNK_SIZE = 100
+
+# Columns loaded for every claimed item
+CLAIMED_ITEM_COLUMNS = """
+    id, sap_item_code, barcode, barcode1, barcode2, barcode3,
+    barcode_hash, needs_sync, last_sync_time, sync_version, sync_claimed_by,
+    TIMESTAMPDIFF(HOUR, last_sync_time, NOW()) as hours_since_sync
+"""
+
 def send_sql_query(query):
     """
     Send SQL query to SAP B1 database via proxy
@@ -46,7 +51,7 @@ def send_sql_query(query):
     payload = json.dumps({"query": query})
 
     try:
-        response = requests.post(sql_proxy_url, headers=headers, data=payload)
+        response = sap_post(sql_proxy_url, headers=headers, data=payload)
         if response.status_code == 200:
             data = response.json()
             if "error" in data:
@@ -65,22 +70,24 @@ def get_mysql_connection():
     Get MySQL database connection
     """
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('MYSQL_HOST'),
-            database=os.getenv('MYSQL_DATABASE'),
-            user=os.getenv('MYSQL_USER'),
-            password=os.getenv('MYSQL_PASSWORD')
-        )
+        connection = connect_mysql()
         return connection
     except Error as e:
         logger.error(f"MySQL Connection Error: {e}")
         return None
 
+# Cached once validated so daemon iterations skip the DESCRIBE round trip
+_table_structure_ready = False
+
 def ensure_table_structure():
     """
     Ensure products table has required columns for rolling updates
     Auto-migrates if columns are missing
     """
+    global _table_structure_ready
+    if _table_structure_ready:
+        return True
+
     connection = get_mysql_connection()
     if not connection:
         logger.error("Cannot validate table structure - no database connection")
@@ -109,6 +116,32 @@ def ensure_table_structure():
                 'sql': 'ALTER TABLE products ADD COLUMN sync_version INT DEFAULT 0'
             })
 
+        # Check for barcode fingerprint columns
+        if 'barcode_hash' not in existing_columns:
+            migrations_needed.append({
+                'column': 'barcode_hash',
+                'sql': 'ALTER TABLE products ADD COLUMN barcode_hash CHAR(40) NULL DEFAULT NULL'
+            })
+
+        if 'barcode_changed_time' not in existing_columns:
+            migrations_needed.append({
+                'column': 'barcode_changed_time',
+                'sql': 'ALTER TABLE products ADD COLUMN barcode_changed_time TIMESTAMP NULL DEFAULT NULL'
+            })
+
+        # Check for work claim columns (parallel workers)
+        if 'sync_claimed_by' not in existing_columns:
+            migrations_needed.append({
+                'column': 'sync_claimed_by',
+                'sql': 'ALTER TABLE products ADD COLUMN sync_claimed_by VARCHAR(64) NULL DEFAULT NULL'
+            })
+
+        if 'sync_claim_expires' not in existing_columns:
+            migrations_needed.append({
+                'column': 'sync_claim_expires',
+                'sql': 'ALTER TABLE products ADD COLUMN sync_claim_expires TIMESTAMP NULL DEFAULT NULL'
+            })
+
         # Run migrations if needed
         if migrations_needed:
             logger.info(f"🔧 Table migration needed - adding {len(migrations_needed)} column(s)")
@@ -126,6 +159,24 @@ def ensure_table_structure():
             except Error as index_error:
                 logger.warning(f"Could not add index: {index_error}")
 
+            # Add index for looking up a worker's claimed batch
+            try:
+                cursor.execute("SHOW INDEX FROM products WHERE Key_name = 'idx_sync_claim'")
+                if not cursor.fetchall():
+                    logger.info("   Adding sync claim index")
+                    cursor.execute("ALTER TABLE products ADD INDEX idx_sync_claim (sync_claimed_by)")
+            except Error as index_error:
+                logger.warning(f"Could not add index: {index_error}")
+
+            # Add index for "did anything change" aggregate queries
+            try:
+                cursor.execute("SHOW INDEX FROM products WHERE Key_name = 'idx_barcode_changed'")
+                if not cursor.fetchall():
+                    logger.info("   Adding barcode change index")
+                    cursor.execute("ALTER TABLE products ADD INDEX idx_barcode_changed (barcode_changed_time)")
+            except Error as index_error:
+                logger.warning(f"Could not add index: {index_error}")
+
             connection.commit()
             logger.info("✅ Table migration completed successfully")
 
@@ -146,6 +197,7 @@ def ensure_table_structure():
         else:
             logger.debug("✅ Table structure is up to date")
 
+        _table_structure_ready = True
         return True
 
     except Error as e:
@@ -158,9 +210,17 @@ def ensure_table_structure():
             cursor.close()
             connection.close()
 
-def get_items_to_sync():
+def make_worker_id(worker_index=0):
     """
-    Get items from MySQL that need barcode sync (with rolling update support)
+    Build a worker identity that is unique across hosts and processes
+    """
+    hostname = socket.gethostname()[:40]
+    return f"{hostname}:{os.getpid()}:{worker_index}"
+
+def get_items_to_sync(worker_id):
+    """
+    Claim a batch of items from MySQL that need barcode sync (with rolling update support)
+    Claims are a lease on each row so parallel workers on any host pull disjoint batches
     """
     connection = get_mysql_connection()
     if not connection:
@@ -173,72 +233,88 @@ def get_items_to_sync():
         batch_size = int(os.getenv('BATCH_SIZE', 50))
         rolling_mode = os.getenv('ROLLING_UPDATE_MODE', 'timestamp')
         sync_interval_hours = int(os.getenv('SYNC_INTERVAL_HOURS', 24))
+        lease_seconds = int(os.getenv('BARCODE_SYNC_CLAIM_LEASE', 600))
+
+        # A fresh token per claim so a re-claim after lease expiry never matches an old batch
+        claim_token = f"{worker_id}:{uuid.uuid4().hex[:8]}"[-64:]
+
+        unclaimed = "(sync_claim_expires IS NULL OR sync_claim_expires < NOW())"
+
+        # Items parked in the dead letter queue stay out of batches until their retry is due
+        where_params = []
+        if dead_letter_enabled('BARCODE_SYNC'):
+            parked_sql, where_params = parked_condition(SYNC_JOB_NAME, 'products.id')
+            unclaimed = f"{unclaimed} AND NOT {parked_sql}"
 
         if rolling_mode == 'timestamp':
             # Timestamp-based rolling updates
-            query = f"""
-            SELECT id, sap_item_code, barcode, barcode1, barcode2, barcode3,
-                   last_sync_time, sync_version,
-                   TIMESTAMPDIFF(HOUR, last_sync_time, NOW()) as hours_since_sync
-            FROM products
-            WHERE sap_item_code IS NOT NULL
+            where = f"""
+            sap_item_code IS NOT NULL
               AND sap_item_code != ''
               AND (needs_sync = 1
                    OR last_sync_time IS NULL
                    OR last_sync_time < DATE_SUB(NOW(), INTERVAL {sync_interval_hours} HOUR))
-            ORDER BY needs_sync DESC, COALESCE(last_sync_time, '1970-01-01') ASC
-            LIMIT {batch_size}
+              AND {unclaimed}
             """
+            order_by = "needs_sync DESC, COALESCE(last_sync_time, '1970-01-01') ASC"
 
         elif rolling_mode == 'round_robin':
-            # Round-robin mode - cycle through all items
-            import time
-            current_hour = int(time.time() // 3600)  # Change batch every hour
-
-            # Get total count for offset calculation
-            cursor.execute("""
-                SELECT COUNT(*) as total
-                FROM products
-                WHERE sap_item_code IS NOT NULL AND sap_item_code != ''
-            """)
-            total_items = cursor.fetchone()['total']
-
-            if total_items > 0:
-                offset = (current_hour * batch_size) % total_items
-            else:
-                offset = 0
-
-            query = f"""
-            SELECT id, sap_item_code, barcode, barcode1, barcode2, barcode3,
-                   last_sync_time, sync_version,
-                   TIMESTAMPDIFF(HOUR, last_sync_time, NOW()) as hours_since_sync
-            FROM products
-            WHERE sap_item_code IS NOT NULL AND sap_item_code != ''
-            ORDER BY id
-            LIMIT {batch_size} OFFSET {offset}
+            # Round-robin mode - page through all items by id with a persisted keyset cursor
+            # The cursor row stays locked until this claim commits, so parallel workers take
+            # consecutive pages one after another instead of all starting from the same last_id
+            cursor_state = lock_sync_state(cursor, SYNC_JOB_NAME, 'round_robin_cursor') or {}
+            last_id = int(cursor_state.get('last_id', 0))
+
+            where = f"""
+            sap_item_code IS NOT NULL AND sap_item_code != ''
+              AND id > {last_id}
+              AND {unclaimed}
             """
+            order_by = "id"
 
         else:
             # Fallback to original mode
-            query = f"""
-            SELECT id, sap_item_code, barcode, barcode1, barcode2, barcode3,
-                   last_sync_time, sync_version, NULL as hours_since_sync
-            FROM products
-            WHERE sap_item_code IS NOT NULL
+            where = f"""
+            sap_item_code IS NOT NULL
               AND sap_item_code != ''
               AND needs_sync = 1
-            LIMIT {batch_size}
+              AND {unclaimed}
             """
+            order_by = "id"
+
+        # Claim atomically - concurrent claimers serialise on the row locks
+        # and re-evaluate the claim condition, so batches never overlap
+        cursor.execute(f"""
+            UPDATE products
+            SET sync_claimed_by = %s,
+                sync_claim_expires = DATE_ADD(NOW(), INTERVAL {lease_seconds} SECOND)
+            WHERE {where}
+            ORDER BY {order_by}
+            LIMIT {batch_size}
+        """, (claim_token, *where_params))
 
-        cursor.execute(query)
+        cursor.execute(f"""
+            SELECT {CLAIMED_ITEM_COLUMNS}
+            FROM products
+            WHERE sync_claimed_by = %s
+            ORDER BY {order_by}
+        """, (claim_token,))
         items = cursor.fetchall()
 
+        if rolling_mode == 'round_robin':
+            # A short page means we reached the end - wrap around on the next claim
+            next_id = items[-1]['id'] if len(items) >= batch_size else 0
+            store_sync_state(cursor, SYNC_JOB_NAME, 'round_robin_cursor', {'last_id': next_id})
+
+        # Commit the claim (and the cursor move, which releases the cursor row lock)
+        connection.commit()
+
         # Log rolling update info
         if items:
             priority_items = [item for item in items if item.get('needs_sync') == 1]
             rolling_items = len(items) - len(priority_items)
 
-            logger.info(f"Found {len(items)} items to sync (mode: {rolling_mode})")
+            logger.info(f"Claimed {len(items)} items to sync (mode: {rolling_mode}, worker: {worker_id})")
             if priority_items:
                 logger.info(f"  📌 {len(priority_items)} priority items (needs_sync=1)")
             if rolling_items:
@@ -256,6 +332,65 @@ def get_items_to_sync():
             cursor.close()
             connection.close()
 
+def resume_claims(claim_token):
+    """
+    Re-lease the rows an interrupted run still holds under its claim token
+    Items it finished already had their claim cleared, so only unfinished items come back
+    """
+    connection = get_mysql_connection()
+    if not connection:
+        return []
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        lease_seconds = int(os.getenv('BARCODE_SYNC_CLAIM_LEASE', 600))
+
+        cursor.execute(f"""
+            UPDATE products
+            SET sync_claim_expires = DATE_ADD(NOW(), INTERVAL {lease_seconds} SECOND)
+            WHERE sync_claimed_by = %s
+        """, (claim_token,))
+        connection.commit()
+
+        cursor.execute(f"""
+            SELECT {CLAIMED_ITEM_COLUMNS}
+            FROM products
+            WHERE sync_claimed_by = %s
+            ORDER BY id
+        """, (claim_token,))
+        return cursor.fetchall()
+
+    except Error as e:
+        logger.error(f"Error resuming sync claims for {claim_token}: {e}")
+        return []
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def release_claims(claim_token):
+    """
+    Release any rows still claimed under a claim token (items that failed to sync)
+    """
+    connection = get_mysql_connection()
+    if not connection:
+        return
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute("""
+            UPDATE products
+            SET sync_claimed_by = NULL, sync_claim_expires = NULL
+            WHERE sync_claimed_by = %s
+        """, (claim_token,))
+        connection.commit()
+    except Error as e:
+        logger.error(f"Error releasing sync claims for {claim_token}: {e}")
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
 def get_sap_barcodes(item_code):
     """
     Get all barcodes from SAP B1 for given item code
@@ -290,7 +425,175 @@ def get_sap_barcodes(item_code):
     logger.info(f"Total barcodes found for {item_code}: {len(all_barcodes)} - {all_barcodes}")
     return all_barcodes
 
-def update_mysql_barcodes(item_id, barcodes):
+def get_sap_barcodes_batch(item_codes):
+    """
+    Get all barcodes from SAP B1 for several item codes, one OITM and one OBCD query per chunk
+    Returns {item_code: barcodes} in the order get_sap_barcodes uses; codes missing from OITM
+    are left out, and codes whose chunk failed to query map to None
+    """
+    barcodes_by_code = {}
+
+    for start in range(0, len(item_codes), LOOKUP_CHUNK_SIZE):
+        chunk = item_codes[start:start + LOOKUP_CHUNK_SIZE]
+        in_list = ', '.join(sql_literal(code) for code in chunk)
+
+        items = send_sql_query(f"SELECT ItemCode, ItemName, CodeBars AS DefaultBarcode FROM OITM WHERE ItemCode IN ({in_list})")
+        additional = send_sql_query(f"SELECT ItemCode, BcdCode AS Barcode, BcdName AS BarcodeName, UomEntry FROM OBCD WHERE ItemCode IN ({in_list})") if items else []
+        if items is None or additional is None:
+            logger.error(f"SAP barcode lookup failed for {len(chunk)} item(s) starting at {chunk[0]}")
+            barcodes_by_code.update({code: None for code in chunk})
+            continue
+
+        for row in items:
+            default_barcode = (row.get('DefaultBarcode') or '').strip()
+            barcodes_by_code[row['ItemCode']] = [default_barcode] if default_barcode else []
+
+        for barcode_record in additional:
+            barcodes = barcodes_by_code.get(barcode_record.get('ItemCode'))
+            barcode_clean = (barcode_record.get('Barcode') or '').strip()
+            if barcodes is not None and barcode_clean and barcode_clean not in barcodes:
+                barcodes.append(barcode_clean)
+
+    return barcodes_by_code
+
+def get_products_by_codes(item_codes):
+    """
+    Load the products rows (claimed item columns) of several SAP item codes
+    Ids come from the product index and are read by primary key; without the index the
+    codes are matched directly. Either way codes match like the products collation
+    (see item_code_key). Returns {item_code: row} for the requested codes found
+    """
+    connection = get_mysql_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        try:
+            ids = [product_id for product_id in (lookup_product_id(code) for code in item_codes) if product_id is not None]
+            column, keys = 'id', ids
+        except ProductIndexUnavailable:
+            column, keys = 'sap_item_code', list(item_codes)
+
+        rows = []
+        for start in range(0, len(keys), LOOKUP_CHUNK_SIZE):
+            chunk = keys[start:start + LOOKUP_CHUNK_SIZE]
+            placeholders = ', '.join(['%s'] * len(chunk))
+            cursor.execute(f"SELECT {CLAIMED_ITEM_COLUMNS} FROM products WHERE {column} IN ({placeholders}) ORDER BY id",
+                           tuple(chunk))
+            rows.extend(cursor.fetchall())
+
+        rows_by_key = {}
+        for row in rows:
+            # Duplicate item codes resolve to the lowest id, like the product index
+            rows_by_key.setdefault(item_code_key(row['sap_item_code']), row)
+        return {code: rows_by_key[item_code_key(code)] for code in item_codes if item_code_key(code) in rows_by_key}
+
+    except Error as e:
+        logger.error(f"Error loading products for {len(item_codes)} item code(s): {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def normalise_barcodes(barcodes):
+    """
+    Normalise a barcode list the same way it is written to MySQL
+    Strips whitespace, drops empties and duplicates, keeps slot order
+    """
+    normalised = []
+    for barcode in barcodes:
+        if barcode is None:
+            continue
+        barcode_clean = str(barcode).strip()
+        if barcode_clean and barcode_clean not in normalised:
+            normalised.append(barcode_clean)
+    return normalised
+
+def compute_barcode_hash(barcodes):
+    """
+    Compute content fingerprint for a product's barcode set
+    Order is kept because it decides which barcode column each value lands in
+    """
+    payload = '\x1f'.join(normalise_barcodes(barcodes))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def get_stored_barcode_hash(item):
+    """
+    Get the fingerprint currently stored for a MySQL item
+    Falls back to hashing the barcode columns for items synced before fingerprints existed
+    """
+    if item.get('barcode_hash'):
+        return item['barcode_hash']
+
+    return compute_barcode_hash([
+        item.get('barcode'),
+        item.get('barcode1'),
+        item.get('barcode2'),
+        item.get('barcode3')
+    ])
+
+def claim_condition(expected_version=None, claim_token=None):
+    """
+    Build the compare-and-set WHERE clause for a claimed item write
+    Returns (sql, params) to append after "WHERE id = %s"
+    """
+    sql = ""
+    params = []
+    if expected_version is not None:
+        sql += " AND sync_version = %s"
+        params.append(expected_version)
+    if claim_token is not None:
+        sql += " AND sync_claimed_by = %s"
+        params.append(claim_token)
+    return sql, params
+
+def claim_release(claim_token=None):
+    """
+    SET clause fragment that frees the item's claim, for writes made under a claim token
+    A write without one (a single item sync) leaves another worker's claim in place
+    """
+    if claim_token is None:
+        return ""
+    return ",\n            sync_claimed_by = NULL, sync_claim_expires = NULL"
+
+def mark_item_unchanged(item_id, barcode_hash, expected_version=None, claim_token=None):
+    """
+    Record a sync for an item whose SAP barcodes match MySQL
+    Only touches sync bookkeeping - barcode columns and sync_version are left alone
+    """
+    connection = get_mysql_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+        cas_sql, cas_params = claim_condition(expected_version, claim_token)
+        update_query = f"""
+        UPDATE products
+        SET needs_sync = 0, last_sync_time = NOW(), barcode_hash = %s{claim_release(claim_token)}
+        WHERE id = %s{cas_sql}
+        """
+        cursor.execute(update_query, (barcode_hash, item_id, *cas_params))
+        connection.commit()
+
+        if cursor.rowcount == 0:
+            logger.warning(f"⚠️ Item ID {item_id} was changed by another worker - skipped")
+            return False
+
+        logger.info(f"⏭️  Barcodes unchanged for item ID {item_id} - skipped write")
+        return True
+
+    except Error as e:
+        logger.error(f"Error marking item {item_id} as unchanged: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def update_mysql_barcodes(item_id, barcodes, barcode_hash=None, expected_version=None, claim_token=None):
     """
     Update MySQL product with barcodes from SAP
     """
@@ -310,8 +613,8 @@ def update_mysql_barcodes(item_id, barcodes):
         }
 
         # Check if we have too many barcodes
-        if len(barcodes) > 4:
-            logger.error(f"🚨 CRITICAL: Item ID {item_id} has {len(barcodes)} barcodes! Maximum is 4. Barcodes: {barcodes}")
+        if len(barcodes) > MAX_BARCODES:
+            logger.error(f"🚨 CRITICAL: Item ID {item_id} has {len(barcodes)} barcodes! Maximum is {MAX_BARCODES}. Barcodes: {barcodes}")
             # Send notification (you can implement email/slack notification here)
             return False
 
@@ -330,12 +633,19 @@ def update_mysql_barcodes(item_id, barcodes):
         if len(barcodes) == 0:
             logger.info(f"Clearing all barcode fields for item ID {item_id}")
 
+        if barcode_hash is None:
+            barcode_hash = compute_barcode_hash(barcodes)
+
         # Update the product with rolling update support
-        update_query = """
+        # (compare-and-set on sync_version/claim when called from a claimed batch)
+        cas_sql, cas_params = claim_condition(expected_version, claim_token)
+        update_query = f"""
         UPDATE products
         SET barcode = %s, barcode1 = %s, barcode2 = %s, barcode3 = %s,
-            needs_sync = 0, last_sync_time = NOW(), sync_version = sync_version + 1
-        WHERE id = %s
+            barcode_changed_time = CASE WHEN barcode_hash <=> %s THEN barcode_changed_time ELSE NOW() END,
+            barcode_hash = %s,
+            needs_sync = 0, last_sync_time = NOW(), sync_version = sync_version + 1{claim_release(claim_token)}
+        WHERE id = %s{cas_sql}
         """
 
         cursor.execute(update_query, (
@@ -343,10 +653,18 @@ def update_mysql_barcodes(item_id, barcodes):
             barcode_fields['barcode1'],
             barcode_fields['barcode2'],
             barcode_fields['barcode3'],
-            item_id
+            barcode_hash,
+            barcode_hash,
+            item_id,
+            *cas_params
         ))
 
         connection.commit()
+
+        if cursor.rowcount == 0:
+            logger.warning(f"⚠️ Item ID {item_id} was changed by another worker - skipped")
+            return False
+
         logger.info(f"✅ Updated item ID {item_id} with {len(barcodes)} barcodes")
         return True
 
@@ -383,7 +701,10 @@ def log_sync_analytics(success_count, error_count):
                 THEN TIMESTAMPDIFF(HOUR, last_sync_time, NOW())
                 ELSE NULL END) as avg_hours_since_sync,
             MAX(sync_version) as max_sync_version,
-            AVG(sync_version) as avg_sync_version
+            AVG(sync_version) as avg_sync_version,
+            SUM(CASE WHEN barcode_hash IS NOT NULL THEN 1 ELSE 0 END) as items_with_fingerprint,
+            SUM(CASE WHEN barcode_changed_time > DATE_SUB(NOW(), INTERVAL 24 HOUR) THEN 1 ELSE 0 END) as changed_last_24h,
+            BIT_XOR(CRC32(barcode_hash)) as catalog_fingerprint
         FROM products
         WHERE sap_item_code IS NOT NULL AND sap_item_code != ''
         """
@@ -409,6 +730,10 @@ def log_sync_analytics(success_count, error_count):
             if stats['avg_hours_since_sync']:
                 logger.info(f"   ⏱️  Avg age: {stats['avg_hours_since_sync']:.1f} hours since sync")
 
+            logger.info(f"   🔑 Fingerprinted: {stats['items_with_fingerprint'] or 0}/{total_sap_items}, "
+                        f"changed last 24h: {stats['changed_last_24h'] or 0}, "
+                        f"catalog fingerprint: {int(stats['catalog_fingerprint'] or 0):08x}")
+
             if success_count > 0 or error_count > 0:
                 logger.info(f"   📋 This run: {success_count} success, {error_count} errors")
 
@@ -435,49 +760,230 @@ def log_sync_analytics(success_count, error_count):
             cursor.close()
             connection.close()
 
-def sync_barcodes():
+def park_item(item, reason, detail):
     """
-    Main function to sync barcodes from SAP to MySQL
+    Move a claimed item that cannot be synced to the dead letter queue
+    Returns False if dead-lettering is off or the entry could not be written
     """
-    logger.info("🚀 Starting barcode sync process...")
+    if not dead_letter_enabled('BARCODE_SYNC'):
+        return False
 
-    # Ensure table structure is ready for rolling updates
-    if not ensure_table_structure():
-        logger.error("❌ Table structure validation failed - aborting sync")
-        return
+    base_seconds, max_seconds = retry_backoff('BARCODE_SYNC')
+    attempts = record_failure(SYNC_JOB_NAME, item['id'], item['sap_item_code'], reason, detail,
+                              base_seconds, max_seconds)
+    if attempts is None:
+        return False
 
-    items = get_items_to_sync()
-    if not items:
-        logger.info("No items to sync")
-        return
+    logger.warning(f"📮 Parked {item['sap_item_code']} (ID: {item['id']}) in the dead letter queue: "
+                   f"{reason} (attempt {attempts})",
+                   extra={'item_code': item['sap_item_code'], 'item_id': item['id']})
+    return True
+
+def sync_claimed_item(item, claim_token):
+    """
+    Sync one claimed item from SAP
+    Returns 'updated', 'unchanged', 'dead_letter' or 'error'
+    """
+    item_id = item['id']
+    sap_item_code = item['sap_item_code']
+
+    logger.info(f"Processing item {sap_item_code} (ID: {item_id})",
+                extra={'item_code': sap_item_code, 'item_id': item_id})
+
+    # Get barcodes from SAP
+    sap_barcodes = get_sap_barcodes(sap_item_code)
+
+    if not sap_barcodes:
+        logger.warning(f"No barcodes found in SAP for item {sap_item_code} - clearing existing barcodes")
+        # Clear existing barcodes if no SAP barcodes found
+        sap_barcodes = []
+
+    # Skip the write path entirely when the fingerprint is unchanged
+    barcode_hash = compute_barcode_hash(sap_barcodes)
+    if barcode_hash == get_stored_barcode_hash(item):
+        if mark_item_unchanged(item_id, barcode_hash, item['sync_version'], claim_token):
+            return 'unchanged'
+        return 'error'
+
+    # More barcodes than products can hold fails on every run until SAP is cleaned up - park the item
+    if len(sap_barcodes) > MAX_BARCODES:
+        logger.error(f"🚨 CRITICAL: Item ID {item_id} has {len(sap_barcodes)} barcodes! Maximum is {MAX_BARCODES}. Barcodes: {sap_barcodes}")
+        if park_item(item, 'too_many_barcodes',
+                     f"{len(sap_barcodes)} barcodes in SAP (maximum {MAX_BARCODES}): {', '.join(sap_barcodes)}"):
+            return 'dead_letter'
+        return 'error'
+
+    # Update MySQL with SAP barcodes (or clear if empty)
+    if update_mysql_barcodes(item_id, sap_barcodes, barcode_hash, item['sync_version'], claim_token):
+        return 'updated'
+    return 'error'
+
+def run_sync_worker(worker_index=0):
+    """
+    Claim one batch and sync it
+    Runs in-process for a single worker, or in a child process per worker
+    """
+    worker_id = make_worker_id(worker_index)
+    started = time.time()
 
     success_count = 0
     error_count = 0
+    unchanged_count = 0
+    dead_letter_count = 0
+    synced_ids = []
+
+    # One checkpoint per worker slot, so a restarted worker picks up its own unfinished batch
+    checkpoint = RunCheckpoint(SYNC_JOB_NAME, f"checkpoint:{socket.gethostname()[:40]}:{worker_index}")
+
+    items = []
+    previous = checkpoint.resumed_from
+    if previous and previous.get('claim_token'):
+        with stage('phase.resume'):
+            items = resume_claims(previous['claim_token'])
+        if items:
+            logger.info(f"♻️ Resuming {len(items)} unfinished item(s) from interrupted run {previous.get('run_id')}")
+    if not items:
+        with stage('phase.claim'):
+            items = get_items_to_sync(worker_id)
+    claim_token = items[0]['sync_claimed_by'] if items else None
+
+    checkpoint_every = checkpoint_interval()
+    with stage('phase.checkpoint'):
+        checkpoint.save(claim_token=claim_token, mode=os.getenv('ROLLING_UPDATE_MODE', 'timestamp'),
+                        total=len(items), remaining_ids=[item['id'] for item in items])
+
+    for index, item in enumerate(items):
+        if index and index % checkpoint_every == 0:
+            # Each item write commits on its own, so everything before this one is durable
+            with stage('phase.checkpoint'):
+                checkpoint.save(completed=index, success=success_count, errors=error_count,
+                                last_id=items[index - 1]['id'],
+                                remaining_ids=[pending['id'] for pending in items[index:]])
+
+        with stage('phase.item', item_id=item['id'], item_code=item.get('sap_item_code')) as item_span:
+            outcome = sync_claimed_item(item, claim_token)
+            item_span.set_attribute('outcome', outcome)
+
+        if outcome in ('error', 'dead_letter'):
+            error_count += 1
+            if outcome == 'dead_letter':
+                dead_letter_count += 1
+        else:
+            success_count += 1
+            synced_ids.append(item['id'])
+            if outcome == 'unchanged':
+                unchanged_count += 1
+
+    # Items that synced are done with the dead letter queue (if they were parked before)
+    if synced_ids and dead_letter_enabled('BARCODE_SYNC'):
+        with stage('phase.dead_letter'):
+            resolved = resolve_items(SYNC_JOB_NAME, synced_ids)
+        if resolved:
+            logger.info(f"📬 {resolved} item(s) left the dead letter queue after a successful retry")
+
+    # Hand back anything we couldn't sync so it isn't held until the lease expires
+    if claim_token and error_count:
+        with stage('phase.release'):
+            release_claims(claim_token)
+
+    with stage('phase.checkpoint'):
+        checkpoint.complete(completed=len(items), success=success_count, errors=error_count,
+                            last_id=items[-1]['id'] if items else None, remaining_ids=[])
+
+    duration = time.time() - started
+    return {
+        'worker_id': worker_id,
+        'processed': len(items),
+        'success': success_count,
+        'errors': error_count,
+        'unchanged': unchanged_count,
+        'dead_lettered': dead_letter_count,
+        'duration_seconds': round(duration, 3),
+        'items_per_second': round(len(items) / duration, 2) if duration > 0 else 0.0
+    }
+
+def run_pool_worker(worker_index, trace_context=None):
+    """
+    Pool entry point - runs one worker inside the parent run's trace and hands its
+    stage timings back to the parent
+    """
+    # A spawned pool process starts with logging unconfigured
+    setup_logging(SYNC_JOB_NAME)
+    timer = reset_stage_timings()
+    start_run_trace(SYNC_JOB_NAME, trace_context)
+    try:
+        with stage('worker', worker_index=worker_index):
+            result = run_sync_worker(worker_index)
+    finally:
+        # The parent owns the trace file, so leave retention pruning to it
+        end_run_trace(prune=False)
+        # Pool processes exit without atexit, so write this worker's queued log records now
+        flush_logging()
+    result['stage_samples'] = timer.export()
+    return result
+
+@timed_run(SYNC_JOB_NAME)
+def sync_barcodes():
+    """
+    Main function to sync barcodes from SAP to MySQL
+    """
+    logger.info("🚀 Starting barcode sync process...")
 
-    for item in items:
-        item_id = item['id']
-        sap_item_code = item['sap_item_code']
-
-        logger.info(f"Processing item {sap_item_code} (ID: {item_id})")
+    # Ensure table structure is ready for rolling updates
+    with stage('phase.schema_check'):
+        table_ready = ensure_table_structure()
+        if table_ready and dead_letter_enabled('BARCODE_SYNC'):
+            table_ready = ensure_dead_letter_table()
+    if not table_ready:
+        logger.error("❌ Table structure validation failed - aborting sync")
+        return {'processed': 0, 'success': 0, 'errors': 0, 'unchanged': 0,
+                'aborted': 'table structure validation failed'}
 
-        # Get barcodes from SAP
-        sap_barcodes = get_sap_barcodes(sap_item_code)
+    worker_count = max(1, int(os.getenv('BARCODE_SYNC_WORKERS', 1)))
 
-        if not sap_barcodes:
-            logger.warning(f"No barcodes found in SAP for item {sap_item_code} - clearing existing barcodes")
-            # Clear existing barcodes if no SAP barcodes found
-            sap_barcodes = []
+    if worker_count == 1:
+        worker_results = [run_sync_worker(0)]
+    else:
+        # Each worker claims its own disjoint batch; spawn keeps children free of
+        # any pooled connections held by this process
+        logger.info(f"👷 Starting {worker_count} parallel sync workers")
+        with multiprocessing.get_context('spawn').Pool(worker_count) as pool:
+            tracer = get_tracer()
+            worker = functools.partial(run_pool_worker, trace_context=tracer.context() if tracer else None)
+            worker_results = pool.map(worker, range(worker_count))
+        for r in worker_results:
+            get_stage_timer().merge(r.pop('stage_samples', None))
+
+    processed = sum(r['processed'] for r in worker_results)
+    success_count = sum(r['success'] for r in worker_results)
+    error_count = sum(r['errors'] for r in worker_results)
+    unchanged_count = sum(r['unchanged'] for r in worker_results)
+    dead_letter_count = sum(r['dead_lettered'] for r in worker_results)
+
+    if processed == 0:
+        logger.info("No items to sync")
+        return {'processed': 0, 'success': 0, 'errors': 0, 'unchanged': 0, 'workers': worker_results}
 
-        # Update MySQL with SAP barcodes (or clear if empty)
-        if update_mysql_barcodes(item_id, sap_barcodes):
-            success_count += 1
-        else:
-            error_count += 1
+    if worker_count > 1:
+        for r in worker_results:
+            logger.info(f"   👷 {r['worker_id']}: {r['processed']} items in {r['duration_seconds']:.1f}s "
+                        f"({r['items_per_second']:.2f} items/s, {r['errors']} errors)")
 
-    logger.info(f"🎯 Sync completed: {success_count} successful, {error_count} errors")
+    logger.info(f"🎯 Sync completed: {success_count} successful ({unchanged_count} unchanged), {error_count} errors"
+                + (f" ({dead_letter_count} moved to the dead letter queue)" if dead_letter_count else ""))
 
     # Log rolling update analytics
-    log_sync_analytics(success_count, error_count)
+    with stage('phase.analytics'):
+        log_sync_analytics(success_count, error_count)
+
+    return {
+        'processed': processed,
+        'success': success_count,
+        'errors': error_count,
+        'unchanged': unchanged_count,
+        'dead_lettered': dead_letter_count,
+        'workers': worker_results
+    }
 
 def sync_single_item(sap_item_code):
     """
@@ -492,9 +998,19 @@ def sync_single_item(sap_item_code):
 
     try:
         cursor = connection.cursor(dictionary=True)
-        query = "SELECT id, sap_item_code, barcode, barcode1, barcode2, barcode3 FROM products WHERE sap_item_code = %s"
-        cursor.execute(query, (sap_item_code,))
-        item = cursor.fetchone()
+        try:
+            # Resolve the id through the product index, then read the row by primary key
+            product_id = lookup_product_id(sap_item_code)
+            if product_id is None:
+                item = None
+            else:
+                cursor.execute("SELECT id, sap_item_code, barcode, barcode1, barcode2, barcode3 FROM products WHERE id = %s",
+                               (product_id,))
+                item = cursor.fetchone()
+        except ProductIndexUnavailable:
+            query = "SELECT id, sap_item_code, barcode, barcode1, barcode2, barcode3 FROM products WHERE sap_item_code = %s"
+            cursor.execute(query, (sap_item_code,))
+            item = cursor.fetchone()
 
         if not item:
             logger.error(f"Item {sap_item_code} not found in MySQL")
@@ -522,13 +1038,32 @@ def sync_single_item(sap_item_code):
             cursor.close()
             connection.close()
 
-if __name__ == "__main__":
+def main(argv=None):
+    """
+    Command line entry point
+    Usage: barcode_sync.py [--daemon | SAP_ITEM_CODE]
+    """
     import sys
+    argv = sys.argv[1:] if argv is None else argv
+    # JSON lines to barcode_sync.log and the job output, written off-thread
+    setup_logging(SYNC_JOB_NAME)
 
-    if len(sys.argv) > 1:
+    if is_daemon_mode(argv):
+        # Long-running mode - loop internally with warm connections
+        return run_daemon('barcode_sync', sync_barcodes, int(os.getenv('BARCODE_SYNC_INTERVAL', 300)),
+                          os.getenv('BARCODE_SYNC_QUIET_WINDOWS', os.getenv('SYNC_QUIET_WINDOWS', '')))
+
+    if argv:
         # Test mode with specific item
-        item_code = sys.argv[1]
+        item_code = argv[0]
         sync_single_item(item_code)
-    else:
-        # Full sync
-        sync_barcodes()
\ No newline at end of file
+        return 0
+
+    # Full sync
+    result = sync_barcodes()
+    emit_status('run_complete', job='barcode_sync', result=result)
+    return 0
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
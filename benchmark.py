@@ -0,0 +1,501 @@
+#!/usr/bin/env python3
+"""
+Sync Job Benchmark
+Measures barcode_sync, serial_number_sync and staff_sync against synthetic data
+
+    python benchmark.py generate --products 5000 --barcodes-per-item 2 --serial-share 0.2 --staff 300
+    python benchmark.py run --latency-ms 40 --runs 3 --batch-size 200
+    python benchmark.py compare benchmark_results/<a>.json benchmark_results/<b>.json
+
+SAP is replaced by sap_proxy_standin.py (SQLite + configurable latency) and MySQL by a
+local MySQL-compatible database configured with BENCHMARK_MYSQL_* - never production.
+Each job is run as its own process, exactly as JobManager runs it, and the harness
+reports items/second, SAP and MySQL round trips per item and peak RSS per job.
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import sqlite3
+import argparse
+import platform
+import subprocess
+from datetime import datetime
+import requests
+import mysql.connector
+from mysql.connector import Error
+from dotenv import load_dotenv
+from sync_runtime import AEST, parse_status_line
+
+# Load environment variables
+load_dotenv()
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BASE_DIR, 'benchmark_results')
+DEFAULT_SAP_DB = os.path.join(RESULTS_DIR, 'bench_sap.sqlite')
+
+JOBS = {
+    'barcode_sync': 'barcode_sync.py',
+    'serial_number_sync': 'serial_number_sync.py',
+    'staff_sync': 'staff_sync.py',
+}
+
+def benchmark_mysql_settings():
+    """
+    Connection settings for the benchmark database (kept apart from MYSQL_* on purpose)
+    """
+    return {
+        'host': os.getenv('BENCHMARK_MYSQL_HOST', '127.0.0.1'),
+        'database': os.getenv('BENCHMARK_MYSQL_DATABASE', 'd1sapsync_bench'),
+        'user': os.getenv('BENCHMARK_MYSQL_USER', 'root'),
+        'password': os.getenv('BENCHMARK_MYSQL_PASSWORD', '')
+    }
+
+def connect_benchmark_mysql():
+    """
+    Connect to the benchmark database, refusing anything that looks like a real one
+    """
+    settings = benchmark_mysql_settings()
+    if 'bench' not in settings['database'] and os.getenv('BENCHMARK_ALLOW_ANY_DATABASE') != 'true':
+        raise SystemExit(f"❌ Refusing to use database '{settings['database']}' - benchmark database names "
+                         f"must contain 'bench' (set BENCHMARK_ALLOW_ANY_DATABASE=true to override)")
+    if settings['database'] == os.getenv('MYSQL_DATABASE') and settings['host'] == os.getenv('MYSQL_HOST'):
+        raise SystemExit("❌ Benchmark database is the configured MYSQL_DATABASE - refusing to overwrite it")
+    return mysql.connector.connect(**settings)
+
+def generate_sap_data(db_path, rng, products, barcodes_per_item, serial_share, staff):
+    """
+    Build the SQLite database served by the SAP stand-in (OITM, OBCD, OSLP)
+    """
+    os.makedirs(os.path.dirname(db_path), exist_ok=True)
+    if os.path.exists(db_path):
+        os.remove(db_path)
+
+    connection = sqlite3.connect(db_path)
+    connection.executescript("""
+        CREATE TABLE OITM (
+            ItemCode TEXT PRIMARY KEY,
+            ItemName TEXT,
+            CodeBars TEXT,
+            frozenFor TEXT,
+            SellItem TEXT,
+            ManSerNum TEXT
+        );
+        CREATE TABLE OBCD (
+            BcdEntry INTEGER PRIMARY KEY,
+            ItemCode TEXT,
+            BcdCode TEXT,
+            BcdName TEXT,
+            UomEntry INTEGER
+        );
+        CREATE INDEX idx_obcd_item ON OBCD (ItemCode);
+        CREATE TABLE OSLP (
+            SlpCode INTEGER PRIMARY KEY,
+            SlpName TEXT,
+            Active TEXT
+        );
+        CREATE TABLE bench_meta (key TEXT PRIMARY KEY, value TEXT);
+    """)
+
+    items = []
+    barcodes = []
+    for index in range(1, products + 1):
+        item_code = f"BENCH{index:07d}"
+        items.append((
+            item_code,
+            f"Benchmark item {index}",
+            f"93{index:011d}",
+            'Y' if rng.random() < 0.02 else 'N',
+            'Y',
+            'Y' if rng.random() < serial_share else 'N'
+        ))
+        for extra in range(barcodes_per_item):
+            barcodes.append((item_code, f"94{index:09d}{extra:02d}", f"Pack {extra + 1}", 1))
+
+    connection.executemany("INSERT INTO OITM VALUES (?, ?, ?, ?, ?, ?)", items)
+    connection.executemany("INSERT INTO OBCD (ItemCode, BcdCode, BcdName, UomEntry) VALUES (?, ?, ?, ?)", barcodes)
+    connection.executemany(
+        "INSERT INTO OSLP VALUES (?, ?, ?)",
+        [(slp_code, f"Staff{slp_code} Member{slp_code}", 'Y' if rng.random() < 0.9 else 'N')
+         for slp_code in range(1, staff + 1)]
+    )
+    connection.commit()
+    connection.close()
+    return [item[0] for item in items]
+
+def generate_mysql_data(item_codes, rng, staff, existing_staff_share):
+    """
+    Recreate the tables the sync jobs write to in the benchmark database
+    Only the base columns are created - the jobs' own auto-migrations add the rest
+    """
+    connection = connect_benchmark_mysql()
+    cursor = connection.cursor()
+    try:
+        for table in ('products', 'product_associated_details', 'app_users', 'sync_state'):
+            cursor.execute(f"DROP TABLE IF EXISTS {table}")
+
+        cursor.execute("""
+            CREATE TABLE products (
+                id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                sap_item_code VARCHAR(50) NULL,
+                barcode VARCHAR(64) NULL,
+                barcode1 VARCHAR(64) NULL,
+                barcode2 VARCHAR(64) NULL,
+                barcode3 VARCHAR(64) NULL,
+                needs_sync TINYINT NOT NULL DEFAULT 1,
+                INDEX idx_sap_item_code (sap_item_code)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE product_associated_details (
+                id INT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                product_id INT NOT NULL,
+                fieldName VARCHAR(64) NOT NULL,
+                isRequired TINYINT NOT NULL DEFAULT 0,
+                isSelect TINYINT NOT NULL DEFAULT 0,
+                toValidate TINYINT NOT NULL DEFAULT 0,
+                allowSalesIfValidationFails TINYINT NOT NULL DEFAULT 0,
+                INDEX idx_product_field (product_id, fieldName)
+            )
+        """)
+        cursor.execute("""
+            CREATE TABLE app_users (
+                id INT NOT NULL PRIMARY KEY,
+                first_name VARCHAR(100),
+                last_name VARCHAR(100),
+                email_address VARCHAR(255),
+                password VARCHAR(255),
+                active_flag TINYINT,
+                salesman_flag TINYINT,
+                sap_import_flag TINYINT
+            )
+        """)
+
+        cursor.executemany(
+            "INSERT INTO products (sap_item_code, needs_sync) VALUES (%s, 1)",
+            [(item_code,) for item_code in item_codes]
+        )
+        existing = [slp_code for slp_code in range(1, staff + 1) if rng.random() < existing_staff_share]
+        cursor.executemany(
+            "INSERT INTO app_users (id, first_name, last_name, active_flag, salesman_flag, sap_import_flag) "
+            "VALUES (%s, 'Existing', 'Staff', 1, 1, 1)",
+            [(slp_code,) for slp_code in existing]
+        )
+        connection.commit()
+    finally:
+        cursor.close()
+        connection.close()
+
+def command_generate(args):
+    rng = random.Random(args.seed)
+    started = time.time()
+
+    print(f"🧪 Generating {args.products} products ({args.barcodes_per_item} extra barcode(s) each, "
+          f"{args.serial_share:.0%} serial-managed) and {args.staff} staff")
+    item_codes = generate_sap_data(args.sap_db, rng, args.products, args.barcodes_per_item,
+                                   args.serial_share, args.staff)
+    generate_mysql_data(item_codes, rng, args.staff, args.existing_staff_share)
+
+    dataset = {
+        'products': args.products,
+        'barcodes_per_item': args.barcodes_per_item,
+        'serial_share': args.serial_share,
+        'staff': args.staff,
+        'existing_staff_share': args.existing_staff_share,
+        'seed': args.seed,
+        'generated': datetime.now(AEST).isoformat()
+    }
+    connection = sqlite3.connect(args.sap_db)
+    connection.executemany("INSERT INTO bench_meta VALUES (?, ?)",
+                           [(key, json.dumps(value)) for key, value in dataset.items()])
+    connection.commit()
+    connection.close()
+
+    print(f"✅ Synthetic data ready in {time.time() - started:.1f}s (SAP stand-in data: {args.sap_db})")
+    return 0
+
+def read_dataset(sap_db):
+    """
+    Dataset parameters recorded by generate
+    """
+    connection = sqlite3.connect(sap_db)
+    try:
+        return {key: json.loads(value) for key, value in connection.execute("SELECT key, value FROM bench_meta")}
+    except sqlite3.Error:
+        return {}
+    finally:
+        connection.close()
+
+def start_standin(sap_db, latency_ms, jitter_ms):
+    """
+    Start the SAP stand-in on an ephemeral port and return (process, url)
+    """
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, 'sap_proxy_standin.py'), '--db', sap_db,
+         '--latency-ms', str(latency_ms), '--jitter-ms', str(jitter_ms)],
+        stdout=subprocess.PIPE, text=True
+    )
+    line = process.stdout.readline()
+    if not line.startswith('LISTENING '):
+        process.kill()
+        raise SystemExit("❌ SAP stand-in failed to start")
+    return process, f"http://127.0.0.1:{int(line.split()[1])}"
+
+def mysql_questions(connection):
+    """
+    Server-wide statement counter, used to count the job's MySQL round trips
+    """
+    if connection is None:
+        return None
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SHOW GLOBAL STATUS LIKE 'Questions'")
+        row = cursor.fetchone()
+        cursor.close()
+        return int(row[1]) if row else None
+    except Error:
+        return None
+
+def run_job_once(script, env, workdir):
+    """
+    Run one job process to completion
+    Returns (exit_code, items_processed, elapsed_seconds, peak_rss_kb)
+    """
+    started = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, os.path.join(BASE_DIR, script)],
+        stdout=subprocess.PIPE, stderr=subprocess.STDOUT, text=True, env=env, cwd=workdir
+    )
+
+    processed = 0
+    for line in process.stdout:
+        status = parse_status_line(line.strip())
+        if status and status.get('event') == 'run_complete':
+            processed = (status.get('result') or {}).get('processed', 0) or 0
+
+    # wait4 gives this child's own rusage, so peak RSS is per job run
+    _, wait_status, usage = os.wait4(process.pid, 0)
+    process.returncode = os.waitstatus_to_exitcode(wait_status)
+    elapsed = time.perf_counter() - started
+    return process.returncode, processed, elapsed, usage.ru_maxrss
+
+def benchmark_job(job_name, runs, base_env, standin_url, workdir, stats_connection):
+    """
+    Run a job several times and aggregate its measurements
+    """
+    totals = {'items': 0, 'seconds': 0.0, 'sap_requests': 0, 'mysql_queries': 0}
+    peak_rss_kb = 0
+    failures = 0
+    per_run = []
+
+    for run in range(1, runs + 1):
+        requests.post(f"{standin_url}/stats/reset", timeout=5)
+        questions_before = mysql_questions(stats_connection)
+
+        exit_code, processed, elapsed, rss_kb = run_job_once(JOBS[job_name], base_env, workdir)
+
+        questions_after = mysql_questions(stats_connection)
+        sap_requests = requests.get(f"{standin_url}/stats", timeout=5).json()['stats']['requests']
+        # The second SHOW STATUS counts itself
+        mysql_queries = (questions_after - questions_before - 1
+                         if questions_before is not None and questions_after is not None else None)
+
+        if exit_code != 0:
+            failures += 1
+        totals['items'] += processed
+        totals['seconds'] += elapsed
+        totals['sap_requests'] += sap_requests
+        if mysql_queries is not None:
+            totals['mysql_queries'] += mysql_queries
+        peak_rss_kb = max(peak_rss_kb, rss_kb)
+
+        per_run.append({
+            'run': run,
+            'exit_code': exit_code,
+            'items': processed,
+            'seconds': round(elapsed, 3),
+            'sap_requests': sap_requests,
+            'mysql_queries': mysql_queries,
+            'peak_rss_mb': round(rss_kb / 1024, 1)
+        })
+        print(f"   {job_name} run {run}/{runs}: {processed} items in {elapsed:.2f}s, "
+              f"{sap_requests} SAP requests, {mysql_queries if mysql_queries is not None else 'n/a'} MySQL queries, "
+              f"exit {exit_code}")
+
+    items = totals['items']
+    return {
+        'runs': runs,
+        'failures': failures,
+        'items': items,
+        'seconds': round(totals['seconds'], 3),
+        'items_per_second': round(items / totals['seconds'], 2) if totals['seconds'] > 0 else 0.0,
+        'sap_requests_per_item': round(totals['sap_requests'] / items, 2) if items else None,
+        'mysql_queries_per_item': (round(totals['mysql_queries'] / items, 2)
+                                   if items and stats_connection is not None else None),
+        'peak_rss_mb': round(peak_rss_kb / 1024, 1),
+        'per_run': per_run
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BASE_DIR,
+                              capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+def command_run(args):
+    if not os.path.exists(args.sap_db):
+        raise SystemExit(f"❌ {args.sap_db} not found - run 'benchmark.py generate' first")
+
+    jobs = args.jobs or list(JOBS)
+    settings = benchmark_mysql_settings()
+    workdir = os.path.join(RESULTS_DIR, 'work')
+    os.makedirs(workdir, exist_ok=True)
+
+    standin, standin_url = start_standin(args.sap_db, args.latency_ms, args.jitter_ms)
+    try:
+        stats_connection = connect_benchmark_mysql()
+    except Error as e:
+        print(f"⚠️ Could not open a stats connection ({e}) - MySQL round trips will not be reported")
+        stats_connection = None
+
+    env = dict(os.environ)
+    env.update({
+        'SQL_PROXY_URL': standin_url,
+        'MYSQL_HOST': settings['host'],
+        'MYSQL_DATABASE': settings['database'],
+        'MYSQL_USER': settings['user'],
+        'MYSQL_PASSWORD': settings['password'],
+        'BATCH_SIZE': str(args.batch_size),
+        'SERIAL_SYNC_BATCH_SIZE': str(args.batch_size),
+        'BARCODE_SYNC_WORKERS': str(args.workers),
+        'PYTHONUNBUFFERED': '1'
+    })
+
+    print(f"🏁 Benchmarking {', '.join(jobs)} ({args.runs} run(s) each, batch {args.batch_size}, "
+          f"SAP latency {args.latency_ms}±{args.jitter_ms}ms)")
+    results = {}
+    try:
+        for job_name in jobs:
+            results[job_name] = benchmark_job(job_name, args.runs, env, standin_url, workdir, stats_connection)
+    finally:
+        standin.terminate()
+        standin.wait(timeout=5)
+        if stats_connection is not None:
+            stats_connection.close()
+
+    report = {
+        'timestamp': datetime.now(AEST).isoformat(),
+        'label': args.label,
+        'environment': {
+            'git_commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'host': socket.gethostname()
+        },
+        'settings': {
+            'runs': args.runs,
+            'batch_size': args.batch_size,
+            'workers': args.workers,
+            'latency_ms': args.latency_ms,
+            'jitter_ms': args.jitter_ms,
+            'rolling_update_mode': env.get('ROLLING_UPDATE_MODE', 'timestamp')
+        },
+        'dataset': read_dataset(args.sap_db),
+        'jobs': results
+    }
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"benchmark-{datetime.now(AEST).strftime('%Y%m%d-%H%M%S')}"
+                     f"{'-' + args.label if args.label else ''}.json")
+    with open(output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print_summary(results)
+    print(f"💾 Results saved to {output}")
+    return 1 if any(result['failures'] for result in results.values()) else 0
+
+def print_summary(results):
+    print("")
+    print(f"{'job':<20} {'items/s':>9} {'SAP/item':>9} {'MySQL/item':>11} {'peak RSS':>10} {'failures':>9}")
+    for job_name, result in results.items():
+        print(f"{job_name:<20} {result['items_per_second']:>9} "
+              f"{_fmt(result['sap_requests_per_item']):>9} {_fmt(result['mysql_queries_per_item']):>11} "
+              f"{result['peak_rss_mb']:>8}MB {result['failures']:>9}")
+
+def _fmt(value):
+    return 'n/a' if value is None else value
+
+COMPARED_METRICS = [
+    ('items_per_second', True),
+    ('sap_requests_per_item', False),
+    ('mysql_queries_per_item', False),
+    ('peak_rss_mb', False),
+]
+
+def command_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+
+    print(f"Baseline:  {args.baseline} ({baseline['environment'].get('git_commit')})")
+    print(f"Candidate: {args.candidate} ({candidate['environment'].get('git_commit')})")
+    if baseline.get('dataset') != candidate.get('dataset') or baseline.get('settings') != candidate.get('settings'):
+        print("⚠️ Dataset or settings differ between the two runs - compare with care")
+
+    for job_name in sorted(set(baseline['jobs']) & set(candidate['jobs'])):
+        print(f"\n{job_name}")
+        for metric, higher_is_better in COMPARED_METRICS:
+            before = baseline['jobs'][job_name].get(metric)
+            after = candidate['jobs'][job_name].get(metric)
+            if before is None or after is None:
+                print(f"   {metric:<24} {_fmt(before):>10} -> {_fmt(after):>10}")
+                continue
+            change = ((after - before) / before * 100) if before else 0.0
+            improved = (change > 0) == higher_is_better if change else None
+            marker = '' if improved is None else ('✅' if improved else '❌')
+            print(f"   {metric:<24} {before:>10} -> {after:>10}  ({change:+.1f}%) {marker}")
+    return 0
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the sync jobs against synthetic data")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    generate = subparsers.add_parser('generate', help="Create synthetic SAP and MySQL data")
+    generate.add_argument('--products', type=int, default=2000)
+    generate.add_argument('--barcodes-per-item', type=int, default=1, help="Additional OBCD barcodes per item")
+    generate.add_argument('--serial-share', type=float, default=0.2, help="Share of serial-managed items")
+    generate.add_argument('--staff', type=int, default=200)
+    generate.add_argument('--existing-staff-share', type=float, default=0.5,
+                          help="Share of SAP staff already present in app_users")
+    generate.add_argument('--seed', type=int, default=1)
+    generate.add_argument('--sap-db', default=DEFAULT_SAP_DB)
+    generate.set_defaults(handler=command_generate)
+
+    run = subparsers.add_parser('run', help="Run the jobs and record throughput")
+    run.add_argument('--jobs', nargs='*', choices=list(JOBS))
+    run.add_argument('--runs', type=int, default=3)
+    run.add_argument('--batch-size', type=int, default=200)
+    run.add_argument('--workers', type=int, default=1, help="BARCODE_SYNC_WORKERS for barcode_sync")
+    run.add_argument('--latency-ms', type=float, default=40.0, help="Simulated SAP proxy latency per request")
+    run.add_argument('--jitter-ms', type=float, default=10.0)
+    run.add_argument('--label', default='')
+    run.add_argument('--output')
+    run.add_argument('--sap-db', default=DEFAULT_SAP_DB)
+    run.set_defaults(handler=command_run)
+
+    compare = subparsers.add_parser('compare', help="Compare two saved benchmark results")
+    compare.add_argument('baseline')
+    compare.add_argument('candidate')
+    compare.set_defaults(handler=command_compare)
+
+    args = parser.parse_args(argv)
+    return args.handler(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
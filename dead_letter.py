@@ -0,0 +1,236 @@
+"""
+Dead Letter Queue
+Items a sync job keeps failing on, parked with their failure reason until a retry is due
+
+A job records an item here when syncing it fails for a reason that will not go
+away by itself on the next run (e.g. more barcodes in SAP than products can
+hold). Batch selection leaves the item out until next_retry, which backs off
+exponentially with every further failure (base * 2^(attempts - 1), capped).
+A successful sync removes the entry; the jobs dashboard lists the entries and
+can make them due again at once.
+"""
+
+import os
+import logging
+from mysql.connector import Error
+from dotenv import load_dotenv
+from rolling_update_utils import get_mysql_connection
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+DEAD_LETTER_TABLE = 'sync_dead_letter'
+
+_table_ready = False
+
+def dead_letter_enabled(prefix):
+    """Check whether the job with env prefix (e.g. BARCODE_SYNC) parks failing items"""
+    return os.getenv(f'{prefix}_DEAD_LETTER', 'true').lower() == 'true'
+
+def retry_backoff(prefix):
+    """(first retry delay, longest retry delay) in seconds for the job with env prefix"""
+    base = max(1, int(os.getenv(f'{prefix}_DEAD_LETTER_BACKOFF', 3600)))
+    ceiling = max(base, int(os.getenv(f'{prefix}_DEAD_LETTER_MAX_BACKOFF', 7 * 24 * 3600)))
+    return base, ceiling
+
+def ensure_dead_letter_table():
+    """
+    Ensure the sync_dead_letter table exists
+    Auto-creates it on first use
+    """
+    global _table_ready
+    if _table_ready:
+        return True
+
+    connection = get_mysql_connection()
+    if not connection:
+        logger.error("Cannot validate dead letter table - no database connection")
+        return False
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {DEAD_LETTER_TABLE} (
+                job_name VARCHAR(64) NOT NULL,
+                item_id BIGINT NOT NULL,
+                item_code VARCHAR(64) NULL,
+                reason VARCHAR(64) NOT NULL,
+                detail TEXT NULL,
+                attempts INT NOT NULL DEFAULT 1,
+                first_failed TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                last_failed TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                next_retry TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (job_name, item_id),
+                KEY idx_next_retry (job_name, next_retry)
+            )
+        """)
+        connection.commit()
+        _table_ready = True
+        return True
+
+    except Error as e:
+        logger.error(f"❌ Dead letter table validation failed: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def parked_condition(job_name, id_column='id'):
+    """
+    SQL condition (and params) that is true for rows whose item is parked and not yet due
+    Used as "AND NOT <condition>" in a job's batch selection
+    """
+    sql = f"""EXISTS (
+                SELECT 1 FROM {DEAD_LETTER_TABLE} dl
+                WHERE dl.job_name = %s AND dl.item_id = {id_column} AND dl.next_retry > NOW())"""
+    return sql, [job_name]
+
+def record_failure(job_name, item_id, item_code, reason, detail, base_seconds, max_seconds):
+    """
+    Park an item: first retry after base_seconds, doubling with every further failure up to max_seconds
+    Returns the attempt count, or None if the entry could not be written
+    """
+    if not ensure_dead_letter_table():
+        return None
+
+    connection = get_mysql_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor()
+        # attempts is incremented before next_retry is computed (assignments apply left to right)
+        cursor.execute(f"""
+            INSERT INTO {DEAD_LETTER_TABLE} (job_name, item_id, item_code, reason, detail, next_retry)
+            VALUES (%s, %s, %s, %s, %s, NOW() + INTERVAL %s SECOND)
+            ON DUPLICATE KEY UPDATE
+                attempts = attempts + 1,
+                item_code = VALUES(item_code),
+                reason = VALUES(reason),
+                detail = VALUES(detail),
+                last_failed = NOW(),
+                next_retry = NOW() + INTERVAL LEAST({int(base_seconds)} * POW(2, attempts - 1), {int(max_seconds)}) SECOND
+        """, (job_name, item_id, item_code, reason[:64], detail, int(base_seconds)))
+        cursor.execute(f"SELECT attempts FROM {DEAD_LETTER_TABLE} WHERE job_name = %s AND item_id = %s",
+                       (job_name, item_id))
+        row = cursor.fetchone()
+        connection.commit()
+        return row[0] if row else None
+    except Error as e:
+        logger.error(f"Error parking item {item_code} (ID: {item_id}) for {job_name}: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def resolve_items(job_name, item_ids):
+    """Drop the entries of items that synced successfully"""
+    if not item_ids or not ensure_dead_letter_table():
+        return 0
+
+    connection = get_mysql_connection()
+    if not connection:
+        return 0
+
+    try:
+        cursor = connection.cursor()
+        placeholders = ', '.join(['%s'] * len(item_ids))
+        cursor.execute(f"DELETE FROM {DEAD_LETTER_TABLE} WHERE job_name = %s AND item_id IN ({placeholders})",
+                       (job_name, *item_ids))
+        connection.commit()
+        return cursor.rowcount
+    except Error as e:
+        logger.error(f"Error clearing dead letter entries for {job_name}: {e}")
+        return 0
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def retry_items(job_name, item_ids=None):
+    """
+    Make parked items due for a retry on the job's next run (all of them when item_ids is None)
+    Their attempt count is kept, so an item that fails again backs off from where it was
+    Returns the number of entries made due
+    """
+    if not ensure_dead_letter_table():
+        return 0
+
+    connection = get_mysql_connection()
+    if not connection:
+        return 0
+
+    try:
+        cursor = connection.cursor()
+        query = f"UPDATE {DEAD_LETTER_TABLE} SET next_retry = NOW() WHERE job_name = %s AND next_retry > NOW()"
+        params = [job_name]
+        if item_ids is not None:
+            if not item_ids:
+                return 0
+            query += f" AND item_id IN ({', '.join(['%s'] * len(item_ids))})"
+            params.extend(item_ids)
+        cursor.execute(query, params)
+        connection.commit()
+        return cursor.rowcount
+    except Error as e:
+        logger.error(f"Error scheduling dead letter retries for {job_name}: {e}")
+        return 0
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def list_dead_letters(job_name, limit=200):
+    """
+    A job's parked items, soonest retry first, with totals by reason
+    Returns None if the table cannot be read
+    """
+    if not ensure_dead_letter_table():
+        return None
+
+    connection = get_mysql_connection()
+    if not connection:
+        return None
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(f"""
+            SELECT item_id, item_code, reason, detail, attempts, first_failed, last_failed, next_retry,
+                   next_retry <= NOW() AS due
+            FROM {DEAD_LETTER_TABLE}
+            WHERE job_name = %s
+            ORDER BY next_retry, item_id
+            LIMIT %s
+        """, (job_name, limit))
+        items = cursor.fetchall()
+        for item in items:
+            item['due'] = bool(item['due'])
+            for column in ('first_failed', 'last_failed', 'next_retry'):
+                item[column] = item[column].isoformat() if item[column] else None
+
+        cursor.execute(f"""
+            SELECT reason, COUNT(*) AS items, COALESCE(SUM(next_retry <= NOW()), 0) AS due
+            FROM {DEAD_LETTER_TABLE}
+            WHERE job_name = %s
+            GROUP BY reason
+        """, (job_name,))
+        reasons = {row['reason']: {'items': int(row['items']), 'due': int(row['due'])} for row in cursor.fetchall()}
+
+        return {
+            'job_name': job_name,
+            'total': sum(counts['items'] for counts in reasons.values()),
+            'due': sum(counts['due'] for counts in reasons.values()),
+            'reasons': reasons,
+            'items': items
+        }
+    except Error as e:
+        logger.error(f"Error listing dead letters for {job_name}: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
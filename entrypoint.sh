@@ -35,6 +35,12 @@ fi
 
 echo "✅ All required environment variables are set"
 
+# The scheduler control endpoint derives its token from FLASK_SECRET_KEY unless one is given
+if [ -z "$SCHEDULER_CONTROL_TOKEN" ] && [[ "$FLASK_SECRET_KEY" == "your-default-secret-key" || "$FLASK_SECRET_KEY" == "your-secret-key-here" ]]; then
+    echo "❌ FLASK_SECRET_KEY is still the example value - set a real secret (or SCHEDULER_CONTROL_TOKEN)"
+    exit 1
+fi
+
 # Set default values for optional variables
 export WEB_USERNAME="${WEB_USERNAME:-admin}"
 export WEB_PASSWORD="${WEB_PASSWORD:-d1sapsync2024}"
@@ -58,7 +64,7 @@ echo "============================================================"
 exec gunicorn \
     --bind 0.0.0.0:9000 \
     --workers 2 \
-    --threads 4 \
+    --threads 8 \
     --timeout 120 \
     --access-logfile - \
     --error-logfile - \
@@ -0,0 +1,9 @@
+"""
+Gunicorn configuration
+Loaded automatically from the working directory by gunicorn
+"""
+
+def post_worker_init(worker):
+    """Join scheduler leader election as soon as a worker has loaded the app"""
+    from job_manager import start_scheduler
+    start_scheduler()
@@ -0,0 +1,94 @@
+"""
+Job Chain
+Runs a job and the jobs chained after it one after another in one worker process
+
+JobManager uses this for dependents configured with <PREFIX>_CHAIN=true, so they
+start warm: they reuse the product index the upstream job loaded (see
+product_index.py), and all steps share this process's pooled MySQL connections
+and SAP proxy keep-alive session. Each step is announced with a chain_step status
+line and closed with chain_step_end, which is how JobManager tells whose output
+and result it is reading.
+
+Usage: job_chain.py JOB_ID=MODULE[:SAP_PRIORITY] [JOB_ID=MODULE[:SAP_PRIORITY] ...]
+The first step is the upstream job; the process exits with its exit code. If it
+fails, the chained jobs are skipped.
+"""
+
+import os
+import sys
+import time
+import logging
+import importlib
+import traceback
+from dotenv import load_dotenv
+from sync_logging import flush_logging
+from sync_runtime import emit_status, enable_warm_connections
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+def parse_steps(argv):
+    """
+    JOB_ID=MODULE[:SAP_PRIORITY] arguments as (job_id, module, priority) tuples
+    """
+    steps = []
+    for arg in argv:
+        job_id, _, target = arg.partition('=')
+        module_name, _, priority = target.partition(':')
+        if not job_id or not module_name:
+            raise ValueError(f"Chain step '{arg}' must look like JOB_ID=MODULE[:SAP_PRIORITY]")
+        steps.append((job_id, module_name, priority or None))
+    return steps
+
+def run_step(job_id, module_name, priority):
+    """
+    Run one job's entry point in this process and return its exit code
+    """
+    module = importlib.import_module(module_name)
+    if priority:
+        os.environ['SAP_PRIORITY'] = priority
+    sys.argv = [f'{module_name}.py']
+
+    try:
+        return module.main([]) or 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except Exception:
+        traceback.print_exc()
+        return 1
+
+def main(argv=None):
+    """
+    Command line entry point
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    steps = parse_steps(argv)
+    if not steps:
+        print("Usage: job_chain.py JOB_ID=MODULE[:SAP_PRIORITY] [...]")
+        return 2
+
+    enable_warm_connections()
+    upstream_code = None
+
+    for job_id, module_name, priority in steps:
+        emit_status('chain_step', job=job_id, module=module_name)
+        started = time.monotonic()
+        exit_code = run_step(job_id, module_name, priority)
+        # Write out the step's queued log lines before the marker, so they stay with this step
+        flush_logging()
+        emit_status('chain_step_end', job=job_id, exit_code=exit_code,
+                    duration_seconds=round(time.monotonic() - started, 3))
+
+        if upstream_code is None:
+            upstream_code = exit_code
+            if exit_code != 0:
+                logger.error(f"❌ {job_id} failed with exit code {exit_code} - skipping "
+                             f"{', '.join(step[0] for step in steps[1:]) or 'nothing'}")
+                break
+
+    return upstream_code
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -7,6 +7,25 @@ load_dotenv()
 class JobConfig:
     """Configuration settings for different background jobs"""
 
+    @staticmethod
+    def get_schedule_config(prefix):
+        """
+        Schedule settings shared by every job, read from <prefix>_SCHEDULE, _JITTER, _START_OFFSET, _QUIET_WINDOWS,
+        _DEPENDS_ON and _CHAIN
+        """
+        start_offset = os.getenv(f'{prefix}_START_OFFSET', '')
+        depends_on = os.getenv(f'{prefix}_DEPENDS_ON', '')
+        return {
+            # Job ids this job runs after (comma-separated); replaces its own interval/cron schedule when set
+            'depends_on': [job_id.strip() for job_id in depends_on.split(',') if job_id.strip()],
+            # Run in the (single) upstream job's worker right after it, reusing its warm caches
+            'chain': os.getenv(f'{prefix}_CHAIN', 'false').lower() == 'true',
+            'schedule': os.getenv(f'{prefix}_SCHEDULE', ''),  # Cron expression (AEST); replaces run_interval when set
+            'jitter': int(os.getenv(f'{prefix}_JITTER', '0')),  # Random 0-N seconds added to every run time
+            'start_offset': int(start_offset) if start_offset else None,  # None staggers the first run randomly
+            'quiet_windows': os.getenv(f'{prefix}_QUIET_WINDOWS', os.getenv('SYNC_QUIET_WINDOWS', ''))
+        }
+
     @staticmethod
     def get_barcode_sync_config():
         """Get configuration for barcode sync job"""
@@ -14,13 +33,19 @@ class JobConfig:
             'job_id': 'barcode_sync',
             'name': 'Barcode Sync',
             'command': ['python', 'barcode_sync.py'],
+            'module': 'barcode_sync',
             'description': 'Synchronizes barcodes from SAP B1 to MySQL database',
             'auto_restart': os.getenv('BARCODE_SYNC_AUTO_RESTART', 'true').lower() == 'true',
             'restart_delay': int(os.getenv('BARCODE_SYNC_RESTART_DELAY', '60')),
             'run_interval': int(os.getenv('BARCODE_SYNC_INTERVAL', '300')),  # Run every 5 minutes by default
             'auto_start': os.getenv('BARCODE_SYNC_AUTO_START', 'true').lower() == 'true',
             'max_restarts': int(os.getenv('BARCODE_SYNC_MAX_RESTARTS', '5')),
-            'enabled': os.getenv('BARCODE_SYNC_ENABLED', 'true').lower() == 'true'
+            'enabled': os.getenv('BARCODE_SYNC_ENABLED', 'true').lower() == 'true',
+            'daemon': os.getenv('BARCODE_SYNC_DAEMON', 'false').lower() == 'true',
+            'execution_backend': os.getenv('BARCODE_SYNC_BACKEND', 'subprocess'),  # subprocess or warm_pool
+            'run_timeout': int(os.getenv('BARCODE_SYNC_RUN_TIMEOUT', '0')),  # 0 disables the hung-run watchdog
+            'sap_priority': os.getenv('BARCODE_SYNC_SAP_PRIORITY', 'normal'),  # high, normal or low (see sap_budget.py)
+            **JobConfig.get_schedule_config('BARCODE_SYNC')
         }
 
     @staticmethod
@@ -30,13 +55,19 @@ class JobConfig:
             'job_id': 'serial_number_sync',
             'name': 'Serial Number Sync',
             'command': ['python', 'serial_number_sync.py'],
+            'module': 'serial_number_sync',
             'description': 'Synchronizes serial number requirements from SAP B1 to product_associated_details table',
             'auto_restart': os.getenv('SERIAL_SYNC_AUTO_RESTART', 'true').lower() == 'true',
             'restart_delay': int(os.getenv('SERIAL_SYNC_RESTART_DELAY', '60')),
             'run_interval': int(os.getenv('SERIAL_SYNC_INTERVAL', '900')),  # Run every 15 minutes
             'auto_start': os.getenv('SERIAL_SYNC_AUTO_START', 'true').lower() == 'true',
             'max_restarts': int(os.getenv('SERIAL_SYNC_MAX_RESTARTS', '5')),
-            'enabled': os.getenv('SERIAL_SYNC_ENABLED', 'true').lower() == 'true'
+            'enabled': os.getenv('SERIAL_SYNC_ENABLED', 'true').lower() == 'true',
+            'daemon': os.getenv('SERIAL_SYNC_DAEMON', 'false').lower() == 'true',
+            'execution_backend': os.getenv('SERIAL_SYNC_BACKEND', 'subprocess'),  # subprocess or warm_pool
+            'run_timeout': int(os.getenv('SERIAL_SYNC_RUN_TIMEOUT', '0')),  # 0 disables the hung-run watchdog
+            'sap_priority': os.getenv('SERIAL_SYNC_SAP_PRIORITY', 'normal'),  # high, normal or low (see sap_budget.py)
+            **JobConfig.get_schedule_config('SERIAL_SYNC')
         }
 
     @staticmethod
@@ -46,13 +77,19 @@ class JobConfig:
             'job_id': 'staff_sync',
             'name': 'Staff Sync',
             'command': ['python', 'staff_sync.py'],
+            'module': 'staff_sync',
             'description': 'Synchronizes staff/salesperson data from SAP B1 OSLP to app_users table',
             'auto_restart': os.getenv('STAFF_SYNC_AUTO_RESTART', 'true').lower() == 'true',
             'restart_delay': int(os.getenv('STAFF_SYNC_RESTART_DELAY', '60')),
             'run_interval': int(os.getenv('STAFF_SYNC_INTERVAL', '7200')),  # Run every 2 hours
             'auto_start': os.getenv('STAFF_SYNC_AUTO_START', 'false').lower() == 'true',
             'max_restarts': int(os.getenv('STAFF_SYNC_MAX_RESTARTS', '5')),
-            'enabled': os.getenv('STAFF_SYNC_ENABLED', 'true').lower() == 'true'
+            'enabled': os.getenv('STAFF_SYNC_ENABLED', 'true').lower() == 'true',
+            'daemon': os.getenv('STAFF_SYNC_DAEMON', 'false').lower() == 'true',
+            'execution_backend': os.getenv('STAFF_SYNC_BACKEND', 'subprocess'),  # subprocess or warm_pool
+            'run_timeout': int(os.getenv('STAFF_SYNC_RUN_TIMEOUT', '0')),  # 0 disables the hung-run watchdog
+            'sap_priority': os.getenv('STAFF_SYNC_SAP_PRIORITY', 'normal'),  # high, normal or low (see sap_budget.py)
+            **JobConfig.get_schedule_config('STAFF_SYNC')
         }
 
     @staticmethod
@@ -68,7 +105,8 @@ class JobConfig:
             'run_interval': int(os.getenv('SAMPLE_JOB_INTERVAL', '600')),  # Run every 10 minutes
             'auto_start': os.getenv('SAMPLE_JOB_AUTO_START', 'false').lower() == 'true',
             'max_restarts': int(os.getenv('SAMPLE_JOB_MAX_RESTARTS', '3')),
-            'enabled': os.getenv('SAMPLE_JOB_ENABLED', 'false').lower() == 'true'
+            'enabled': os.getenv('SAMPLE_JOB_ENABLED', 'false').lower() == 'true',
+            **JobConfig.get_schedule_config('SAMPLE_JOB')
         }
 
     @staticmethod
@@ -1,13 +1,28 @@
-import subprocess
+import asyncio
 import threading
 import time
 import json
+import random
+import uuid
 import logging
 from datetime import datetime, timedelta, timezone
 from enum import Enum
 from typing import Dict, List, Optional
-import queue
 import os
+import sys
+from collections import deque
+from sync_runtime import parse_status_line
+from supervisor import JobSupervisor, start_subprocess, attach_warm_run, read_lines
+from job_schedule import CronSchedule, QuietWindows
+from sap_budget import budget_usage
+from run_history import submit_run, run_trends
+from sync_logging import parse_log_line, read_log_tail
+from tracing import slowest_spans
+from profiling import (PROFILE_ENV, new_profile_path, request_profile, cancel_profile_request, list_profiles,
+                       prune_profiles, top_functions)
+from metrics import (REGISTRY, JOB_RUNS, JOB_RUN_DURATION, JOB_ITEMS_PROCESSED, JOB_ITEM_ERRORS, JOB_RESTARTS,
+                     JOB_UP, JOB_LAST_SUCCESS, STAGE_DURATION, CACHE_REQUESTS, CONSOLE_QUERIES,
+                     CONSOLE_QUERY_DURATION, CONSOLE_RESULT_ROWS, SAP_BUDGET_SLOTS, SAP_BUDGET_IN_USE)
 
 class JobStatus(Enum):
     STOPPED = "stopped"
@@ -16,6 +31,77 @@ class JobStatus(Enum):
     COMPLETED = "completed"
     SCHEDULED = "scheduled"
 
+class LogBuffer:
+    """
+    Fixed-capacity ring buffer of a job's log entries
+    Every entry gets a sequence number that keeps increasing across clears and
+    evictions, so readers can ask for what they have not seen yet. Sequence numbers
+    restart with every new buffer (process restart, leadership move), so readers
+    keep the buffer's epoch with them to tell a stale cursor from a current one.
+    """
+    def __init__(self, capacity: int, on_append=None):
+        self.capacity = max(1, capacity)
+        self.epoch = uuid.uuid4().hex[:8]
+        self._on_append = on_append
+        self._entries = deque()  # (seq, approx_bytes, entry)
+        self._next_seq = 1
+        self._bytes = 0
+        self._dropped = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _entry_size(entry: Dict) -> int:
+        return sys.getsizeof(entry) + sum(sys.getsizeof(key) + sys.getsizeof(value) for key, value in entry.items())
+
+    def append(self, entry: Dict) -> int:
+        """Add an entry (evicting the oldest when full) and return its sequence number"""
+        with self._lock:
+            entry = dict(entry, seq=self._next_seq)
+            self._next_seq += 1
+            size = self._entry_size(entry)
+            self._entries.append((entry['seq'], size, entry))
+            self._bytes += size
+            if len(self._entries) > self.capacity:
+                _, evicted_size, _ = self._entries.popleft()
+                self._bytes -= evicted_size
+                self._dropped += 1
+        if self._on_append:
+            self._on_append()
+        return entry['seq']
+
+    def tail(self, count: int) -> List[Dict]:
+        """Newest count entries, oldest first"""
+        with self._lock:
+            count = min(max(count, 0), len(self._entries))
+            return [self._entries[i][2] for i in range(len(self._entries) - count, len(self._entries))]
+
+    def since(self, seq: int, limit: Optional[int] = None) -> List[Dict]:
+        """Entries with a sequence number above seq, oldest first"""
+        with self._lock:
+            entries = [entry for entry_seq, _, entry in self._entries if entry_seq > seq]
+        return entries[:limit] if limit else entries
+
+    def clear(self):
+        """Drop every entry (sequence numbers carry on)"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                'epoch': self.epoch,
+                'capacity': self.capacity,
+                'size': len(self._entries),
+                'first_seq': self._entries[0][0] if self._entries else None,
+                'last_seq': self._next_seq - 1,
+                'dropped': self._dropped,
+                'approx_bytes': self._bytes
+            }
+
+    def __len__(self):
+        return len(self._entries)
+
 class JobManager:
     # Australian Eastern Standard Time (UTC+10)
     AEST = timezone(timedelta(hours=10))
@@ -26,39 +112,110 @@ class JobManager:
         self.jobs: Dict[str, Dict] = {}
         self.logger = logging.getLogger(__name__)
         self._lock = threading.Lock()
+        # Bumped on every log entry and status change; event streams wait on it
+        self._changed = threading.Condition()
+        self._change_seq = 0
+        # One event loop runs every schedule and reads every job's output
+        self._supervisor = JobSupervisor()
+
+    def _notify_change(self):
+        """Wake anything waiting in wait_for_updates"""
+        with self._changed:
+            self._change_seq += 1
+            self._changed.notify_all()
 
     def register_job(self, config: Dict):
         """Register a new job type with full configuration"""
         job_id = config['job_id']
 
+        # Daemon jobs loop internally on their interval, so the manager runs
+        # them as a single long-lived process instead of scheduling runs
+        daemon = config.get('daemon', False)
+        command = list(config['command'])
+        if daemon and '--daemon' not in command:
+            command.append('--daemon')
+
+        # Parsed up front so a bad expression fails registration, not the first run
+        schedule = CronSchedule(config['schedule']) if config.get('schedule') else None
+        quiet_windows = QuietWindows(config.get('quiet_windows', ''))
+
+        # Jobs this one runs after - it is triggered by their runs instead of its own schedule
+        depends_on = [upstream for upstream in config.get('depends_on') or [] if upstream]
+        if depends_on and daemon:
+            raise ValueError("a daemon job cannot depend on other jobs")
+        self._check_dependency_cycle(job_id, depends_on)
+
         with self._lock:
             self.jobs[job_id] = {
                 'name': config.get('name', job_id),
-                'command': config['command'],
+                'command': command,
+                'module': config.get('module'),
+                'execution_backend': config.get('execution_backend', 'subprocess'),
+                'run_timeout': config.get('run_timeout', 0),
+                'sap_priority': config.get('sap_priority', 'normal'),
+                'daemon': daemon,
                 'description': config.get('description', ''),
                 'auto_restart': config.get('auto_restart', False),
                 'restart_delay': config.get('restart_delay', 30),
                 'run_interval': config.get('run_interval', 300),
+                'schedule': schedule,
+                'jitter': config.get('jitter', 0),
+                'start_offset': config.get('start_offset'),
+                'quiet_windows': quiet_windows,
+                'depends_on': depends_on,
+                'chain': bool(config.get('chain', False) and depends_on),
+                'upstream_done': set(),
+                'run_active': False,
+                'chain_owner': None,
+                'chain_step': None,
+                'chain_step_started': None,
                 'auto_start': config.get('auto_start', False),
                 'max_restarts': config.get('max_restarts', 5),
                 'enabled': config.get('enabled', True),
                 'status': JobStatus.STOPPED,
                 'process': None,
-                'thread': None,
-                'scheduler_thread': None,
                 'start_time': None,
                 'end_time': None,
                 'last_run_time': None,
                 'next_run_time': None,
-                'logs': [],
-                'log_queue': queue.Queue(),
+                'last_duration': None,
+                'logs': LogBuffer(int(config.get('log_capacity') or os.getenv('JOB_LOG_CAPACITY', 1000)),
+                                  on_append=self._notify_change),
                 'restart_count': 0,
                 'run_count': 0,
-                'is_scheduled': config.get('run_interval', 0) > 0
+                'last_result': None,
+                'run_result': None,
+                'last_start_latency_ms': None,
+                'checkpoints': {},
+                'last_timings': None,
+                'profile_next_run': False,
+                'pending_profile': None,
+                'last_profile': None,
+                'is_scheduled': (config.get('run_interval', 0) > 0 or schedule is not None or bool(depends_on))
+                                and not daemon
             }
 
+    def _check_dependency_cycle(self, job_id: str, depends_on: List[str]):
+        """Raise ValueError if running job_id after depends_on would close a loop in the job graph"""
+        path = [job_id]
+
+        def visit(upstream):
+            if upstream == job_id:
+                raise ValueError(f"dependency cycle {' -> '.join(reversed(path + [upstream]))}")
+            path.append(upstream)
+            for next_upstream in self.jobs.get(upstream, {}).get('depends_on', []):
+                visit(next_upstream)
+            path.pop()
+
+        for upstream in depends_on:
+            visit(upstream)
+
     def start_job(self, job_id: str) -> bool:
         """Start a background job (either scheduled or continuous)"""
+        return self._supervisor.run(self._start_job(job_id))
+
+    async def _start_job(self, job_id: str, staggered: bool = False) -> bool:
+        """start_job, on the supervisor loop (staggered delays an interval job's first run)"""
         if job_id not in self.jobs:
             self.logger.error(f"Job {job_id} not registered")
             return False
@@ -74,168 +231,539 @@ class JobManager:
 
             if job['is_scheduled']:
                 # For scheduled jobs, start the scheduler
-                return self._start_scheduled_job(job_id)
+                return self._start_scheduled_job(job_id, staggered)
             else:
                 # For continuous jobs, start the process directly
-                return self._start_continuous_job(job_id)
+                return await self._start_continuous_job(job_id)
 
         except Exception as e:
             self.logger.error(f"Failed to start job {job_id}: {e}")
             job['status'] = JobStatus.FAILED
             return False
+        finally:
+            self._notify_change()
 
-    def _start_scheduled_job(self, job_id: str) -> bool:
-        """Start a scheduled job that runs at intervals"""
+    def _start_scheduled_job(self, job_id: str, staggered: bool = False) -> bool:
+        """Start a scheduled job that runs at intervals, on a cron schedule or after its upstream jobs"""
         job = self.jobs[job_id]
 
         job['status'] = JobStatus.SCHEDULED
         job['start_time'] = datetime.now()
-        job['next_run_time'] = datetime.now()
-
-        # Start scheduler thread
-        scheduler_thread = threading.Thread(
-            target=self._schedule_job,
-            args=(job_id,),
-            daemon=True
-        )
-        job['scheduler_thread'] = scheduler_thread
-        scheduler_thread.start()
-
-        self.logger.info(f"Started scheduled job {job_id} (interval: {job['run_interval']}s)")
+
+        if job['depends_on']:
+            # Nothing to time - the next successful run of every upstream job triggers it
+            job['next_run_time'] = None
+            job['upstream_done'].clear()
+            self.logger.info(f"Started job {job_id} ({self._describe_schedule(job_id)})")
+            return True
+
+        job['next_run_time'] = self._next_run_time(job_id, first=True, staggered=staggered)
+        self._schedule_next_run(job_id)
+
+        self.logger.info(f"Started scheduled job {job_id} ({self._describe_schedule(job_id)}), "
+                         f"first run at {job['next_run_time'].isoformat(timespec='seconds')}")
         return True
 
-    def _start_continuous_job(self, job_id: str) -> bool:
+    async def _start_continuous_job(self, job_id: str) -> bool:
         """Start a continuous job that runs until stopped"""
         job = self.jobs[job_id]
 
         # Clear old logs if starting fresh
-        job['logs'] = []
-        job['log_queue'] = queue.Queue()
+        job['logs'].clear()
 
         # Start the process
-        process = subprocess.Popen(
-            job['command'],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT,
-            universal_newlines=True,
-            bufsize=1
-        )
+        job['dispatch_time'] = time.monotonic()
+        job['run_result'] = None
+        process = await self._spawn_process(job_id)
 
         job['process'] = process
         job['status'] = JobStatus.RUNNING
         job['start_time'] = datetime.now()
         job['end_time'] = None
 
-        # Start monitoring thread
-        monitor_thread = threading.Thread(
-            target=self._monitor_job,
-            args=(job_id,),
-            daemon=True
-        )
-        job['thread'] = monitor_thread
-        monitor_thread.start()
+        # Output is read by a task on the supervisor loop
+        self._supervisor.spawn(self._monitor_job(job_id))
 
         self.logger.info(f"Started continuous job {job_id} (PID: {process.pid})")
         return True
 
-    def _schedule_job(self, job_id: str):
-        """Scheduler thread that runs a job at intervals"""
+    def _describe_schedule(self, job_id: str) -> str:
+        """Human-readable schedule of a job, e.g. 'cron */15 * * * *, jitter 30s'"""
+        job = self.jobs[job_id]
+        if job['depends_on']:
+            chained = ' in the same worker' if self._runs_in_chain(job_id) else ''
+            return f"runs after {', '.join(job['depends_on'])}{chained}"
+        parts = [f"cron {job['schedule']}" if job['schedule'] else f"interval: {job['run_interval']}s"]
+        if job['jitter']:
+            parts.append(f"jitter {job['jitter']}s")
+        if job['quiet_windows']:
+            parts.append(f"quiet {job['quiet_windows']}")
+        return ', '.join(parts)
+
+    def _stagger_seconds(self, job_id: str) -> float:
+        """Random delay that spreads jobs starting together across (up to) their interval"""
         job = self.jobs[job_id]
+        spread = float(os.getenv('SCHEDULE_STARTUP_STAGGER', 60))
+        if job['run_interval'] > 0:
+            spread = min(spread, job['run_interval'])
+        return random.uniform(0, max(spread, 0))
+
+    def _next_run_time(self, job_id: str, first: bool = False, staggered: bool = False) -> datetime:
+        """
+        When a scheduled job should run next: its cron match or interval, plus jitter, outside quiet windows
+        first is the run right after start_job; staggered (auto-start at boot) delays it by the
+        job's start_offset, or a random share of its interval, so jobs don't all hit SAP at once.
+        """
+        job = self.jobs[job_id]
+        now = datetime.now()
+
+        if job['schedule']:
+            run_time = job['schedule'].next_after(now)
+        elif first:
+            offset = 0
+            if staggered:
+                offset = job['start_offset'] if job['start_offset'] is not None else self._stagger_seconds(job_id)
+            run_time = now + timedelta(seconds=offset)
+        else:
+            run_time = now + timedelta(seconds=job['run_interval'])
+
+        if job['jitter']:
+            run_time += timedelta(seconds=random.uniform(0, job['jitter']))
+
+        deferred = job['quiet_windows'].defer(run_time)
+        if deferred != run_time:
+            # Spread the runs held back by the window instead of releasing them together
+            deferred += timedelta(seconds=self._stagger_seconds(job_id))
+            job['logs'].append({
+                'timestamp': datetime.now(self.AEST).isoformat(),
+                'level': 'INFO',
+                'message': f"🌙 Run moved out of quiet window ({job['quiet_windows']}) to {deferred.isoformat(timespec='seconds')}"
+            })
+        return deferred
 
-        try:
-            while job['status'] == JobStatus.SCHEDULED:
-                current_time = datetime.now()
+    def _schedule_next_run(self, job_id: str):
+        """Put the job's next_run_time on the supervisor's timer heap"""
+        delay = (self.jobs[job_id]['next_run_time'] - datetime.now()).total_seconds()
+        self._supervisor.schedule(job_id, delay, lambda: self._run_scheduled(job_id))
 
-                if current_time >= job['next_run_time']:
-                    self.logger.info(f"Running scheduled job {job_id}")
+    async def _run_scheduled(self, job_id: str):
+        """Run a scheduled job once it is due, then schedule the next run"""
+        job = self.jobs[job_id]
+        if job['status'] != JobStatus.SCHEDULED or job['run_active']:
+            return
 
-                    # Add log entry for job start
-                    log_entry = {
-                        'timestamp': current_time.isoformat(),
-                        'level': 'INFO',
-                        'message': f"🚀 Starting scheduled run #{job['run_count'] + 1}"
-                    }
-                    job['log_queue'].put(log_entry)
+        job['run_active'] = True
+        # Upstream runs from here on count towards the next triggered run
+        job['upstream_done'].clear()
+        try:
+            current_time = datetime.now()
+            self.logger.info(f"Running scheduled job {job_id}")
 
-                    # Run the job
-                    job['last_run_time'] = current_time
-                    job['run_count'] += 1
-                    success = self._execute_job_run(job_id)
+            # Add log entry for job start
+            log_entry = {
+                'timestamp': current_time.isoformat(),
+                'level': 'INFO',
+                'message': f"🚀 Starting scheduled run #{job['run_count'] + 1}"
+            }
+            job['logs'].append(log_entry)
 
-                    # Schedule next run
-                    job['next_run_time'] = datetime.now() + timedelta(seconds=job['run_interval'])
+            # Run the job
+            job['last_run_time'] = current_time
+            job['run_count'] += 1
+            success = await self._execute_job_run(job_id)
 
-                    if not success and job['restart_count'] >= job['max_restarts']:
-                        self.logger.error(f"Job {job_id} exceeded max restarts ({job['max_restarts']})")
-                        job['status'] = JobStatus.FAILED
-                        job['end_time'] = datetime.now()
-                        break
+            # Schedule next run (dependent jobs wait for their upstream jobs instead)
+            job['next_run_time'] = None if job['depends_on'] else self._next_run_time(job_id)
 
-                # Sleep for a short interval before checking again
-                time.sleep(1)
+            if not success and job['restart_count'] >= job['max_restarts']:
+                self.logger.error(f"Job {job_id} exceeded max restarts ({job['max_restarts']})")
+                job['status'] = JobStatus.FAILED
+                job['end_time'] = datetime.now()
+            elif job['status'] == JobStatus.SCHEDULED and not job['depends_on']:
+                # Not stopped while the run was in progress
+                self._schedule_next_run(job_id)
+
+            if success:
+                self._trigger_dependents(job_id)
 
         except Exception as e:
             self.logger.error(f"Error in scheduler for job {job_id}: {e}")
             job['status'] = JobStatus.FAILED
             job['end_time'] = datetime.now()
+        finally:
+            job['run_active'] = False
+            # Upstream jobs that finished again while this run was going trigger the next one now
+            self._trigger_if_ready(job_id)
+            self._notify_change()
+
+    def _runs_in_chain(self, job_id: str) -> bool:
+        """True if the job runs in its upstream job's worker (see job_chain.py) rather than on its own"""
+        job = self.jobs[job_id]
+        if not job['chain'] or len(job['depends_on']) != 1 or not job['module']:
+            return False
+        upstream = self.jobs.get(job['depends_on'][0])
+        return bool(upstream and upstream['module'] and not upstream['daemon'] and upstream['is_scheduled'])
+
+    def _chained_dependents(self, job_id: str) -> List[str]:
+        """Started jobs to run after this one in its worker process"""
+        return [dependent_id for dependent_id, dependent in self.jobs.items()
+                if dependent['depends_on'] == [job_id] and self._runs_in_chain(dependent_id)
+                and dependent['status'] == JobStatus.SCHEDULED]
+
+    def _trigger_dependents(self, job_id: str):
+        """Note a successful run of job_id, and run the dependents whose upstream jobs have all finished"""
+        for dependent_id, dependent in self.jobs.items():
+            # Chained dependents ran in job_id's worker already
+            if job_id not in dependent['depends_on'] or self._runs_in_chain(dependent_id):
+                continue
+            dependent['upstream_done'].add(job_id)
+            self._trigger_if_ready(dependent_id)
+
+    def _trigger_if_ready(self, job_id: str):
+        """Start a run of a dependent job once every job it depends on has succeeded since its last run"""
+        job = self.jobs[job_id]
+        if (job['depends_on'] and job['status'] == JobStatus.SCHEDULED and not job['run_active']
+                and set(job['depends_on']) <= job['upstream_done']):
+            job['next_run_time'] = datetime.now()
+            self._supervisor.spawn(self._run_scheduled(job_id))
 
-    def _execute_job_run(self, job_id: str) -> bool:
+    async def _execute_job_run(self, job_id: str) -> bool:
         """Execute a single run of a job"""
         job = self.jobs[job_id]
 
         try:
             # Start the process
-            process = subprocess.Popen(
-                job['command'],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.STDOUT,
-                universal_newlines=True,
-                bufsize=1
-            )
-
-            # Read output and add to logs
-            for line in iter(process.stdout.readline, ''):
-                if line:
-                    log_entry = {
-                        'timestamp': datetime.now(self.AEST).isoformat(),
-                        'level': 'INFO',
-                        'message': line.strip()
-                    }
-                    job['log_queue'].put(log_entry)
+            run_started = time.monotonic()
+            started_at = datetime.now()
+            job['dispatch_time'] = run_started
+            job['run_timed_out'] = False
+            job['run_result'] = None
+            chained = self._chained_dependents(job_id)
+            process = await self._spawn_process(job_id, chained)
+            job['process'] = process
+
+            # Read output and add to logs, killing the run if it hangs past its timeout
+            try:
+                await asyncio.wait_for(self._read_output(job_id, process), job['run_timeout'] or None)
+            except asyncio.TimeoutError:
+                await self._kill_hung_run(job_id, process)
 
             # Wait for completion
-            return_code = process.wait()
+            return_code = await process.wait()
+            if job['chain_step']:
+                # Killed or crashed part-way through a chained job
+                self._close_chain_step(job_id, None)
 
-            if return_code == 0:
+            outcome = 'timeout' if job['run_timed_out'] else ('success' if return_code == 0 else 'failure')
+            self._record_run(job_id, outcome, time.monotonic() - run_started,
+                             started_at=started_at, exit_code=return_code, result=job['run_result'])
+            self._check_profile_written(job_id)
+
+            if return_code == 0 and not job['run_timed_out']:
                 log_entry = {
                     'timestamp': datetime.now(self.AEST).isoformat(),
                     'level': 'INFO',
                     'message': f"✅ Job run completed successfully"
                 }
-                job['log_queue'].put(log_entry)
+                job['logs'].append(log_entry)
                 return True
             else:
                 log_entry = {
                     'timestamp': datetime.now(self.AEST).isoformat(),
                     'level': 'ERROR',
-                    'message': f"❌ Job run failed with return code {return_code}"
+                    'message': (f"❌ Job run killed after exceeding timeout of {job['run_timeout']}s"
+                                if job['run_timed_out'] else f"❌ Job run failed with return code {return_code}")
                 }
-                job['log_queue'].put(log_entry)
+                job['logs'].append(log_entry)
                 job['restart_count'] += 1
                 return False
 
         except Exception as e:
+            JOB_RUNS.inc(job=job_id, status='failure')
             log_entry = {
                 'timestamp': datetime.now(self.AEST).isoformat(),
                 'level': 'ERROR',
                 'message': f"❌ Job execution error: {str(e)}"
             }
-            job['log_queue'].put(log_entry)
+            job['logs'].append(log_entry)
             job['restart_count'] += 1
             return False
 
+    async def _spawn_process(self, job_id: str, chained: Optional[List[str]] = None):
+        """Start a job process using the job's execution backend (with any chained jobs run after it)"""
+        job = self.jobs[job_id]
+
+        # The job's SAP budget priority, and a requested profile as SYNC_PROFILE_OUTPUT, ride along with this run
+        run_env = {'SAP_PRIORITY': job['sap_priority']}
+        if job['profile_next_run']:
+            job['profile_next_run'] = False
+            job['pending_profile'] = new_profile_path(job_id)
+            run_env[PROFILE_ENV] = job['pending_profile']
+            job['logs'].append({
+                'timestamp': datetime.now(self.AEST).isoformat(),
+                'level': 'INFO',
+                'message': "🔬 Profiling this run with cProfile"
+            })
+
+        # command is ['python', '<script>.py', *args]
+        module, args = job['module'], job['command'][2:]
+        if chained:
+            module = 'job_chain'
+            args = [f"{step}={self.jobs[step]['module']}:{self.jobs[step]['sap_priority']}" for step in [job_id, *chained]]
+            job['logs'].append({
+                'timestamp': datetime.now(self.AEST).isoformat(),
+                'level': 'INFO',
+                'message': f"🔗 Running {', '.join(chained)} after this job in the same worker"
+            })
+
+        if job['execution_backend'] == 'warm_pool' and module:
+            from warm_worker_pool import get_warm_pool
+            # Dispatch blocks on the fork server's reply (and may start it), so keep it off the event loop
+            warm_run = await asyncio.get_running_loop().run_in_executor(
+                None, lambda: get_warm_pool().run(module, args, env=run_env))
+            return await attach_warm_run(warm_run)
+
+        command = [job['command'][0], f'{module}.py', *args] if chained else job['command']
+        return await start_subprocess(command, env={**os.environ, **run_env})
+
+    async def _read_output(self, job_id: str, process):
+        """Feed a process's output to _handle_output_line until it closes"""
+        job = self.jobs[job_id]
+        async for line in read_lines(process.stdout):
+            # A job chain marks where each job's part of the output starts and ends
+            status = parse_status_line(line.strip()) if 'chain_step' in line[:64] else None
+            if status and status.get('event') == 'chain_step':
+                self._open_chain_step(job_id, status.get('job'))
+            elif status and status.get('event') == 'chain_step_end':
+                self._close_chain_step(job_id, status)
+            else:
+                self._handle_output_line(job['chain_step'] or job_id, line)
+
+    def _open_chain_step(self, owner_id: str, step_id: str):
+        """A chained job starts in owner_id's worker - its output and run belong to it from here"""
+        if step_id == owner_id or step_id not in self.jobs:
+            return
+
+        step = self.jobs[step_id]
+        self.jobs[owner_id]['chain_step'] = step_id
+        step['chain_owner'] = owner_id
+        step['chain_step_started'] = datetime.now()
+        step['run_active'] = True
+        step['upstream_done'].clear()
+        step['last_run_time'] = step['chain_step_started']
+        step['run_count'] += 1
+        step['run_result'] = None
+        step['logs'].append({
+            'timestamp': datetime.now(self.AEST).isoformat(),
+            'level': 'INFO',
+            'message': f"🔗 Starting run #{step['run_count']} in {owner_id}'s worker"
+        })
+        self._notify_change()
+
+    def _close_chain_step(self, owner_id: str, status: Optional[Dict]):
+        """
+        A step of owner_id's job chain finished (status is its chain_step_end line, or None
+        if the worker died during the step): record the chained job's run
+        """
+        step_id = self.jobs[owner_id]['chain_step'] or owner_id
+        step = self.jobs[step_id]
+        if step_id == owner_id:
+            # The upstream job's own run is recorded when the process exits
+            return
+
+        self.jobs[owner_id]['chain_step'] = None
+        exit_code = status.get('exit_code') if status else None
+        started = step['chain_step_started'] or datetime.now()
+        duration = status.get('duration_seconds') if status else (datetime.now() - started).total_seconds()
+        success = exit_code == 0
+        self._record_run(step_id, 'success' if success else 'failure', duration,
+                         started_at=started, exit_code=exit_code, result=step['run_result'])
+        step['chain_owner'] = None
+        step['run_active'] = False
+
+        if success:
+            step['logs'].append({
+                'timestamp': datetime.now(self.AEST).isoformat(),
+                'level': 'INFO',
+                'message': "✅ Job run completed successfully"
+            })
+            self._trigger_dependents(step_id)
+        else:
+            step['logs'].append({
+                'timestamp': datetime.now(self.AEST).isoformat(),
+                'level': 'ERROR',
+                'message': (f"❌ Job run failed with return code {exit_code}" if status
+                            else f"❌ Job run ended when {owner_id}'s worker exited")
+            })
+            step['restart_count'] += 1
+            if step['restart_count'] >= step['max_restarts'] and step['status'] == JobStatus.SCHEDULED:
+                self.logger.error(f"Job {step_id} exceeded max restarts ({step['max_restarts']})")
+                step['status'] = JobStatus.FAILED
+                step['end_time'] = datetime.now()
+        self._notify_change()
+
+    async def _kill_hung_run(self, job_id: str, process):
+        """Kill a run that exceeded the job's run_timeout"""
+        job = self.jobs[job_id]
+        if process.poll() is not None:
+            return
+
+        job['run_timed_out'] = True
+        job['logs'].append({
+            'timestamp': datetime.now(self.AEST).isoformat(),
+            'level': 'ERROR',
+            'message': f"⏱️ Run exceeded timeout of {job['run_timeout']}s - killing PID {process.pid}"
+        })
+        process.terminate()
+        try:
+            await asyncio.wait_for(process.wait(), 5)
+        except asyncio.TimeoutError:
+            process.kill()
+
+    def _handle_output_line(self, job_id: str, line: str):
+        """Route one line of job output to the logs or the job's structured status"""
+        job = self.jobs[job_id]
+        line = line.strip()
+
+        # First output of a run marks how long the process took to get going
+        if job.get('dispatch_time') is not None:
+            job['last_start_latency_ms'] = round((time.monotonic() - job['dispatch_time']) * 1000, 1)
+            job['dispatch_time'] = None
+
+        status = parse_status_line(line)
+        if status is None:
+            # Job loggers write JSON lines (sync_logging); anything else is plain output
+            log_entry = parse_log_line(line) or {
+                'timestamp': datetime.now(self.AEST).isoformat(),
+                'level': 'INFO',
+                'message': line
+            }
+            job['logs'].append(log_entry)
+            return
+
+        event = status.get('event')
+        self._notify_change()
+        if event in ('iteration_end', 'run_complete'):
+            job['last_result'] = status.get('result')
+            if event == 'run_complete':
+                job['run_result'] = status.get('result')
+            # Per-stage timing summary of the run (count, total, p50/p95/max per stage)
+            job['last_timings'] = (status.get('result') or {}).get('timings')
+            self._record_result_metrics(job_id, status.get('result') or {})
+
+        if event == 'stage_histograms':
+            histograms = status.get('histograms') or {}
+            for stage_name, data in (histograms.get('stages') or {}).items():
+                STAGE_DURATION.merge(data['counts'], data['sum'], histograms.get('buckets', []),
+                                     job=job_id, stage=stage_name)
+            return
+
+        if event == 'profile_written':
+            job['pending_profile'] = None
+            job['last_profile'] = os.path.basename(status.get('path', ''))
+            prune_profiles(job_id)
+            job['logs'].append({
+                'timestamp': datetime.now(self.AEST).isoformat(),
+                'level': 'INFO',
+                'message': f"🔬 Run profile saved ({job['last_profile']}) - view it on the jobs page"
+            })
+            return
+
+        if event == 'checkpoint':
+            # Latest progress record per checkpoint key (one per barcode worker slot)
+            job['checkpoints'][status.get('key', 'checkpoint')] = status.get('checkpoint')
+        elif event == 'iteration_start':
+            job['last_run_time'] = datetime.now()
+        elif event == 'quiet_window':
+            job['next_run_time'] = datetime.fromisoformat(status['next_run_time']).astimezone().replace(tzinfo=None)
+        elif event == 'iteration_end':
+            job['run_count'] += 1
+            self._record_run(job_id, 'success' if status.get('status') == 'success' else 'failure',
+                             status.get('duration_seconds') or 0.0, result=status.get('result'))
+            if status.get('status') == 'success':
+                self._trigger_dependents(job_id)
+            if status.get('next_run_time'):
+                job['next_run_time'] = datetime.fromisoformat(status['next_run_time']).astimezone().replace(tzinfo=None)
+
+            level = 'INFO' if status.get('status') == 'success' else 'ERROR'
+            message = f"🔁 Daemon iteration #{status.get('iteration')} {status.get('status')} in {status.get('duration_seconds')}s"
+            if status.get('error'):
+                message += f" - {status['error']}"
+            job['logs'].append({
+                'timestamp': datetime.now(self.AEST).isoformat(),
+                'level': level,
+                'message': message
+            })
+
+    def _check_profile_written(self, job_id: str):
+        """Report a requested profile that the finished process never wrote"""
+        job = self.jobs[job_id]
+        if not job['pending_profile']:
+            return
+        job['pending_profile'] = None
+        # A daemon that stopped before its next iteration leaves the request behind
+        cancel_profile_request(job_id)
+        job['logs'].append({
+            'timestamp': datetime.now(self.AEST).isoformat(),
+            'level': 'WARNING',
+            'message': "⚠️ Requested profile was not written - the run ended before its timed sync function finished"
+        })
+
+    def _record_run(self, job_id: str, outcome: str, duration_seconds: float, started_at: Optional[datetime] = None,
+                    exit_code: Optional[int] = None, result: Optional[Dict] = None):
+        """Record a finished run (or daemon iteration) in the job metrics and the run history"""
+        JOB_RUNS.inc(job=job_id, status=outcome)
+        JOB_RUN_DURATION.observe(duration_seconds, job=job_id)
+        self.jobs[job_id]['last_duration'] = duration_seconds
+        if outcome == 'success':
+            JOB_LAST_SUCCESS.set(time.time(), job=job_id)
+
+        ended_at = datetime.now()
+        started_at = started_at or ended_at - timedelta(seconds=duration_seconds)
+        submit_run(job_id, started_at, ended_at, outcome, exit_code, result)
+
+    def get_run_trends(self, job_id: str, days: int = 30) -> Optional[Dict]:
+        """Get per-day p50/p95 run duration and items per second, plus the latest runs, from the run history"""
+        if job_id not in self.jobs:
+            return None
+        return run_trends(job_id, days)
+
+    def _record_result_metrics(self, job_id: str, result: Dict):
+        """Record item and cache counts reported in a run's result"""
+        JOB_ITEMS_PROCESSED.inc(result.get('processed') or 0, job=job_id)
+        JOB_ITEM_ERRORS.inc(result.get('errors') or 0, job=job_id)
+        for cache_name, stats in (result.get('cache_stats') or {}).items():
+            CACHE_REQUESTS.inc(stats.get('hits', 0), job=job_id, cache=cache_name, result='hit')
+            CACHE_REQUESTS.inc(stats.get('misses', 0), job=job_id, cache=cache_name, result='miss')
+
+    def record_console_query(self, duration_seconds: float, rows: int, status: str):
+        """Record a web SQL console query in the metrics"""
+        CONSOLE_QUERIES.inc(status=status)
+        CONSOLE_QUERY_DURATION.observe(duration_seconds, status=status)
+        if status == 'success':
+            CONSOLE_RESULT_ROWS.observe(rows)
+        return True
+
+    def render_metrics(self) -> str:
+        """Prometheus text exposition of all metrics"""
+        for job_id, job in list(self.jobs.items()):
+            JOB_UP.set(1 if job['status'] in (JobStatus.RUNNING, JobStatus.SCHEDULED) else 0, job=job_id)
+            JOB_RESTARTS.set(job['restart_count'], job=job_id)
+        budget = budget_usage()
+        SAP_BUDGET_SLOTS.set(budget['concurrency'])
+        SAP_BUDGET_IN_USE.set(budget['in_use'])
+        return REGISTRY.render()
+
+    def get_sap_budget(self) -> Dict:
+        """SAP request budget usage on this host (slot holders and queued priorities)"""
+        return budget_usage()
+
     def stop_job(self, job_id: str) -> bool:
         """Stop a running job"""
+        return self._supervisor.run(self._stop_job(job_id))
+
+    async def _stop_job(self, job_id: str) -> bool:
+        """stop_job, on the supervisor loop"""
         if job_id not in self.jobs:
             return False
 
@@ -245,20 +773,24 @@ class JobManager:
             return True
 
         try:
+            # Stopped first, so the finishing run neither reschedules nor auto-restarts
+            job['status'] = JobStatus.STOPPED
+            self._supervisor.cancel(job_id)
+
             # Stop any running process
-            if job['process']:
+            if job['process'] and job['process'].poll() is None:
                 job['process'].terminate()
                 # Wait a bit for graceful shutdown
                 try:
-                    job['process'].wait(timeout=5)
-                except subprocess.TimeoutExpired:
+                    await asyncio.wait_for(job['process'].wait(), 5)
+                except asyncio.TimeoutError:
                     # Force kill if it doesn't terminate gracefully
                     job['process'].kill()
-                    job['process'].wait()
+                    await job['process'].wait()
 
-            job['status'] = JobStatus.STOPPED
             job['end_time'] = datetime.now()
             self.logger.info(f"Stopped job {job_id}")
+            self._notify_change()
             return True
 
         except Exception as e:
@@ -271,6 +803,18 @@ class JobManager:
         time.sleep(1)  # Brief pause
         return self.start_job(job_id)
 
+    def start_auto_start_jobs(self):
+        """Start every registered job configured with auto_start"""
+        for job_id, job in self.jobs.items():
+            if job['auto_start']:
+                self.logger.info(f"Auto-starting job: {job_id}")
+                self._supervisor.run(self._start_job(job_id, staggered=True))
+
+    def stop_all_jobs(self):
+        """Stop every running or scheduled job"""
+        for job_id in list(self.jobs.keys()):
+            self.stop_job(job_id)
+
     def get_job_status(self, job_id: str) -> Optional[Dict]:
         """Get current status of a job"""
         if job_id not in self.jobs:
@@ -283,7 +827,17 @@ class JobManager:
             'description': job['description'],
             'status': job['status'].value,
             'is_scheduled': job['is_scheduled'],
+            'daemon': job['daemon'],
+            'execution_backend': job['execution_backend'],
+            'sap_priority': job['sap_priority'],
             'run_interval': job['run_interval'],
+            'schedule': str(job['schedule']) if job['schedule'] else None,
+            'jitter': job['jitter'],
+            'quiet_windows': str(job['quiet_windows']) or None,
+            'depends_on': job['depends_on'],
+            'chain': self._runs_in_chain(job_id),
+            'running_in': job['chain_owner'],
+            'last_duration_seconds': job['last_duration'],
             'start_time': job['start_time'].isoformat() if job['start_time'] else None,
             'end_time': job['end_time'].isoformat() if job['end_time'] else None,
             'last_run_time': job['last_run_time'].isoformat() if job['last_run_time'] else None,
@@ -294,54 +848,124 @@ class JobManager:
             'auto_restart': job['auto_restart'],
             'enabled': job['enabled'],
             'pid': job['process'].pid if job['process'] and job['status'] == JobStatus.RUNNING else None,
-            'log_count': len(job['logs'])
+            'log_count': len(job['logs']),
+            'log_buffer': job['logs'].stats(),
+            'last_result': job['last_result'],
+            'last_start_latency_ms': job['last_start_latency_ms'],
+            'checkpoints': job['checkpoints'],
+            'last_timings': job['last_timings'],
+            'profile_pending': job['profile_next_run'] or job['pending_profile'] is not None,
+            'last_profile': job['last_profile']
         }
 
     def get_all_jobs_status(self) -> List[Dict]:
         """Get status of all registered jobs"""
         return [self.get_job_status(job_id) for job_id in self.jobs.keys()]
 
-    def get_job_logs(self, job_id: str, lines: int = 100) -> List[Dict]:
-        """Get recent logs for a job"""
+    def get_dependency_graph(self) -> Dict:
+        """
+        Get the job dependency graph (nodes and upstream -> dependent edges) and its critical path,
+        the slowest chain of dependent runs by each job's latest run duration
+        """
+        edges = [{'from': upstream, 'to': job_id, 'chained': self._runs_in_chain(job_id),
+                  'missing': upstream not in self.jobs}
+                 for job_id, job in self.jobs.items() for upstream in job['depends_on']]
+        linked = {edge['from'] for edge in edges if not edge['missing']} | {edge['to'] for edge in edges}
+
+        nodes = [{
+            'job_id': job_id,
+            'name': self.jobs[job_id]['name'],
+            'status': self.jobs[job_id]['status'].value,
+            'depends_on': self.jobs[job_id]['depends_on'],
+            'running_in': self.jobs[job_id]['chain_owner'],
+            'last_duration_seconds': self.jobs[job_id]['last_duration']
+        } for job_id in self.jobs if job_id in linked]
+
+        # Longest path ending at each job (registration guarantees there are no cycles)
+        longest = {}
+
+        def path_to(job_id):
+            if job_id not in longest:
+                upstream_paths = [path_to(upstream) for upstream in self.jobs[job_id]['depends_on']
+                                  if upstream in self.jobs]
+                duration, path = max(upstream_paths, key=lambda item: item[0], default=(0.0, []))
+                longest[job_id] = (duration + (self.jobs[job_id]['last_duration'] or 0.0), path + [job_id])
+            return longest[job_id]
+
+        critical_path = None
+        if nodes:
+            duration, path = max((path_to(node['job_id']) for node in nodes), key=lambda item: item[0])
+            critical_path = {
+                'jobs': path,
+                'duration_seconds': round(duration, 3),
+                # Not run since the scheduler started, so counted as 0s
+                'unmeasured': [job_id for job_id in path if self.jobs[job_id]['last_duration'] is None]
+            }
+        return {'nodes': nodes, 'edges': edges, 'critical_path': critical_path}
+
+    def profile_next_run(self, job_id: str) -> bool:
+        """Profile the job's next run (for a running daemon job, its next iteration)"""
         if job_id not in self.jobs:
-            return []
+            return False
 
         job = self.jobs[job_id]
+        if job['daemon'] and job['status'] == JobStatus.RUNNING and job['process'] and job['pending_profile'] is None:
+            # The daemon is past its start - it picks the request up at its next iteration
+            job['pending_profile'] = new_profile_path(job_id)
+            request_profile(job_id, job['pending_profile'])
+            message = "🔬 Next daemon iteration will be profiled"
+        else:
+            job['profile_next_run'] = True
+            message = "🔬 Next run will be profiled"
+        job['logs'].append({
+            'timestamp': datetime.now(self.AEST).isoformat(),
+            'level': 'INFO',
+            'message': message
+        })
+        self.logger.info(f"Profiling requested for next run of job {job_id}")
+        return True
 
-        # Get any new logs from queue (non-blocking)
-        new_logs_added = 0
-        while new_logs_added < 50:  # Limit to prevent hanging
-            try:
-                log_entry = job['log_queue'].get_nowait()
-                job['logs'].append(log_entry)
-                new_logs_added += 1
-            except queue.Empty:
-                break
+    def get_job_profile(self, job_id: str, limit: int = 25) -> Optional[Dict]:
+        """Get the top functions by cumulative time from the job's latest profile"""
+        if job_id not in self.jobs:
+            return None
+
+        profiles = list_profiles(job_id)
+        if not profiles:
+            return {'profile': None, 'functions': []}
+        return top_functions(profiles[-1], limit)
 
-        # Ensure we have logs - if empty, try reading from log file
+    def get_slowest_spans(self, job_id: str, limit: int = 20) -> Optional[Dict]:
+        """Get the slowest spans of a job's most recent traced run"""
+        if job_id not in self.jobs:
+            return None
+        return slowest_spans(self.jobs[job_id]['module'] or job_id, limit)
+
+    def get_log_history(self, job_id: str, lines: int = 100, before: Optional[str] = None) -> Dict:
+        """Read log entries from the end of the job's log file, paging back with the returned cursor"""
+        if job_id not in self.jobs:
+            return {'logs': [], 'cursor': None}
+
+        log_file = f"{self.jobs[job_id]['module'] or job_id}.log"
+        tail = read_log_tail(log_file, lines, before)
+        # Log files hold JSON lines (see sync_logging)
+        entries = [entry for entry in map(parse_log_line, tail['lines']) if entry]
+        return {'logs': entries, 'cursor': tail['cursor']}
+
+    def get_job_logs(self, job_id: str, lines: int = 100, since: Optional[int] = None) -> List[Dict]:
+        """Get recent logs for a job (or only those after sequence number since)"""
+        if job_id not in self.jobs:
+            return []
+
+        job = self.jobs[job_id]
+        if since is not None:
+            return job['logs'].since(since, lines)
+
+        # Ensure we have logs - if empty, read the tail of the log file
         if not job['logs'] and job_id in ['barcode_sync', 'serial_number_sync', 'staff_sync']:
             try:
-                log_file = f"{job_id}.log"
-                if os.path.exists(log_file):
-                    with open(log_file, 'r') as f:
-                        file_lines = f.readlines()
-
-                    # Convert file lines to log entries
-                    for line in file_lines[-lines:]:
-                        if line.strip():
-                            # Parse log line format: "2025-09-25 22:35:06,558 - INFO - message"
-                            parts = line.strip().split(' - ', 2)
-                            if len(parts) >= 3:
-                                timestamp_str = parts[0].replace(',', '.')
-                                level = parts[1]
-                                message = parts[2]
-
-                                log_entry = {
-                                    'timestamp': timestamp_str,
-                                    'level': level,
-                                    'message': message
-                                }
-                                job['logs'].append(log_entry)
+                for entry in self.get_log_history(job_id, lines)['logs']:
+                    job['logs'].append(entry)
             except Exception as e:
                 # If file reading fails, add an error log
                 log_entry = {
@@ -352,7 +976,7 @@ class JobManager:
                 job['logs'].append(log_entry)
 
         # Return most recent logs, ensuring stability
-        recent_logs = job['logs'][-lines:] if job['logs'] else []
+        recent_logs = job['logs'].tail(lines)
 
         # If still no logs, provide a placeholder
         if not recent_logs:
@@ -364,29 +988,64 @@ class JobManager:
 
         return recent_logs
 
-    def _monitor_job(self, job_id: str):
+    def wait_for_updates(self, log_cursors: Dict[str, List], change_seq: int, timeout: float = 5.0) -> Dict:
+        """
+        Block until something changed since change_seq (or timeout), then return the
+        log entries after each job's cursor and the current change sequence
+        A cursor is [buffer epoch, sequence number]; one taken from another buffer (this
+        process restarted, or leadership moved) gets the job's recent tail instead, and
+        the job is listed under 'reset'
+        """
+        log_cursors = {job_id: cursor for job_id, cursor in (log_cursors or {}).items() if job_id in self.jobs}
+        stale = [job_id for job_id, (epoch, _) in log_cursors.items() if epoch != self.jobs[job_id]['logs'].epoch]
+
+        timeout = 0.0 if stale else min(max(timeout, 0.0), 30.0)
+        with self._changed:
+            self._changed.wait_for(lambda: self._change_seq != change_seq, timeout)
+            current = self._change_seq
+
+        logs = {}
+        for job_id, (_, seq) in log_cursors.items():
+            if job_id in stale:
+                logs[job_id] = self.get_job_logs(job_id, 100)
+                continue
+            entries = self.jobs[job_id]['logs'].since(int(seq), 500)
+            if entries:
+                logs[job_id] = entries
+        return {
+            'change_seq': current,
+            'logs': logs,
+            'reset': stale,
+            'epochs': {job_id: self.jobs[job_id]['logs'].epoch for job_id in log_cursors}
+        }
+
+    async def _monitor_job(self, job_id: str):
         """Monitor a running job and capture its output"""
         job = self.jobs[job_id]
         process = job['process']
 
         try:
             # Read output line by line
-            for line in iter(process.stdout.readline, ''):
-                if line:
-                    log_entry = {
-                        'timestamp': datetime.now(self.AEST).isoformat(),
-                        'level': 'INFO',
-                        'message': line.strip()
-                    }
-                    job['log_queue'].put(log_entry)
+            await self._read_output(job_id, process)
 
             # Wait for process to complete
-            return_code = process.wait()
+            return_code = await process.wait()
+            self._check_profile_written(job_id)
+            if job['status'] != JobStatus.RUNNING or job['process'] is not process:
+                # Stopped (or restarted) from outside - stop_job has recorded that already
+                return
+            if not job['daemon']:
+                # Daemon jobs report each iteration as a run instead
+                started = job['start_time'] or datetime.now()
+                self._record_run(job_id, 'success' if return_code == 0 else 'failure',
+                                 (datetime.now() - started).total_seconds(),
+                                 started_at=started, exit_code=return_code, result=job['run_result'])
 
             # Update job status based on return code
             if return_code == 0:
                 job['status'] = JobStatus.COMPLETED
                 self.logger.info(f"Job {job_id} completed successfully")
+                self._trigger_dependents(job_id)
             else:
                 job['status'] = JobStatus.FAILED
                 self.logger.error(f"Job {job_id} failed with return code {return_code}")
@@ -396,14 +1055,19 @@ class JobManager:
             # Handle auto-restart
             if job['auto_restart'] and job['status'] == JobStatus.FAILED:
                 self.logger.info(f"Auto-restarting job {job_id} in {job['restart_delay']} seconds")
-                time.sleep(job['restart_delay'])
+                await asyncio.sleep(job['restart_delay'])
+                if job['status'] != JobStatus.FAILED:
+                    # Started or stopped by hand during the delay
+                    return
                 job['restart_count'] += 1
-                self.start_job(job_id)
+                await self._start_job(job_id)
 
         except Exception as e:
             self.logger.error(f"Error monitoring job {job_id}: {e}")
             job['status'] = JobStatus.FAILED
             job['end_time'] = datetime.now()
+        finally:
+            self._notify_change()
 
 # Global job manager instance
 job_manager = JobManager()
@@ -431,15 +1095,17 @@ def initialize_jobs():
         # Register all configured jobs
         for config in configs:
             logger.info(f"Registering job: {config['job_id']} - {config['name']}")
-            job_manager.register_job(config)
+            try:
+                job_manager.register_job(config)
+            except ValueError as e:
+                # A bad schedule or quiet window only takes out its own job
+                logger.error(f"❌ Job {config['job_id']} not registered: {e}")
+                continue
 
-            # Auto-start jobs if configured
-            if config.get('auto_start', False):
-                logger.info(f"Auto-starting job: {config['job_id']}")
-                job_manager.start_job(config['job_id'])
-            else:
+            if not config.get('auto_start', False):
                 logger.info(f"Job {config['job_id']} configured but not set to auto-start")
 
+        # Auto-start jobs are started by the elected scheduler leader (see scheduler_leader.py)
         logger.info("✅ Background jobs initialization completed")
 
     except Exception as e:
@@ -449,4 +1115,17 @@ def initialize_jobs():
 
 def get_job_manager():
     """Get the global job manager instance"""
-    return job_manager
\ No newline at end of file
+    return job_manager
+
+def start_scheduler():
+    """
+    Start scheduling in this process - directly, or once this process is elected leader
+    Call from the serving process (not the gunicorn master) after initialize_jobs()
+    """
+    from scheduler_leader import start_scheduler_leadership
+    return start_scheduler_leadership(job_manager)
+
+def get_job_controller():
+    """Get the job manager to control jobs with - local if this process leads, else a proxy to the leader"""
+    from scheduler_leader import get_job_controller as leader_controller
+    return leader_controller(job_manager)
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Job Schedules
+Cron expressions and quiet windows for scheduled jobs
+
+Both are evaluated in AEST, like every other timestamp in the app, and take and
+return naive local datetimes, which is what JobManager schedules with.
+"""
+
+import re
+from datetime import datetime, timedelta, timezone
+
+# Australian Eastern Standard Time (UTC+10)
+AEST = timezone(timedelta(hours=10))
+
+_MACROS = {
+    '@yearly': '0 0 1 1 *',
+    '@annually': '0 0 1 1 *',
+    '@monthly': '0 0 1 * *',
+    '@weekly': '0 0 * * 0',
+    '@daily': '0 0 * * *',
+    '@midnight': '0 0 * * *',
+    '@hourly': '0 * * * *'
+}
+
+_MONTH_NAMES = {name: number for number, name in enumerate(
+    ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec'], start=1)}
+_DAY_NAMES = {name: number for number, name in enumerate(['sun', 'mon', 'tue', 'wed', 'thu', 'fri', 'sat'])}
+
+def _to_aest(local_time):
+    return local_time.astimezone(AEST)
+
+def _to_local(aest_time):
+    return aest_time.astimezone().replace(tzinfo=None)
+
+def _parse_field(text, low, high, names=None):
+    """
+    One cron field (e.g. '*/15', '1-5', 'mon,wed', '0,30') as a set of allowed values
+    """
+    values = set()
+    for part in text.lower().split(','):
+        part, _, step_text = part.partition('/')
+        step = int(step_text) if step_text else 1
+        if step < 1:
+            raise ValueError(f"step must be positive in '{text}'")
+
+        if part == '*':
+            start, end = low, high
+        else:
+            bounds = [names.get(bound, bound) if names else bound for bound in part.split('-')]
+            if len(bounds) > 2:
+                raise ValueError(f"bad range '{part}'")
+            start = int(bounds[0])
+            # 'a/n' means a, a+n, ... up to the field maximum
+            end = int(bounds[1]) if len(bounds) == 2 else (high if step_text else start)
+
+        if start < low or end > high or start > end:
+            raise ValueError(f"'{part}' is outside {low}-{high}")
+        values.update(range(start, end + 1, step))
+    return values
+
+class CronSchedule:
+    """
+    Standard 5-field cron expression: minute hour day-of-month month day-of-week
+    Supports *, ranges, steps, lists, month/day names and the @hourly/@daily/... macros.
+    As in cron, when both day fields are restricted a day matching either one runs.
+    """
+    def __init__(self, expression: str):
+        self.expression = expression.strip()
+        fields = _MACROS.get(self.expression.lower(), self.expression).split()
+        if len(fields) != 5:
+            raise ValueError(f"Cron expression '{expression}' needs 5 fields (minute hour day month weekday)")
+
+        try:
+            self.minutes = _parse_field(fields[0], 0, 59)
+            self.hours = _parse_field(fields[1], 0, 23)
+            self.days = _parse_field(fields[2], 1, 31)
+            self.months = _parse_field(fields[3], 1, 12, {k: str(v) for k, v in _MONTH_NAMES.items()})
+            weekdays = _parse_field(fields[4], 0, 7, {k: str(v) for k, v in _DAY_NAMES.items()})
+        except ValueError as e:
+            raise ValueError(f"Invalid cron expression '{expression}': {e}") from None
+        # 7 is Sunday too; cron counts from Sunday, Python from Monday
+        self.weekdays = {(day - 1) % 7 for day in weekdays}
+        # As in cron, a field starting with '*' (*/2 too) leaves the other day field in charge
+        self._any_day = fields[2].startswith('*')
+        self._any_weekday = fields[4].startswith('*')
+
+    def _day_matches(self, when):
+        day_match = when.day in self.days
+        weekday_match = when.weekday() in self.weekdays
+        if self._any_day or self._any_weekday:
+            return day_match and weekday_match
+        return day_match or weekday_match
+
+    def next_after(self, local_time: datetime) -> datetime:
+        """The first matching minute strictly after local_time"""
+        when = _to_aest(local_time).replace(second=0, microsecond=0) + timedelta(minutes=1)
+        # Skips whole months/days/hours at a time; five years covers any satisfiable expression
+        limit = when + timedelta(days=5 * 366)
+        while when < limit:
+            if when.month not in self.months:
+                when = (when.replace(day=1, hour=0, minute=0) + timedelta(days=32)).replace(day=1)
+            elif not self._day_matches(when):
+                when = when.replace(hour=0, minute=0) + timedelta(days=1)
+            elif when.hour not in self.hours:
+                when = when.replace(minute=0) + timedelta(hours=1)
+            elif when.minute not in self.minutes:
+                when += timedelta(minutes=1)
+            else:
+                return _to_local(when)
+        raise ValueError(f"Cron expression '{self.expression}' never matches")
+
+    def __str__(self):
+        return self.expression
+
+class QuietWindows:
+    """
+    Daily AEST time windows in which scheduled runs must not start, e.g. '23:30-01:00,12:00-12:15'
+    A window may cross midnight.
+    """
+    _WINDOW = re.compile(r'^(\d{1,2}):(\d{2})\s*-\s*(\d{1,2}):(\d{2})$')
+
+    def __init__(self, text: str = ''):
+        self.text = (text or '').strip()
+        self.windows = []  # (start minute of day, end minute of day)
+        for part in filter(None, (part.strip() for part in self.text.split(','))):
+            match = self._WINDOW.match(part)
+            if not match:
+                raise ValueError(f"Quiet window '{part}' must look like HH:MM-HH:MM")
+            start_hour, start_minute, end_hour, end_minute = map(int, match.groups())
+            if start_hour > 23 or end_hour > 24 or start_minute > 59 or end_minute > 59:
+                raise ValueError(f"Quiet window '{part}' is not a valid time range")
+            self.windows.append((start_hour * 60 + start_minute, end_hour * 60 + end_minute))
+
+    def _window_end(self, when):
+        """End of the window containing when (AEST), or None"""
+        minute_of_day = when.hour * 60 + when.minute + when.second / 60 + when.microsecond / 60e6
+        midnight = when.replace(hour=0, minute=0, second=0, microsecond=0)
+        for start, end in self.windows:
+            if start <= end:
+                if start <= minute_of_day < end:
+                    return midnight + timedelta(minutes=end)
+            elif minute_of_day >= start:
+                return midnight + timedelta(days=1, minutes=end)
+            elif minute_of_day < end:
+                return midnight + timedelta(minutes=end)
+        return None
+
+    def defer(self, local_time: datetime) -> datetime:
+        """local_time, or the end of the quiet window(s) it falls in"""
+        when = _to_aest(local_time)
+        # Back-to-back windows are left one after another
+        for _ in range(len(self.windows) + 1):
+            window_end = self._window_end(when)
+            if window_end is None:
+                break
+            when = window_end
+        return _to_local(when) if when != _to_aest(local_time) else local_time
+
+    def __bool__(self):
+        return bool(self.windows)
+
+    def __str__(self):
+        return self.text
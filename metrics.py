@@ -0,0 +1,178 @@
+"""
+Metrics
+Minimal Prometheus-compatible counters, gauges and histograms with text exposition
+
+Metrics live in the process that runs the jobs (the scheduler leader); the
+web console reports its own query timings there too, so one scrape of
+/metrics on any worker sees everything.
+"""
+
+import math
+import threading
+
+# Seconds - covers fast MySQL statements up to multi-minute job runs
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + (extra or [])
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+def _format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+class _Metric:
+    metric_type = None
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry if registry is not None else REGISTRY).register(self)
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        with self._lock:
+            for key in sorted(self._values):
+                lines.extend(self._render_sample(key, self._values[key]))
+        return lines
+
+    def _render_sample(self, key, value):
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"]
+
+class Counter(_Metric):
+    """Monotonically increasing count"""
+    metric_type = 'counter'
+
+    def inc(self, amount=1, **labels):
+        if amount < 0:
+            raise ValueError("Counters can only increase")
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+class Gauge(_Metric):
+    """Value that can go up and down"""
+    metric_type = 'gauge'
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+class Histogram(_Metric):
+    """Distribution of observations over fixed buckets"""
+    metric_type = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames, registry)
+
+    def _series(self, key):
+        series = self._values.get(key)
+        if series is None:
+            series = self._values[key] = {'counts': [0] * (len(self.buckets) + 1), 'sum': 0.0}
+        return series
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        index = len(self.buckets)
+        for position, bound in enumerate(self.buckets):
+            if value <= bound:
+                index = position
+                break
+        with self._lock:
+            series = self._series(key)
+            series['counts'][index] += 1
+            series['sum'] += value
+
+    def merge(self, bucket_counts, total, buckets, **labels):
+        """
+        Add pre-aggregated observations (per-bucket counts, last entry is +Inf)
+        Returns False if they were bucketed differently and could not be merged
+        """
+        if tuple(sorted(buckets)) != self.buckets or len(bucket_counts) != len(self.buckets) + 1:
+            return False
+        key = self._key(labels)
+        with self._lock:
+            series = self._series(key)
+            for index, count in enumerate(bucket_counts):
+                series['counts'][index] += count
+            series['sum'] += total
+        return True
+
+    def _render_sample(self, key, series):
+        lines = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (math.inf,), series['counts']):
+            cumulative += count
+            labels = _format_labels(self.labelnames, key, [('le', _format_value(bound))])
+            lines.append(f"{self.name}_bucket{labels} {cumulative}")
+        base_labels = _format_labels(self.labelnames, key)
+        lines.append(f"{self.name}_sum{base_labels} {_format_value(round(series['sum'], 6))}")
+        lines.append(f"{self.name}_count{base_labels} {cumulative}")
+        return lines
+
+class Registry:
+    """Set of metrics rendered together"""
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """Prometheus text exposition format (version 0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+REGISTRY = Registry()
+
+# Job runs (recorded by JobManager from run exits and job status events)
+JOB_RUNS = Counter('d1sapsync_job_runs_total', 'Completed job runs by outcome', ['job', 'status'])
+JOB_RUN_DURATION = Histogram('d1sapsync_job_run_duration_seconds', 'Job run duration', ['job'])
+JOB_ITEMS_PROCESSED = Counter('d1sapsync_job_items_processed_total', 'Items processed by job runs', ['job'])
+JOB_ITEM_ERRORS = Counter('d1sapsync_job_item_errors_total', 'Items that failed to sync', ['job'])
+JOB_RESTARTS = Gauge('d1sapsync_job_restarts', 'Restart count of the job since it was last started', ['job'])
+JOB_UP = Gauge('d1sapsync_job_up', '1 if the job is running or scheduled', ['job'])
+JOB_LAST_SUCCESS = Gauge('d1sapsync_job_last_success_timestamp_seconds',
+                         'Unix time of the last successful run', ['job'])
+
+# Stage latency inside job runs - sap.query, mysql.<statement>, mysql.connect, phase.*
+STAGE_DURATION = Histogram('d1sapsync_stage_duration_seconds', 'Duration of timed stages inside job runs',
+                           ['job', 'stage'])
+
+# Caches used by the jobs (reported per run as hits/misses)
+CACHE_REQUESTS = Counter('d1sapsync_cache_requests_total', 'Cache lookups by outcome', ['job', 'cache', 'result'])
+
+# SAP request budget shared by the jobs and the console (sap_budget.py)
+SAP_BUDGET_SLOTS = Gauge('d1sapsync_sap_budget_slots', 'Concurrent SAP requests allowed on this host')
+SAP_BUDGET_IN_USE = Gauge('d1sapsync_sap_budget_in_use', 'SAP request slots currently held')
+
+# Web SQL console
+CONSOLE_QUERIES = Counter('d1sapsync_console_queries_total', 'SQL console queries by outcome', ['status'])
+CONSOLE_QUERY_DURATION = Histogram('d1sapsync_console_query_duration_seconds', 'SQL console query latency',
+                                   ['status'])
+CONSOLE_RESULT_ROWS = Histogram('d1sapsync_console_result_rows', 'Rows returned by SQL console queries',
+                                buckets=(0, 1, 10, 50, 100, 500, 1000, 5000, 10000, 50000))
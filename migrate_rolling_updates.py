@@ -63,6 +63,32 @@ def run_migration():
                 'sql': 'ALTER TABLE products ADD COLUMN sync_version INT DEFAULT 0'
             })
 
+        # Add barcode fingerprint columns if they don't exist
+        if 'barcode_hash' not in existing_columns:
+            migrations.append({
+                'name': 'Add barcode_hash column',
+                'sql': 'ALTER TABLE products ADD COLUMN barcode_hash CHAR(40) NULL DEFAULT NULL'
+            })
+
+        if 'barcode_changed_time' not in existing_columns:
+            migrations.append({
+                'name': 'Add barcode_changed_time column',
+                'sql': 'ALTER TABLE products ADD COLUMN barcode_changed_time TIMESTAMP NULL DEFAULT NULL'
+            })
+
+        # Add work claim columns for parallel barcode sync workers
+        if 'sync_claimed_by' not in existing_columns:
+            migrations.append({
+                'name': 'Add sync_claimed_by column',
+                'sql': 'ALTER TABLE products ADD COLUMN sync_claimed_by VARCHAR(64) NULL DEFAULT NULL'
+            })
+
+        if 'sync_claim_expires' not in existing_columns:
+            migrations.append({
+                'name': 'Add sync_claim_expires column',
+                'sql': 'ALTER TABLE products ADD COLUMN sync_claim_expires TIMESTAMP NULL DEFAULT NULL'
+            })
+
         # Add rolling update index
         try:
             cursor.execute("SHOW INDEX FROM products WHERE Key_name = 'idx_rolling_sync'")
@@ -78,6 +104,32 @@ def run_migration():
                 'sql': 'ALTER TABLE products ADD INDEX idx_rolling_sync (needs_sync, last_sync_time, sap_item_code)'
             })
 
+        try:
+            cursor.execute("SHOW INDEX FROM products WHERE Key_name = 'idx_sync_claim'")
+            if not cursor.fetchall():
+                migrations.append({
+                    'name': 'Add sync claim index',
+                    'sql': 'ALTER TABLE products ADD INDEX idx_sync_claim (sync_claimed_by)'
+                })
+        except Error:
+            migrations.append({
+                'name': 'Add sync claim index',
+                'sql': 'ALTER TABLE products ADD INDEX idx_sync_claim (sync_claimed_by)'
+            })
+
+        try:
+            cursor.execute("SHOW INDEX FROM products WHERE Key_name = 'idx_barcode_changed'")
+            if not cursor.fetchall():
+                migrations.append({
+                    'name': 'Add barcode change index',
+                    'sql': 'ALTER TABLE products ADD INDEX idx_barcode_changed (barcode_changed_time)'
+                })
+        except Error:
+            migrations.append({
+                'name': 'Add barcode change index',
+                'sql': 'ALTER TABLE products ADD INDEX idx_barcode_changed (barcode_changed_time)'
+            })
+
         if not migrations:
             logger.info("✅ Database already up to date - no migrations needed")
             return True
@@ -130,7 +182,8 @@ def show_migration_status():
         columns = cursor.fetchall()
 
         print("\n📊 Current products table structure:")
-        rolling_columns = ['last_sync_time', 'sync_version']
+        rolling_columns = ['last_sync_time', 'sync_version', 'barcode_hash', 'barcode_changed_time',
+                           'sync_claimed_by', 'sync_claim_expires']
         for col in columns:
             if col['Field'] in rolling_columns:
                 print(f"✅ {col['Field']}: {col['Type']} (rolling update ready)")
@@ -0,0 +1,247 @@
+"""
+Negative Cache
+Persisted record of SAP items a sync job could not find in MySQL, with re-check backoff
+
+Each code that misses gets a sync_negative_cache row. The job passes over it
+until its next_check time, which backs off exponentially with every further
+miss (base * 2^(misses - 1), capped). When new products appear (products.id
+grows past the high-water mark stored with the entries) the cached codes are
+checked against products again at once, and the ones that now exist are dropped.
+"""
+
+import os
+import logging
+from mysql.connector import Error
+from dotenv import load_dotenv
+from rolling_update_utils import get_mysql_connection
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+NEGATIVE_CACHE_TABLE = 'sync_negative_cache'
+
+_table_ready = False
+
+def negative_cache_enabled(prefix):
+    """Check whether the job with env prefix (e.g. SERIAL_SYNC) skips cached not-found items"""
+    return os.getenv(f'{prefix}_NOT_FOUND_CACHE', 'true').lower() == 'true'
+
+def backoff_settings(prefix):
+    """(first re-check delay, longest re-check delay) in seconds for the job with env prefix"""
+    base = max(1, int(os.getenv(f'{prefix}_NOT_FOUND_BACKOFF', 3600)))
+    ceiling = max(base, int(os.getenv(f'{prefix}_NOT_FOUND_MAX_BACKOFF', 7 * 24 * 3600)))
+    return base, ceiling
+
+def ensure_negative_cache_table():
+    """
+    Ensure the sync_negative_cache table exists
+    Auto-creates it on first use
+    """
+    global _table_ready
+    if _table_ready:
+        return True
+
+    connection = get_mysql_connection()
+    if not connection:
+        logger.error("Cannot validate negative cache table - no database connection")
+        return False
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {NEGATIVE_CACHE_TABLE} (
+                job_name VARCHAR(64) NOT NULL,
+                item_code VARCHAR(64) NOT NULL,
+                misses INT NOT NULL DEFAULT 1,
+                first_missed TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                last_checked TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                next_check TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                products_max_id BIGINT NOT NULL DEFAULT 0,
+                PRIMARY KEY (job_name, item_code),
+                KEY idx_products_max_id (job_name, products_max_id)
+            )
+        """)
+        connection.commit()
+        _table_ready = True
+        return True
+
+    except Error as e:
+        logger.error(f"❌ Negative cache table validation failed: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def codes_not_due(job_name, item_codes):
+    """
+    The subset of item_codes cached as not found and not yet due for a re-check
+    An empty set if the cache cannot be read, so nothing is skipped by mistake
+    """
+    if not item_codes or not ensure_negative_cache_table():
+        return set()
+
+    connection = get_mysql_connection()
+    if not connection:
+        return set()
+
+    try:
+        cursor = connection.cursor()
+        placeholders = ', '.join(['%s'] * len(item_codes))
+        cursor.execute(f"""
+            SELECT item_code FROM {NEGATIVE_CACHE_TABLE}
+            WHERE job_name = %s AND item_code IN ({placeholders}) AND next_check > NOW()
+        """, (job_name, *item_codes))
+        return {row[0] for row in cursor.fetchall()}
+    except Error as e:
+        logger.error(f"Error reading negative cache for {job_name}: {e}")
+        return set()
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def record_misses(job_name, item_codes, products_max_id, base_seconds, max_seconds):
+    """
+    Cache item_codes as not found: first re-check after base_seconds, doubling with every
+    further miss up to max_seconds
+    Nothing is recorded without products_max_id - an entry stamped 0 would look stale to
+    revalidate on every later run
+    """
+    if not item_codes or products_max_id is None or not ensure_negative_cache_table():
+        return False
+
+    connection = get_mysql_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+        # misses is incremented before next_check is computed (assignments apply left to right)
+        cursor.executemany(f"""
+            INSERT INTO {NEGATIVE_CACHE_TABLE} (job_name, item_code, misses, next_check, products_max_id)
+            VALUES (%s, %s, 1, NOW() + INTERVAL %s SECOND, %s)
+            ON DUPLICATE KEY UPDATE
+                misses = misses + 1,
+                last_checked = NOW(),
+                next_check = NOW() + INTERVAL LEAST({int(base_seconds)} * POW(2, misses - 1), {int(max_seconds)}) SECOND,
+                products_max_id = VALUES(products_max_id)
+        """, [(job_name, code, int(base_seconds), products_max_id) for code in item_codes])
+        connection.commit()
+        return True
+    except Error as e:
+        logger.error(f"Error recording not-found items for {job_name}: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def forget_items(job_name, item_codes):
+    """Drop cache entries of items that were found after all"""
+    if not item_codes or not ensure_negative_cache_table():
+        return False
+
+    connection = get_mysql_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+        placeholders = ', '.join(['%s'] * len(item_codes))
+        cursor.execute(f"DELETE FROM {NEGATIVE_CACHE_TABLE} WHERE job_name = %s AND item_code IN ({placeholders})",
+                       (job_name, *item_codes))
+        connection.commit()
+        return True
+    except Error as e:
+        logger.error(f"Error clearing negative cache entries for {job_name}: {e}")
+        return False
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def revalidate(job_name, products_max_id, lookup=None):
+    """
+    Re-check the entries recorded before products grew past products_max_id
+    With lookup (item code -> id or None) they are checked right here: found ones are dropped and
+    the rest keep their backoff. Without it they are all made due, so the job re-checks them itself.
+    Returns the number of entries dropped
+    """
+    if not products_max_id or not ensure_negative_cache_table():
+        return 0
+
+    connection = get_mysql_connection()
+    if not connection:
+        return 0
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT item_code FROM {NEGATIVE_CACHE_TABLE}
+            WHERE job_name = %s AND products_max_id < %s
+        """, (job_name, products_max_id))
+        codes = [row[0] for row in cursor.fetchall()]
+        if not codes:
+            return 0
+
+        if lookup is None:
+            cursor.execute(f"""
+                UPDATE {NEGATIVE_CACHE_TABLE} SET next_check = NOW(), products_max_id = %s
+                WHERE job_name = %s AND products_max_id < %s
+            """, (products_max_id, job_name, products_max_id))
+            connection.commit()
+            logger.info(f"🆕 New products appeared - {len(codes)} cached not-found item(s) are due for a re-check")
+            return 0
+
+        found = [code for code in codes if lookup(code) is not None]
+        if found:
+            placeholders = ', '.join(['%s'] * len(found))
+            cursor.execute(f"DELETE FROM {NEGATIVE_CACHE_TABLE} WHERE job_name = %s AND item_code IN ({placeholders})",
+                           (job_name, *found))
+        cursor.execute(f"""
+            UPDATE {NEGATIVE_CACHE_TABLE} SET products_max_id = %s
+            WHERE job_name = %s AND products_max_id < %s
+        """, (products_max_id, job_name, products_max_id))
+        connection.commit()
+        if found:
+            logger.info(f"🆕 {len(found)} cached not-found item(s) now exist in products: {found[:20]}")
+        return len(found)
+
+    except Error as e:
+        logger.error(f"Error revalidating negative cache for {job_name}: {e}")
+        connection.rollback()
+        return 0
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def cache_summary(job_name):
+    """Number of cached not-found items and how many are due for a re-check"""
+    summary = {'cached': 0, 'due': 0}
+    if not ensure_negative_cache_table():
+        return summary
+
+    connection = get_mysql_connection()
+    if not connection:
+        return summary
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT COUNT(*), COALESCE(SUM(next_check <= NOW()), 0)
+            FROM {NEGATIVE_CACHE_TABLE} WHERE job_name = %s
+        """, (job_name,))
+        cached, due = cursor.fetchone()
+        summary.update(cached=int(cached), due=int(due))
+        return summary
+    except Error as e:
+        logger.error(f"Error summarising negative cache for {job_name}: {e}")
+        return summary
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
@@ -0,0 +1,328 @@
+"""
+Priority Sync
+Express lane that syncs the barcodes of given SAP item codes right away
+
+Flagging needs_sync = 1 waits for the next barcode_sync run and for the items
+queued ahead. This lane takes a list of item codes, reads them from SAP and
+MySQL in batched queries and writes them at once, outside the rolling refresh.
+Its SAP calls are charged to the priority_sync consumer at PRIORITY_SYNC_SAP_PRIORITY,
+so they go ahead of the scheduled jobs' calls in the SAP request budget.
+
+The web API (POST /api/priority-sync) runs every request in its own worker
+process (priority_sync.py --request ID), so SAP budget waits and a cold
+product index build never hold a gunicorn thread. Small lists are answered
+with the per-item results if they finish within PRIORITY_SYNC_INLINE_TIMEOUT;
+everything else is polled by request id. Each client is rate-limited by a
+token bucket shared by all gunicorn workers on the host.
+
+Usage: priority_sync.py SAP_ITEM_CODE [SAP_ITEM_CODE ...]   (- reads codes from stdin)
+       priority_sync.py --request REQUEST_ID                (run a request stored by the web API)
+"""
+
+import os
+import sys
+import json
+import time
+import uuid
+import fcntl
+import socket
+import logging
+import threading
+import subprocess
+from datetime import datetime
+from dotenv import load_dotenv
+from sync_logging import setup_logging
+from sync_runtime import AEST
+from sync_state import get_sync_state, set_sync_state, prune_sync_state, checkpoint_owner_alive
+from sap_budget import sap_consumer, BUDGET_DIR
+from product_index import item_code_key
+from dead_letter import dead_letter_enabled, resolve_items
+from barcode_sync import (SYNC_JOB_NAME, MAX_BARCODES, get_sap_barcodes_batch, get_products_by_codes,
+                          compute_barcode_hash, get_stored_barcode_hash, mark_item_unchanged,
+                          update_mysql_barcodes, park_item)
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_SYNC_JOB_NAME = 'priority_sync'
+
+# SAP item codes are at most 50 characters
+MAX_ITEM_CODE_LENGTH = 50
+
+RATE_FILE = os.path.join(BUDGET_DIR, 'priority_sync_rate.json')
+
+def max_items():
+    """Most item codes accepted in one request"""
+    return max(1, int(os.getenv('PRIORITY_SYNC_MAX_ITEMS', 500)))
+
+def inline_limit():
+    """Lists up to this size are synced within the request; larger ones run in the background"""
+    return max(0, int(os.getenv('PRIORITY_SYNC_INLINE_ITEMS', 25)))
+
+def inline_timeout():
+    """Seconds a request waits for a small list's results before answering 202 (keep well below gunicorn --timeout)"""
+    return max(0.0, float(os.getenv('PRIORITY_SYNC_INLINE_TIMEOUT', 20)))
+
+def max_run_seconds():
+    """A request still running after this long is reported failed (its worker is presumed lost)"""
+    return max(60, int(os.getenv('PRIORITY_SYNC_MAX_RUN_SECONDS', 900)))
+
+def normalise_item_codes(item_codes):
+    """
+    Strip and de-duplicate requested item codes, keeping their order
+    Returns (codes, invalid) - invalid holds entries that cannot be SAP item codes
+    """
+    codes = []
+    invalid = []
+    seen = set()
+    for code in item_codes:
+        code_clean = code.strip() if isinstance(code, str) else None
+        if not code_clean or len(code_clean) > MAX_ITEM_CODE_LENGTH or not code_clean.isprintable():
+            invalid.append(code)
+        elif item_code_key(code_clean) not in seen:
+            # Codes that SAP and MySQL would match as the same item are synced once
+            seen.add(item_code_key(code_clean))
+            codes.append(code_clean)
+    return codes, invalid
+
+def take_rate_tokens(client, count):
+    """
+    Charge count items to a client's token bucket (PRIORITY_SYNC_RATE_PER_MINUTE items a minute,
+    up to PRIORITY_SYNC_RATE_BURST at once), shared by every process on the host through a locked file
+    Returns 0 if the request may go ahead, else the seconds until it would fit
+    """
+    per_minute = float(os.getenv('PRIORITY_SYNC_RATE_PER_MINUTE', 120))
+    if per_minute <= 0:
+        return 0
+    burst = max(1.0, float(os.getenv('PRIORITY_SYNC_RATE_BURST', max_items())))
+    rate = per_minute / 60
+    # A request larger than the bucket waits for a full bucket rather than never fitting
+    cost = min(count, burst)
+
+    os.makedirs(BUDGET_DIR, exist_ok=True)
+    with open(RATE_FILE, 'a+') as rate_file:
+        fcntl.flock(rate_file, fcntl.LOCK_EX)
+        rate_file.seek(0)
+        try:
+            buckets = json.load(rate_file)
+        except ValueError:
+            buckets = {}
+
+        now = time.time()
+        tokens, updated = buckets.get(client, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+        wait = 0 if tokens >= cost else (cost - tokens) / rate
+        if not wait:
+            tokens -= cost
+
+        buckets[client] = (tokens, now)
+        # Buckets that have refilled completely carry no state worth keeping
+        buckets = {name: bucket for name, bucket in buckets.items()
+                   if name == client or bucket[0] + (now - bucket[1]) * rate < burst}
+        rate_file.seek(0)
+        rate_file.truncate()
+        json.dump(buckets, rate_file)
+    return wait
+
+def sync_item(product, barcodes):
+    """
+    Write one product's SAP barcodes the way barcode_sync does (compare-and-set on sync_version)
+    Returns 'updated', 'unchanged', 'dead_letter' or 'error'
+    """
+    barcode_hash = compute_barcode_hash(barcodes)
+    if barcode_hash == get_stored_barcode_hash(product):
+        return 'unchanged' if mark_item_unchanged(product['id'], barcode_hash, product['sync_version']) else 'error'
+
+    if len(barcodes) > MAX_BARCODES:
+        logger.error(f"🚨 CRITICAL: Item ID {product['id']} has {len(barcodes)} barcodes! Maximum is {MAX_BARCODES}. Barcodes: {barcodes}")
+        if park_item(product, 'too_many_barcodes',
+                     f"{len(barcodes)} barcodes in SAP (maximum {MAX_BARCODES}): {', '.join(barcodes)}"):
+            return 'dead_letter'
+        return 'error'
+
+    if update_mysql_barcodes(product['id'], barcodes, barcode_hash, product['sync_version']):
+        return 'updated'
+    return 'error'
+
+def sync_priority_items(item_codes):
+    """
+    Sync the barcodes of item_codes now, through the express lane
+    Returns the per-item results (in request order) with a count per status
+    """
+    started = time.perf_counter()
+    priority = os.getenv('PRIORITY_SYNC_SAP_PRIORITY', 'high')
+    logger.info(f"⚡ Priority sync of {len(item_codes)} item(s): {item_codes[:20]}")
+
+    products = get_products_by_codes(item_codes)
+    with sap_consumer(PRIORITY_SYNC_JOB_NAME, priority):
+        sap_barcodes = get_sap_barcodes_batch(item_codes) if products is not None else {}
+
+    # SAP returns its own spelling of each code; match it the way products were matched
+    barcodes_by_key = {item_code_key(code): barcodes for code, barcodes in sap_barcodes.items()}
+
+    results = []
+    for code in item_codes:
+        product = (products or {}).get(code)
+        barcodes = barcodes_by_key.get(item_code_key(code))
+        if products is None:
+            status = 'error'
+        elif product is None:
+            status = 'not_in_products'
+        elif item_code_key(code) not in barcodes_by_key:
+            # Unknown to SAP - leave the product alone rather than clearing its barcodes
+            status = 'not_in_sap'
+        elif barcodes is None:
+            status = 'error'
+        else:
+            status = sync_item(product, barcodes)
+        results.append({'item_code': code, 'item_id': product['id'] if product else None,
+                        'status': status, 'barcodes': barcodes})
+
+    # Items that synced are done with the dead letter queue (if barcode_sync had parked them)
+    synced_ids = [result['item_id'] for result in results if result['status'] in ('updated', 'unchanged')]
+    if synced_ids and dead_letter_enabled('BARCODE_SYNC'):
+        resolve_items(SYNC_JOB_NAME, synced_ids)
+
+    summary = {}
+    for result in results:
+        summary[result['status']] = summary.get(result['status'], 0) + 1
+    duration = time.perf_counter() - started
+    logger.info(f"⚡ Priority sync done in {duration:.2f}s: "
+                + ', '.join(f"{count} {status}" for status, count in sorted(summary.items())))
+
+    return {'items': len(item_codes), 'summary': summary, 'duration_seconds': round(duration, 3), 'results': results}
+
+def _request_key(request_id):
+    return f'request:{request_id}'
+
+def start_priority_sync(item_codes):
+    """
+    Run a priority sync in its own worker process (priority_sync.py --request ID)
+    Returns the request id its progress and results are stored under (see get_priority_sync)
+    """
+    request_id = uuid.uuid4().hex[:16]
+    retention = int(os.getenv('PRIORITY_SYNC_RESULT_RETENTION', 24 * 3600))
+    prune_sync_state(PRIORITY_SYNC_JOB_NAME, 'request:', retention)
+    started_at = datetime.now(AEST).isoformat()
+    # The worker reads its item codes from here, then adds its host and pid
+    set_sync_state(PRIORITY_SYNC_JOB_NAME, _request_key(request_id), {
+        'request_id': request_id, 'status': 'running', 'items': len(item_codes),
+        'item_codes': item_codes, 'started_at': started_at
+    })
+
+    script = os.path.abspath(__file__)
+    try:
+        process = subprocess.Popen([sys.executable, script, '--request', request_id], cwd=os.path.dirname(script),
+                                   stdin=subprocess.DEVNULL, start_new_session=True)
+    except OSError as e:
+        logger.error(f"❌ Could not start priority sync worker for {request_id}: {e}")
+        set_sync_state(PRIORITY_SYNC_JOB_NAME, _request_key(request_id), {
+            'request_id': request_id, 'status': 'failed', 'error': f"could not start the worker: {e}",
+            'items': len(item_codes), 'started_at': started_at, 'finished_at': datetime.now(AEST).isoformat()
+        })
+        return request_id
+
+    # Reap the worker when it exits, so a crashed one does not linger as a zombie that still looks alive
+    threading.Thread(target=process.wait, name=f'priority-sync-{request_id}', daemon=True).start()
+    return request_id
+
+def run_request(request_id):
+    """
+    Worker side of start_priority_sync: sync the stored request's item codes and store the outcome
+    Returns the process exit code
+    """
+    record = get_sync_state(PRIORITY_SYNC_JOB_NAME, _request_key(request_id))
+    if not record or record.get('status') != 'running' or 'item_codes' not in record:
+        logger.error(f"❌ Priority sync request {request_id} is unknown or not waiting to run")
+        return 2
+    set_sync_state(PRIORITY_SYNC_JOB_NAME, _request_key(request_id),
+                   dict(record, host=socket.gethostname(), pid=os.getpid()))
+
+    item_codes = record['item_codes']
+    try:
+        outcome = {'status': 'complete', **sync_priority_items(item_codes)}
+    except Exception as e:
+        logger.exception(f"❌ Priority sync {request_id} failed: {e}")
+        outcome = {'status': 'failed', 'error': str(e), 'items': len(item_codes)}
+    set_sync_state(PRIORITY_SYNC_JOB_NAME, _request_key(request_id), {
+        'request_id': request_id, 'started_at': record.get('started_at'),
+        'finished_at': datetime.now(AEST).isoformat(), **outcome
+    })
+    return 0 if outcome['status'] == 'complete' else 1
+
+def _worker_lost(record):
+    """Check whether a 'running' request's worker is gone without having stored a result"""
+    if record.get('pid') and record.get('host') == socket.gethostname():
+        # Same liveness rule as an interrupted sync checkpoint
+        if not checkpoint_owner_alive(record):
+            return True
+    try:
+        started = datetime.fromisoformat(record['started_at'])
+    except (KeyError, TypeError, ValueError):
+        return True
+    # A worker on another host (or one that never started) can only be judged by age
+    return (datetime.now(AEST) - started).total_seconds() > max_run_seconds()
+
+def get_priority_sync(request_id):
+    """
+    Progress or results of a priority sync, or None if the request id is unknown
+    A request whose worker died is marked failed here, so it does not read 'running' forever
+    """
+    record = get_sync_state(PRIORITY_SYNC_JOB_NAME, _request_key(request_id))
+    if record and record.get('status') == 'running' and _worker_lost(record):
+        logger.warning(f"⚠️ Priority sync worker for {request_id} exited without a result - marking it failed")
+        record = {
+            'request_id': request_id, 'status': 'failed', 'error': 'the priority sync worker exited without a result',
+            'items': record.get('items'), 'started_at': record.get('started_at'),
+            'finished_at': datetime.now(AEST).isoformat()
+        }
+        set_sync_state(PRIORITY_SYNC_JOB_NAME, _request_key(request_id), record)
+    if record:
+        record.pop('item_codes', None)
+    return record
+
+def wait_for_priority_sync(request_id, timeout):
+    """The finished outcome of a priority sync, or None if it is still running after timeout seconds"""
+    deadline = time.monotonic() + timeout
+    while True:
+        record = get_priority_sync(request_id)
+        if record is None or record.get('status') != 'running':
+            return record
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        time.sleep(min(0.25, remaining))
+
+def main(argv=None):
+    """
+    Command line entry point
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    if len(argv) == 2 and argv[0] == '--request':
+        setup_logging(PRIORITY_SYNC_JOB_NAME)
+        return run_request(argv[1])
+    if argv == ['-']:
+        argv = sys.stdin.read().split()
+    if not argv:
+        print("Usage: priority_sync.py SAP_ITEM_CODE [SAP_ITEM_CODE ...]   (- reads codes from stdin)")
+        print("       priority_sync.py --request REQUEST_ID")
+        return 2
+
+    setup_logging(PRIORITY_SYNC_JOB_NAME)
+    item_codes, invalid = normalise_item_codes(argv)
+    if invalid:
+        print(f"❌ Not valid SAP item codes: {invalid}")
+        return 2
+
+    outcome = sync_priority_items(item_codes)
+    for result in outcome['results']:
+        barcodes = ', '.join(result['barcodes']) if result['barcodes'] else ''
+        print(f"{result['item_code']:<24} {result['status']:<16} {barcodes}")
+    print(f"{outcome['items']} item(s) in {outcome['duration_seconds']:.2f}s - "
+          + ', '.join(f"{count} {status}" for status, count in sorted(outcome['summary'].items())))
+    return 0 if all(result['status'] in ('updated', 'unchanged') for result in outcome['results']) else 1
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,381 @@
+"""
+Product Index
+Compact map of products.sap_item_code -> products.id, shared by the sync jobs
+
+Instead of one MySQL query per SAP item, the jobs resolve item codes here. The
+index is loaded in one streaming pass over products and kept as a sorted,
+binary-searched table (ids, code offsets and one blob of codes) rather than a
+dict. When PRODUCT_INDEX_FILE is set the table is written there and memory-mapped,
+so every job process - subprocess runs and warm pool workers alike - starts from
+the last snapshot and only reads the rows added or changed since.
+
+Codes are matched the way products' case-insensitive collation compares them in
+WHERE sap_item_code = %s: trailing spaces are ignored and case is folded (see
+item_code_key), so an index lookup finds the same product the query would.
+
+Refreshes are incremental: rows with an id above the snapshot's highest id, or
+updated_at at or after its latest updated_at (when products has that column),
+go into an in-memory delta. A full rebuild every PRODUCT_INDEX_REBUILD_SECONDS
+(or once the delta grows large) picks up deleted products.
+"""
+
+import os
+import time
+import mmap
+import array
+import struct
+import logging
+import threading
+from mysql.connector import Error
+from dotenv import load_dotenv
+from rolling_update_utils import get_mysql_connection
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# magic, entry count, highest id, built at (epoch), latest updated_at ('' without the column), padded to 64 bytes
+HEADER = struct.Struct('<8sIqd32s4x')
+# PRODIDX1 files were keyed by the exact code bytes; they are rebuilt rather than read
+MAGIC = b'PRODIDX2'
+
+# Rows fetched per round trip while streaming products
+FETCH_SIZE = 10000
+
+class ProductIndexUnavailable(Exception):
+    """Raised when the index cannot be loaded (callers fall back to querying MySQL)"""
+
+def product_index_enabled():
+    """Check whether lookups go through the product index"""
+    return os.getenv('PRODUCT_INDEX_ENABLED', 'true').lower() == 'true'
+
+def item_code_key(sap_item_code):
+    """
+    The form SAP item codes are compared in, matching MySQL's case-insensitive, trailing-space-padded collation
+    """
+    return sap_item_code.rstrip(' ').casefold()
+
+def _index_key(sap_item_code):
+    """Index key bytes of an item code, or None for a missing or blank code"""
+    key = item_code_key(sap_item_code) if sap_item_code else ''
+    return key.encode() if key else None
+
+def _build_table(rows, max_id, updated_hwm):
+    """
+    Pack (key bytes, id) rows into the on-disk/in-memory table layout:
+    header, ids (int64), code offsets (uint32, count + 1), code blob - sorted by code
+    """
+    rows.sort()
+    ids = array.array('q', (product_id for _, product_id in rows))
+    offsets = array.array('I', [0])
+    for code, _ in rows:
+        offsets.append(offsets[-1] + len(code))
+    header = HEADER.pack(MAGIC, len(rows), max_id, time.time(), (updated_hwm or '').encode()[:32])
+    return b''.join([header, ids.tobytes(), offsets.tobytes()] + [code for code, _ in rows])
+
+class _Table:
+    """A packed table (bytes or mmap) with binary search by index key"""
+    def __init__(self, buffer):
+        self.buffer = buffer
+        magic, self.count, self.max_id, self.built_at, updated_hwm = HEADER.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError("not a product index file")
+        self.updated_hwm = updated_hwm.rstrip(b'\0').decode() or None
+        ids_start = HEADER.size
+        offsets_start = ids_start + 8 * self.count
+        self.blob_start = offsets_start + 4 * (self.count + 1)
+        view = memoryview(buffer)
+        self.ids = view[ids_start:offsets_start].cast('q')
+        self.offsets = view[offsets_start:self.blob_start].cast('I')
+
+    def _code(self, position):
+        return self.buffer[self.blob_start + self.offsets[position]:self.blob_start + self.offsets[position + 1]]
+
+    def get(self, code):
+        low, high = 0, self.count
+        while low < high:
+            middle = (low + high) // 2
+            if self._code(middle) < code:
+                low = middle + 1
+            else:
+                high = middle
+        if low < self.count and self._code(low) == code:
+            return self.ids[low]
+        return None
+
+    def release(self):
+        self.ids.release()
+        self.offsets.release()
+        if isinstance(self.buffer, mmap.mmap):
+            self.buffer.close()
+
+class ProductIndex:
+    """
+    sap_item_code -> products.id for this process: a packed snapshot plus an incremental delta
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self._lock = threading.RLock()
+        self._table = None
+        self._delta = {}           # key bytes -> id, rows added or changed since the snapshot
+        self._delta_codes = {}     # id -> its code in the delta
+        self._stale_ids = set()    # ids whose snapshot code may be out of date
+        self._negative = set()     # codes looked up and not found since the last refresh brought new rows
+        self._max_id = 0
+        self._updated_hwm = None
+        self._has_updated_at = None
+        self._refreshed = 0.0
+        self._stats = {'hits': 0, 'misses': 0}
+
+    def _refresh_interval(self):
+        return float(os.getenv('PRODUCT_INDEX_REFRESH_SECONDS', 60))
+
+    def _rebuild_interval(self):
+        return float(os.getenv('PRODUCT_INDEX_REBUILD_SECONDS', 3600))
+
+    def _products_have_updated_at(self, cursor):
+        if self._has_updated_at is None:
+            cursor.execute("SHOW COLUMNS FROM products LIKE 'updated_at'")
+            self._has_updated_at = cursor.fetchone() is not None
+        return self._has_updated_at
+
+    def _load_file(self):
+        """Map the persisted snapshot, if there is a usable one"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        try:
+            with open(self.path, 'rb') as f:
+                buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            table = _Table(buffer)
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"⚠️ Ignoring unreadable product index file {self.path}: {e}")
+            return False
+        if time.time() - table.built_at > self._rebuild_interval():
+            table.release()
+            return False
+        self._use_table(table)
+        logger.info(f"🗂️ Product index mapped from {self.path} ({table.count} products)")
+        return True
+
+    def _use_table(self, table):
+        if self._table is not None:
+            self._table.release()
+        self._table = table
+        self._delta.clear()
+        self._delta_codes.clear()
+        self._stale_ids.clear()
+        self._negative.clear()
+        self._max_id = table.max_id
+        self._updated_hwm = table.updated_hwm
+
+    def rebuild(self):
+        """Load every product in one streaming pass and replace the snapshot (and file)"""
+        connection = get_mysql_connection()
+        if not connection:
+            raise ProductIndexUnavailable("no database connection")
+
+        started = time.monotonic()
+        try:
+            cursor = connection.cursor()
+            with_updated_at = self._products_have_updated_at(cursor)
+            # Every row, so products without an item code still move the id high-water mark
+            cursor.execute(f"SELECT id, sap_item_code{', updated_at' if with_updated_at else ''} FROM products")
+            rows = []
+            max_id = 0
+            updated_hwm = None
+            while True:
+                batch = cursor.fetchmany(FETCH_SIZE)
+                if not batch:
+                    break
+                for row in batch:
+                    key = _index_key(row[1])
+                    if key:
+                        rows.append((key, row[0]))
+                    max_id = max(max_id, row[0])
+                    if with_updated_at and row[2] is not None:
+                        updated_hwm = max(updated_hwm or '', str(row[2]))
+        except Error as e:
+            raise ProductIndexUnavailable(f"loading products failed: {e}") from e
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+        data = _build_table(rows, max_id, updated_hwm)
+        table = _Table(data)
+        if self.path:
+            try:
+                os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+                temp_path = f"{self.path}.{os.getpid()}.tmp"
+                with open(temp_path, 'wb') as f:
+                    f.write(data)
+                # Readers keep their old mapping; new processes pick this file up
+                os.replace(temp_path, self.path)
+                with open(self.path, 'rb') as f:
+                    table = _Table(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+            except OSError as e:
+                logger.warning(f"⚠️ Could not persist product index to {self.path}: {e}")
+
+        self._use_table(table)
+        self._refreshed = time.monotonic()
+        logger.info(f"🗂️ Product index built: {table.count} products in {time.monotonic() - started:.2f}s")
+
+    def refresh(self):
+        """Read the products added or changed since the last refresh into the delta"""
+        connection = get_mysql_connection()
+        if not connection:
+            raise ProductIndexUnavailable("no database connection")
+
+        try:
+            cursor = connection.cursor()
+            if self._products_have_updated_at(cursor) and self._updated_hwm:
+                # >= so rows written in the same second as the high-water mark are not missed
+                cursor.execute("""
+                    SELECT id, sap_item_code, updated_at FROM products
+                    WHERE id > %s OR updated_at >= %s
+                """, (self._max_id, self._updated_hwm))
+            else:
+                cursor.execute("SELECT id, sap_item_code, NULL FROM products WHERE id > %s", (self._max_id,))
+            changed = cursor.fetchall()
+        except Error as e:
+            raise ProductIndexUnavailable(f"refreshing products failed: {e}") from e
+        finally:
+            if connection.is_connected():
+                cursor.close()
+                connection.close()
+
+        updated = 0
+        for product_id, sap_item_code, updated_at in changed:
+            self._max_id = max(self._max_id, product_id)
+            if updated_at is not None:
+                self._updated_hwm = max(self._updated_hwm or '', str(updated_at))
+            code = _index_key(sap_item_code)
+            if code and self._current_id(code) == product_id:
+                # Touched, but still under the same item code (or re-read at the high-water mark)
+                continue
+            if not code and product_id in self._stale_ids and product_id not in self._delta_codes:
+                # Already known to have no item code
+                continue
+
+            updated += 1
+            # The snapshot's entry for this id may carry an old code
+            self._stale_ids.add(product_id)
+            old_code = self._delta_codes.pop(product_id, None)
+            if old_code is not None:
+                del self._delta[old_code]
+            if code:
+                current_id = self._current_id(code)
+                # Duplicated codes resolve to the lowest id, as in a full build
+                if current_id is None or product_id < current_id:
+                    if self._delta_codes.get(current_id) == code:
+                        del self._delta_codes[current_id]
+                    self._delta[code] = product_id
+                    self._delta_codes[product_id] = code
+        if updated:
+            # A new or changed product may be one of the codes that were missing
+            self._negative.clear()
+            logger.info(f"🗂️ Product index refreshed: {updated} new or changed product(s)")
+        self._refreshed = time.monotonic()
+
+    def _current_id(self, code):
+        """The id the index maps code to right now, or None"""
+        product_id = self._delta.get(code)
+        if product_id is None:
+            product_id = self._table.get(code)
+            if product_id in self._stale_ids:
+                # Changed since the snapshot and the delta no longer maps this code to it
+                product_id = None
+        return product_id
+
+    def _ensure_fresh(self):
+        if self._table is None and not self._load_file():
+            self.rebuild()
+            return
+        if (time.time() - self._table.built_at > self._rebuild_interval()
+                or len(self._delta) > int(os.getenv('PRODUCT_INDEX_MAX_DELTA', 5000))):
+            self.rebuild()
+        elif time.monotonic() - self._refreshed > self._refresh_interval():
+            self.refresh()
+
+    def lookup(self, sap_item_code):
+        """products.id for a SAP item code, or None if no product has it"""
+        code = _index_key(sap_item_code)
+        if code is None:
+            return None
+        with self._lock:
+            self._ensure_fresh()
+            if code in self._negative:
+                self._stats['misses'] += 1
+                return None
+
+            product_id = self._current_id(code)
+            if product_id is None:
+                self._negative.add(code)
+                self._stats['misses'] += 1
+            else:
+                self._stats['hits'] += 1
+            return product_id
+
+    def max_product_id(self):
+        """Highest products.id seen by the (freshly refreshed) index"""
+        with self._lock:
+            self._ensure_fresh()
+            return self._max_id
+
+    def take_stats(self):
+        """Hits and misses since the last call (for a run's cache_stats), plus the index size"""
+        with self._lock:
+            stats = dict(self._stats,
+                         size=(self._table.count if self._table else 0) + len(self._delta),
+                         negative=len(self._negative))
+            self._stats = {'hits': 0, 'misses': 0}
+            return stats
+
+_index = None
+_index_pid = None
+_index_lock = threading.Lock()
+
+def get_product_index():
+    """This process's product index (a forked child builds its own from the shared file)"""
+    global _index, _index_pid
+    with _index_lock:
+        if _index is None or _index_pid != os.getpid():
+            _index = ProductIndex(os.getenv('PRODUCT_INDEX_FILE', 'product_index/products.idx') or None)
+            _index_pid = os.getpid()
+        return _index
+
+def lookup_product_id(sap_item_code):
+    """
+    products.id for a SAP item code, or None if there is no such product
+    Raises ProductIndexUnavailable when the index is turned off or cannot be loaded
+    """
+    if not product_index_enabled():
+        raise ProductIndexUnavailable("PRODUCT_INDEX_ENABLED is false")
+    return get_product_index().lookup(sap_item_code)
+
+def products_max_id():
+    """
+    Highest products.id - from the index when it is available, else straight from MySQL
+    Returns None if neither can be read
+    """
+    if product_index_enabled():
+        try:
+            return get_product_index().max_product_id()
+        except ProductIndexUnavailable:
+            pass
+
+    connection = get_mysql_connection()
+    if not connection:
+        return None
+    try:
+        cursor = connection.cursor()
+        cursor.execute("SELECT COALESCE(MAX(id), 0) FROM products")
+        return cursor.fetchone()[0]
+    except Error as e:
+        logger.error(f"Error reading the highest product id: {e}")
+        return None
+    finally:
+        if connection.is_connected():
+            cursor.close()
+            connection.close()
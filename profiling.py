@@ -0,0 +1,147 @@
+"""
+Profiling
+On-demand cProfile capture of a single job run, and top-N summaries of the saved profiles
+
+JobManager asks for a profile by passing SYNC_PROFILE_OUTPUT to the next run; the
+run's timed_run wrapper profiles itself into that file, so it works the same for
+subprocess and warm_pool runs. A daemon that is already running gets the request
+through a file under PROFILE_DIR/<job_id>/ instead, checked at every iteration.
+"""
+
+import os
+import uuid
+import pstats
+import cProfile
+import logging
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AEST = timezone(timedelta(hours=10))
+
+PROFILE_DIR = os.path.abspath(os.getenv('PROFILE_DIR', 'profiles'))
+
+# Environment variable naming the file the next run should write its profile to
+PROFILE_ENV = 'SYNC_PROFILE_OUTPUT'
+
+def new_profile_path(job_id):
+    """
+    Path for a new profile of the job, under PROFILE_DIR/<job_id>/
+    """
+    directory = os.path.join(PROFILE_DIR, job_id)
+    os.makedirs(directory, exist_ok=True)
+    # A short run id keeps two profiles started in the same second apart
+    return os.path.join(directory, f"{datetime.now(AEST).strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}.prof")
+
+def _request_file(job_id):
+    return os.path.join(PROFILE_DIR, job_id, 'next-run.request')
+
+def request_profile(job_id, path):
+    """
+    Ask the job's running daemon to profile its next iteration into path
+    """
+    request_file = _request_file(job_id)
+    os.makedirs(os.path.dirname(request_file), exist_ok=True)
+    with open(request_file + '.tmp', 'w') as handle:
+        handle.write(path)
+    os.replace(request_file + '.tmp', request_file)
+
+def cancel_profile_request(job_id):
+    """Drop a profile request no daemon picked up"""
+    try:
+        os.remove(_request_file(job_id))
+    except FileNotFoundError:
+        pass
+
+def _take_profile_request(job_name):
+    """The profile path this run was asked for (environment first, then a daemon request), or None"""
+    path = os.environ.pop(PROFILE_ENV, None)
+    if path or not job_name:
+        return path
+
+    # Claim the request by renaming it, so only one process ever takes it
+    request_file = _request_file(job_name)
+    claimed = f"{request_file}.{os.getpid()}"
+    try:
+        os.rename(request_file, claimed)
+    except FileNotFoundError:
+        return None
+    try:
+        with open(claimed) as handle:
+            return handle.read().strip() or None
+    finally:
+        os.remove(claimed)
+
+@contextmanager
+def profile_run(job_name=None):
+    """
+    Profile the block if this run was asked to be profiled, yielding the output path (or None)
+    The request is consumed, so a daemon only profiles its next iteration
+    """
+    path = _take_profile_request(job_name)
+    if not path:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield path
+    finally:
+        profiler.disable()
+        try:
+            profiler.dump_stats(path)
+            logger.info(f"🔬 Run profile written to {path}")
+        except OSError as e:
+            logger.error(f"❌ Could not write run profile to {path}: {e}")
+
+def list_profiles(job_id):
+    """Saved profiles of a job, oldest first"""
+    directory = os.path.join(PROFILE_DIR, job_id)
+    try:
+        paths = [os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.prof')]
+    except FileNotFoundError:
+        return []
+    # Names only order to the second; the write time settles profiles from the same second
+    return sorted(paths, key=lambda path: (os.path.getmtime(path), path))
+
+def prune_profiles(job_id):
+    """Keep only the newest PROFILE_RETENTION profiles of a job"""
+    retention = max(1, int(os.getenv('PROFILE_RETENTION', 10)))
+    for path in list_profiles(job_id)[:-retention]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def top_functions(path, limit=25):
+    """
+    Functions of a saved profile by cumulative time, slowest first
+    """
+    stats = pstats.Stats(path)
+    rows = []
+    for (filename, line, function), (primitive_calls, calls, own_time, cumulative_time, _) in stats.stats.items():
+        # Built-ins have no source location ('~', line 0)
+        label = f"{function} ({os.path.basename(filename)}:{line})" if line else function
+        rows.append({
+            'function': label,
+            'calls': calls,
+            'primitive_calls': primitive_calls,
+            'tottime': round(own_time, 4),
+            'cumtime': round(cumulative_time, 4),
+            'percall_ms': round(cumulative_time / calls * 1000, 3) if calls else 0.0
+        })
+
+    rows.sort(key=lambda row: row['cumtime'], reverse=True)
+    return {
+        'profile': os.path.basename(path),
+        'created': datetime.fromtimestamp(os.path.getmtime(path), AEST).isoformat(),
+        'total_time': round(stats.total_tt, 4),
+        'function_count': len(rows),
+        'functions': rows[:limit]
+    }
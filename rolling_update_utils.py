@@ -5,9 +5,9 @@ Shared utilities for implementing rolling updates across all sync jobs
 
 import os
 import logging
-import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
+from sync_runtime import connect_mysql
 
 # Load environment variables
 load_dotenv()
@@ -19,21 +19,22 @@ def get_mysql_connection():
     Get MySQL database connection
     """
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('MYSQL_HOST'),
-            database=os.getenv('MYSQL_DATABASE'),
-            user=os.getenv('MYSQL_USER'),
-            password=os.getenv('MYSQL_PASSWORD')
-        )
+        connection = connect_mysql()
         return connection
     except Error as e:
         logger.error(f"MySQL Connection Error: {e}")
         return None
 
+# Tables already validated in this process (daemon iterations skip the DESCRIBE)
+_validated_tables = set()
+
 def ensure_rolling_update_columns(table_name, primary_key_column='id'):
     """
     Ensure table has required columns for rolling updates
     """
+    if table_name in _validated_tables:
+        return True
+
     connection = get_mysql_connection()
     if not connection:
         logger.error(f"Cannot validate table structure for {table_name} - no database connection")
@@ -106,6 +107,7 @@ def ensure_rolling_update_columns(table_name, primary_key_column='id'):
         else:
             logger.debug(f"✅ Table {table_name} structure is up to date")
 
+        _validated_tables.add(table_name)
         return True
 
     except Error as e:
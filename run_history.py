@@ -0,0 +1,313 @@
+"""
+Run History
+Persisted record of every job run, with daily downsampling and duration/throughput trends
+
+Each finished run (or daemon iteration) becomes a row in job_run_history. Rows
+older than RUN_HISTORY_RETENTION_DAYS are rolled up into one job_run_daily row
+per job and day (p50/p95 duration, items per second, counts) and deleted; daily
+rows are kept for RUN_HISTORY_DAILY_RETENTION_DAYS.
+"""
+
+import os
+import json
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from mysql.connector import Error
+from dotenv import load_dotenv
+from rolling_update_utils import get_mysql_connection
+from sync_runtime import AEST
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+RUN_HISTORY_TABLE = 'job_run_history'
+RUN_DAILY_TABLE = 'job_run_daily'
+
+_tables_ready = False
+_last_prune = 0.0
+_writer = None
+_writer_pid = None
+_writer_lock = threading.Lock()
+
+def history_enabled():
+    """Check whether run history recording is turned on"""
+    return os.getenv('RUN_HISTORY_ENABLED', 'true').lower() == 'true'
+
+def _percentile(ordered, fraction):
+    """Nearest-rank percentile of an already sorted list (same rule as StageTimer.summary)"""
+    if not ordered:
+        return None
+    return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+def _aest_naive(moment):
+    """A datetime (naive local or aware) as naive AEST, the way the tables store it"""
+    return moment.astimezone(AEST).replace(tzinfo=None)
+
+def ensure_run_history_tables():
+    """
+    Ensure the run history tables exist
+    Auto-creates them on first use
+    """
+    global _tables_ready
+    if _tables_ready:
+        return True
+
+    connection = get_mysql_connection()
+    if not connection:
+        logger.error("Cannot validate run history tables - no database connection")
+        return False
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {RUN_HISTORY_TABLE} (
+                id BIGINT NOT NULL AUTO_INCREMENT PRIMARY KEY,
+                job_id VARCHAR(64) NOT NULL,
+                started_at DATETIME(3) NOT NULL,
+                ended_at DATETIME(3) NOT NULL,
+                duration_seconds DOUBLE NOT NULL,
+                outcome VARCHAR(16) NOT NULL,
+                exit_code INT NULL,
+                items_processed INT NULL,
+                items_updated INT NULL,
+                errors INT NULL,
+                items_per_second DOUBLE NULL,
+                peak_rss_kb BIGINT NULL,
+                stage_timings TEXT NULL,
+                KEY idx_job_started (job_id, started_at)
+            )
+        """)
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {RUN_DAILY_TABLE} (
+                job_id VARCHAR(64) NOT NULL,
+                day DATE NOT NULL,
+                runs INT NOT NULL,
+                failures INT NOT NULL,
+                p50_duration DOUBLE NULL,
+                p95_duration DOUBLE NULL,
+                max_duration DOUBLE NULL,
+                p50_items_per_second DOUBLE NULL,
+                items_processed BIGINT NOT NULL DEFAULT 0,
+                errors BIGINT NOT NULL DEFAULT 0,
+                max_peak_rss_kb BIGINT NULL,
+                PRIMARY KEY (job_id, day)
+            )
+        """)
+        connection.commit()
+        _tables_ready = True
+        return True
+
+    except Error as e:
+        logger.error(f"❌ Run history table validation failed: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def record_run(job_id, started_at, ended_at, outcome, exit_code=None, result=None):
+    """
+    Store one finished run; result is the run's result dict (processed, updated, errors, timings, peak_rss_kb)
+    """
+    if not ensure_run_history_tables():
+        return False
+
+    result = result or {}
+    duration = max(0.0, (ended_at - started_at).total_seconds())
+    processed = result.get('processed')
+    items_per_second = round(processed / duration, 3) if processed and duration > 0 else None
+
+    connection = get_mysql_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            INSERT INTO {RUN_HISTORY_TABLE}
+                (job_id, started_at, ended_at, duration_seconds, outcome, exit_code, items_processed,
+                 items_updated, errors, items_per_second, peak_rss_kb, stage_timings)
+            VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+        """, (job_id, _aest_naive(started_at), _aest_naive(ended_at), round(duration, 3), outcome, exit_code,
+              processed, result.get('updated'), result.get('errors'), items_per_second, result.get('peak_rss_kb'),
+              json.dumps(result['timings']) if result.get('timings') else None))
+        connection.commit()
+        return True
+
+    except Error as e:
+        logger.error(f"Error recording run history for {job_id}: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def _record_and_prune(*args):
+    global _last_prune
+    record_run(*args)
+    # Roll up old runs at most once an hour
+    if time.monotonic() - _last_prune > 3600:
+        _last_prune = time.monotonic()
+        prune_run_history()
+
+def submit_run(job_id, started_at, ended_at, outcome, exit_code=None, result=None):
+    """
+    Record a run in the background (callers are the JobManager event loop and must not block on MySQL)
+    """
+    global _writer, _writer_pid
+    if not history_enabled():
+        return
+    with _writer_lock:
+        if _writer is None or _writer_pid != os.getpid():
+            # One writer thread per process, so runs are stored in the order they finished
+            _writer = ThreadPoolExecutor(max_workers=1, thread_name_prefix='run-history')
+            _writer_pid = os.getpid()
+        _writer.submit(_record_and_prune, job_id, started_at, ended_at, outcome, exit_code, result)
+
+def _daily_rows(runs):
+    """Roll (day, duration, outcome, processed, errors, items/s, peak rss) tuples up per day"""
+    days = {}
+    for day, duration, outcome, processed, errors, items_per_second, peak_rss_kb in runs:
+        days.setdefault(day, []).append((duration, outcome, processed, errors, items_per_second, peak_rss_kb))
+
+    rows = {}
+    for day, day_runs in days.items():
+        durations = sorted(run[0] for run in day_runs)
+        rates = sorted(run[4] for run in day_runs if run[4] is not None)
+        peaks = [run[5] for run in day_runs if run[5] is not None]
+        rows[day] = {
+            'runs': len(day_runs),
+            'failures': sum(1 for run in day_runs if run[1] != 'success'),
+            'p50_duration': _percentile(durations, 0.50),
+            'p95_duration': _percentile(durations, 0.95),
+            'max_duration': durations[-1],
+            'p50_items_per_second': _percentile(rates, 0.50),
+            'items_processed': sum(run[2] or 0 for run in day_runs),
+            'errors': sum(run[3] or 0 for run in day_runs),
+            'max_peak_rss_kb': max(peaks) if peaks else None
+        }
+    return rows
+
+def prune_run_history():
+    """
+    Roll runs older than RUN_HISTORY_RETENTION_DAYS up into daily rows, then drop them,
+    and drop daily rows older than RUN_HISTORY_DAILY_RETENTION_DAYS
+    """
+    if not ensure_run_history_tables():
+        return False
+
+    now = _aest_naive(datetime.now())
+    raw_cutoff = (now - timedelta(days=int(os.getenv('RUN_HISTORY_RETENTION_DAYS', 30)))).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+    daily_cutoff = (now - timedelta(days=int(os.getenv('RUN_HISTORY_DAILY_RETENTION_DAYS', 365)))).date()
+
+    connection = get_mysql_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT job_id, DATE(started_at), duration_seconds, outcome, items_processed, errors,
+                   items_per_second, peak_rss_kb
+            FROM {RUN_HISTORY_TABLE} WHERE started_at < %s
+        """, (raw_cutoff,))
+        per_job = {}
+        for job_id, *run in cursor.fetchall():
+            per_job.setdefault(job_id, []).append(tuple(run))
+
+        for job_id, runs in per_job.items():
+            for day, row in _daily_rows(runs).items():
+                # Whole days are always rolled up at once, so a day is never written twice
+                cursor.execute(f"""
+                    REPLACE INTO {RUN_DAILY_TABLE}
+                        (job_id, day, runs, failures, p50_duration, p95_duration, max_duration,
+                         p50_items_per_second, items_processed, errors, max_peak_rss_kb)
+                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
+                """, (job_id, day, row['runs'], row['failures'], row['p50_duration'], row['p95_duration'],
+                      row['max_duration'], row['p50_items_per_second'], row['items_processed'], row['errors'],
+                      row['max_peak_rss_kb']))
+
+        cursor.execute(f"DELETE FROM {RUN_HISTORY_TABLE} WHERE started_at < %s", (raw_cutoff,))
+        removed = cursor.rowcount
+        cursor.execute(f"DELETE FROM {RUN_DAILY_TABLE} WHERE day < %s", (daily_cutoff,))
+        connection.commit()
+        if removed:
+            logger.info(f"🗜️ Rolled {removed} runs older than {raw_cutoff.date()} up into daily run history")
+        return True
+
+    except Error as e:
+        logger.error(f"Error pruning run history: {e}")
+        connection.rollback()
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def run_trends(job_id, days=30, recent=20):
+    """
+    Per-day p50/p95 duration and items per second of a job over the last days, oldest first,
+    plus its most recent runs
+    """
+    trends = {'job_id': job_id, 'days': days, 'points': [], 'recent': []}
+    if not ensure_run_history_tables():
+        return trends
+
+    since = (_aest_naive(datetime.now()) - timedelta(days=days - 1)).replace(hour=0, minute=0, second=0, microsecond=0)
+    connection = get_mysql_connection()
+    if not connection:
+        return trends
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            SELECT DATE(started_at), duration_seconds, outcome, items_processed, errors,
+                   items_per_second, peak_rss_kb
+            FROM {RUN_HISTORY_TABLE} WHERE job_id = %s AND started_at >= %s
+        """, (job_id, since))
+        points = _daily_rows(cursor.fetchall())
+
+        # Days already rolled up only exist in the daily table
+        cursor.execute(f"""
+            SELECT day, runs, failures, p50_duration, p95_duration, max_duration, p50_items_per_second,
+                   items_processed, errors, max_peak_rss_kb
+            FROM {RUN_DAILY_TABLE} WHERE job_id = %s AND day >= %s
+        """, (job_id, since.date()))
+        for day, *values in cursor.fetchall():
+            points.setdefault(day, dict(zip(
+                ('runs', 'failures', 'p50_duration', 'p95_duration', 'max_duration', 'p50_items_per_second',
+                 'items_processed', 'errors', 'max_peak_rss_kb'), values)))
+
+        trends['points'] = [dict(point, day=day.isoformat()) for day, point in sorted(points.items())]
+
+        cursor.execute(f"""
+            SELECT started_at, duration_seconds, outcome, exit_code, items_processed, errors,
+                   items_per_second, peak_rss_kb
+            FROM {RUN_HISTORY_TABLE} WHERE job_id = %s ORDER BY started_at DESC LIMIT %s
+        """, (job_id, recent))
+        trends['recent'] = [{
+            'started_at': started_at.replace(tzinfo=AEST).isoformat(),
+            'duration_seconds': duration,
+            'outcome': outcome,
+            'exit_code': exit_code,
+            'items_processed': processed,
+            'errors': errors,
+            'items_per_second': items_per_second,
+            'peak_rss_kb': peak_rss_kb
+        } for started_at, duration, outcome, exit_code, processed, errors, items_per_second, peak_rss_kb
+            in cursor.fetchall()]
+        return trends
+
+    except Error as e:
+        logger.error(f"Error reading run history for {job_id}: {e}")
+        return trends
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
@@ -7,7 +7,7 @@ Run this script to start the web interface
 import os
 import sys
 from app import app
-from job_manager import initialize_jobs
+from job_manager import initialize_jobs, start_scheduler
 
 def main():
     print("🚀 Starting SAP B1 Query Tool Web Interface...")
@@ -33,6 +33,9 @@ def main():
         # Initialize background jobs
         print("🔄 Initializing background jobs...")
         initialize_jobs()
+        if os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            # Only the reloader's serving child schedules jobs
+            start_scheduler()
         print("✅ Background jobs initialized")
         print()
 
@@ -0,0 +1,198 @@
+"""
+SAP Request Budget
+Host-wide cap on concurrent SAP SQL proxy calls, shared by the sync jobs and the query console
+
+Each call holds one of SAP_BUDGET_CONCURRENCY slots - an flock'ed file under
+SAP_BUDGET_DIR - so the cap covers gunicorn workers, job subprocesses and warm
+pool workers alike, and a slot frees itself when its process dies. Callers queue
+by priority: while a higher-priority caller waits for a slot, lower ones hold
+back, and SAP_BUDGET_RESERVED slots are kept for interactive (console) queries.
+"""
+
+import os
+import json
+import time
+import fcntl
+import random
+import logging
+import threading
+from contextlib import contextmanager
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Lower value = served first
+PRIORITIES = {'interactive': 0, 'high': 1, 'normal': 2, 'low': 3}
+
+BUDGET_DIR = os.path.abspath(os.getenv('SAP_BUDGET_DIR', 'sap_budget'))
+
+class SapBudgetTimeout(Exception):
+    """Raised when no SAP request slot frees up within the wait timeout"""
+
+def budget_concurrency():
+    """Concurrent SAP calls allowed on this host (0 turns the budget off)"""
+    return max(0, int(os.getenv('SAP_BUDGET_CONCURRENCY', 4)))
+
+def budget_reserved():
+    """Slots only interactive callers may use (always leaves at least one for everyone else)"""
+    return max(0, min(int(os.getenv('SAP_BUDGET_RESERVED', 1)), budget_concurrency() - 1))
+
+_local = threading.local()
+_default_consumer = (os.getenv('SAP_CONSUMER') or 'unknown', os.getenv('SAP_PRIORITY') or 'normal')
+
+def set_default_consumer(name, priority=None):
+    """
+    Name (and priority) SAP calls from this process are charged to, e.g. the job name
+    The priority defaults to SAP_PRIORITY, which JobManager sets from the job's sap_priority
+    """
+    global _default_consumer
+    _default_consumer = (name, priority or os.getenv('SAP_PRIORITY') or 'normal')
+
+@contextmanager
+def sap_consumer(name, priority):
+    """Charge SAP calls made by this thread inside the block to name at priority"""
+    previous = getattr(_local, 'consumer', None)
+    _local.consumer = (name, priority)
+    try:
+        yield
+    finally:
+        _local.consumer = previous
+
+def current_consumer():
+    """(name, priority) SAP calls from this thread are charged to"""
+    return getattr(_local, 'consumer', None) or _default_consumer
+
+def _priority_level(priority):
+    return PRIORITIES.get(priority, PRIORITIES['normal'])
+
+def _open_lock_file(name):
+    os.makedirs(BUDGET_DIR, exist_ok=True)
+    return os.open(os.path.join(BUDGET_DIR, name), os.O_RDWR | os.O_CREAT, 0o644)
+
+def _is_locked(name):
+    """True if some process holds any lock on the file"""
+    fd = _open_lock_file(name)
+    try:
+        fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        return False
+    except BlockingIOError:
+        return True
+    finally:
+        os.close(fd)
+
+def _higher_priority_waiting(level):
+    return any(_is_locked(f'waiting-{higher}.lock') for higher in range(level))
+
+def _try_take_slot(usable):
+    for index in range(usable):
+        fd = _open_lock_file(f'slot-{index}.lock')
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return index, fd
+        except BlockingIOError:
+            os.close(fd)
+    return None, None
+
+class SapSlot:
+    """
+    A held SAP request slot - release() it when the call is done
+    """
+    def __init__(self, index=None, fd=None, waited=0.0):
+        self.index = index
+        self.waited = waited
+        self._fd = fd
+
+    def release(self):
+        if self._fd is not None:
+            os.ftruncate(self._fd, 0)
+            fcntl.flock(self._fd, fcntl.LOCK_UN)
+            os.close(self._fd)
+            self._fd = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+def acquire_sap_slot(timeout=None):
+    """
+    Wait for a free SAP request slot for the current consumer, highest priority first
+    Raises SapBudgetTimeout after timeout seconds (SAP_BUDGET_WAIT_TIMEOUT, default 120)
+    """
+    concurrency = budget_concurrency()
+    if concurrency == 0:
+        return SapSlot()
+
+    consumer, priority = current_consumer()
+    level = _priority_level(priority)
+    usable = concurrency if level == PRIORITIES['interactive'] else concurrency - budget_reserved()
+    timeout = float(os.getenv('SAP_BUDGET_WAIT_TIMEOUT', 120)) if timeout is None else timeout
+    started = time.monotonic()
+
+    # A shared lock on waiting-<level>.lock tells lower priorities someone here is queued
+    waiting_fd = _open_lock_file(f'waiting-{level}.lock')
+    fcntl.flock(waiting_fd, fcntl.LOCK_SH)
+    try:
+        delay = 0.005
+        while True:
+            if not _higher_priority_waiting(level):
+                index, fd = _try_take_slot(usable)
+                if fd is not None:
+                    break
+            if time.monotonic() - started >= timeout:
+                raise SapBudgetTimeout(
+                    f"No SAP request slot free after {timeout:g}s ({concurrency} concurrent, {priority} priority)")
+            time.sleep(delay * random.uniform(0.5, 1.5))
+            delay = min(delay * 2, 0.1)
+    finally:
+        fcntl.flock(waiting_fd, fcntl.LOCK_UN)
+        os.close(waiting_fd)
+
+    # Holder details for the dashboard; cleared again on release
+    holder = json.dumps({'consumer': consumer, 'priority': priority, 'pid': os.getpid(), 'since': time.time()})
+    os.ftruncate(fd, 0)
+    os.pwrite(fd, holder.encode(), 0)
+    return SapSlot(index, fd, time.monotonic() - started)
+
+def budget_usage():
+    """
+    Current budget state on this host: slot holders and which priorities have callers queued
+    """
+    concurrency = budget_concurrency()
+    usage = {
+        'enabled': concurrency > 0,
+        'concurrency': concurrency,
+        'reserved_interactive': budget_reserved() if concurrency else 0,
+        'in_use': 0,
+        'holders': [],
+        'waiting': []
+    }
+    if not concurrency:
+        return usage
+
+    now = time.time()
+    for index in range(concurrency):
+        name = f'slot-{index}.lock'
+        if not _is_locked(name):
+            continue
+        usage['in_use'] += 1
+        try:
+            with open(os.path.join(BUDGET_DIR, name)) as f:
+                holder = json.loads(f.read() or '{}')
+        except (OSError, ValueError):
+            # Taken a moment ago - details not written yet
+            holder = {}
+        usage['holders'].append({
+            'slot': index,
+            'consumer': holder.get('consumer', 'unknown'),
+            'priority': holder.get('priority'),
+            'pid': holder.get('pid'),
+            'held_seconds': round(now - holder['since'], 1) if 'since' in holder else None
+        })
+
+    usage['waiting'] = [priority for priority, level in PRIORITIES.items() if _is_locked(f'waiting-{level}.lock')]
+    return usage
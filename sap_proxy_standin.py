@@ -0,0 +1,126 @@
+"""
+SAP SQL Proxy Stand-in
+Local replacement for the SAP B1 SQL proxy, backed by a SQLite file, for benchmarks
+
+Speaks the same protocol as SQL_PROXY_URL (POST {"query": ...} -> {"data": [...]})
+and adds a configurable per-request latency to model the real network hop.
+Usage: sap_proxy_standin.py --db bench_sap.sqlite [--port 0] [--latency-ms 40] [--jitter-ms 10]
+"""
+
+import re
+import sys
+import json
+import time
+import random
+import sqlite3
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+TOP_PATTERN = re.compile(r'^\s*SELECT\s+TOP\s+(\d+)\s+', re.IGNORECASE)
+
+def translate_query(query):
+    """
+    Translate the SAP (SQL Server) dialect used by the sync jobs to SQLite
+    Only TOP n needs rewriting - it becomes a trailing LIMIT n
+    """
+    match = TOP_PATTERN.match(query)
+    if not match:
+        return query
+    body = query[match.end():].rstrip().rstrip(';')
+    return f"SELECT {body}\nLIMIT {int(match.group(1))}"
+
+class StandinHandler(BaseHTTPRequestHandler):
+    """Answers proxy queries from the SQLite database"""
+    db_path = None
+    latency_ms = 0.0
+    jitter_ms = 0.0
+    stats = {'requests': 0, 'errors': 0, 'rows': 0}
+    stats_lock = threading.Lock()
+
+    def do_POST(self):
+        if self.path == '/stats/reset':
+            with self.stats_lock:
+                for key in self.stats:
+                    self.stats[key] = 0
+            self._reply(200, {'stats': dict(self.stats)})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            query = json.loads(self.rfile.read(length) or b'{}').get('query', '')
+        except ValueError:
+            self._reply(400, {'error': 'invalid JSON body'})
+            return
+
+        delay = self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)
+        if delay > 0:
+            time.sleep(delay / 1000.0)
+
+        connection = sqlite3.connect(self.db_path)
+        connection.row_factory = sqlite3.Row
+        try:
+            rows = [dict(row) for row in connection.execute(translate_query(query)).fetchall()]
+            with self.stats_lock:
+                self.stats['requests'] += 1
+                self.stats['rows'] += len(rows)
+            self._reply(200, {'data': rows})
+        except sqlite3.Error as e:
+            with self.stats_lock:
+                self.stats['requests'] += 1
+                self.stats['errors'] += 1
+            # The real proxy reports query errors in the body with HTTP 200
+            self._reply(200, {'error': str(e)})
+        finally:
+            connection.close()
+
+    def do_GET(self):
+        if self.path == '/stats':
+            with self.stats_lock:
+                self._reply(200, {'stats': dict(self.stats)})
+        else:
+            self._reply(404, {'error': 'not found'})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def serve(db_path, port=0, latency_ms=0.0, jitter_ms=0.0):
+    """
+    Run the stand-in until interrupted
+    Prints "LISTENING <port>" once ready so a parent process can find an ephemeral port
+    """
+    StandinHandler.db_path = db_path
+    StandinHandler.latency_ms = latency_ms
+    StandinHandler.jitter_ms = jitter_ms
+
+    server = ThreadingHTTPServer(('127.0.0.1', port), StandinHandler)
+    server.daemon_threads = True
+    print(f"LISTENING {server.server_address[1]}", flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local SAP SQL proxy stand-in backed by SQLite")
+    parser.add_argument('--db', required=True, help="SQLite file created by benchmark.py generate")
+    parser.add_argument('--port', type=int, default=0)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    args = parser.parse_args(argv)
+
+    serve(args.db, args.port, args.latency_ms, args.jitter_ms)
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,348 @@
+"""
+Scheduler Leadership
+Elects one process (across gunicorn workers and containers) to run job schedules
+
+The leader holds a MySQL GET_LOCK on a dedicated connection and advertises a
+small control endpoint in the scheduler_leader table. Followers never start
+schedules; they proxy job control and status calls to the leader.
+"""
+
+import os
+import json
+import hmac
+import socket
+import hashlib
+import logging
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import requests
+from mysql.connector import Error
+from dotenv import load_dotenv
+from sync_runtime import connect_mysql
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LOCK_NAME = os.getenv('SCHEDULER_LOCK_NAME', 'd1sapsync_scheduler')
+LEADER_TABLE = 'scheduler_leader'
+
+# JobManager methods a follower may call on the leader
+PROXIED_METHODS = {
+    'get_all_jobs_status',
+    'get_dependency_graph',
+    'get_job_status',
+    'get_job_logs',
+    'get_log_history',
+    'wait_for_updates',
+    'get_slowest_spans',
+    'profile_next_run',
+    'get_job_profile',
+    'start_job',
+    'stop_job',
+    'restart_job',
+    'render_metrics',
+    'record_console_query',
+    'get_sap_budget',
+    'get_run_trends',
+}
+
+class SchedulerUnavailable(Exception):
+    """Raised when no scheduler leader can be reached"""
+
+def leadership_enabled():
+    """Check whether leader election is turned on"""
+    return os.getenv('SCHEDULER_LEADERSHIP', 'true').lower() == 'true'
+
+# Placeholder secrets from app.py and .env.example - anyone can derive a token from them
+PLACEHOLDER_SECRETS = {'your-default-secret-key', 'your-secret-key-here'}
+
+def _control_token():
+    """
+    Shared secret for leader control calls (all nodes share FLASK_SECRET_KEY)
+    None when neither SCHEDULER_CONTROL_TOKEN nor a real FLASK_SECRET_KEY is set
+    """
+    secret = os.getenv('SCHEDULER_CONTROL_TOKEN') or os.getenv('FLASK_SECRET_KEY')
+    if not secret or secret in PLACEHOLDER_SECRETS:
+        return None
+    return hashlib.sha256(f"scheduler-control:{secret}".encode()).hexdigest()
+
+def _control_hosts():
+    """(bind host, advertised host) of the leader's control endpoint"""
+    advertise = os.getenv('SCHEDULER_ADVERTISE_HOST') or socket.gethostname()
+    # Listen only on the interface other nodes reach us by, not on every interface
+    return os.getenv('SCHEDULER_CONTROL_BIND') or advertise, advertise
+
+class _ControlHandler(BaseHTTPRequestHandler):
+    """Serves proxied JobManager calls on the leader"""
+    job_manager = None
+
+    def do_POST(self):
+        if self.path != '/call':
+            self._reply(404, {'error': 'not found'})
+            return
+
+        token = self.headers.get('X-Scheduler-Token', '')
+        expected = _control_token()
+        if not expected or not hmac.compare_digest(token, expected):
+            self._reply(403, {'error': 'forbidden'})
+            return
+
+        try:
+            length = int(self.headers.get('Content-Length', 0))
+            call = json.loads(self.rfile.read(length) or b'{}')
+            method = call.get('method')
+            if method not in PROXIED_METHODS:
+                self._reply(400, {'error': f'method {method} not allowed'})
+                return
+
+            result = getattr(self.job_manager, method)(*call.get('args', []), **call.get('kwargs', {}))
+            self._reply(200, {'result': result})
+        except Exception as e:
+            logger.error(f"Scheduler control call failed: {e}")
+            self._reply(500, {'error': str(e)})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload, default=str).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"Scheduler control: {format % args}")
+
+class RemoteJobManager:
+    """
+    Follower-side stand-in for JobManager that forwards calls to the leader
+    """
+    def __init__(self, address):
+        self.address = address
+
+    def __getattr__(self, method):
+        if method not in PROXIED_METHODS:
+            raise AttributeError(method)
+
+        def call(*args, **kwargs):
+            try:
+                response = requests.post(
+                    f"http://{self.address}/call",
+                    json={'method': method, 'args': list(args), 'kwargs': kwargs},
+                    headers={'X-Scheduler-Token': _control_token()},
+                    timeout=float(os.getenv('SCHEDULER_PROXY_TIMEOUT', 10))
+                )
+            except requests.RequestException as e:
+                raise SchedulerUnavailable(f"Scheduler leader at {self.address} unreachable: {e}")
+
+            payload = response.json()
+            if response.status_code != 200:
+                raise SchedulerUnavailable(f"Scheduler leader error: {payload.get('error')}")
+            return payload['result']
+
+        return call
+
+class SchedulerLeadership:
+    """
+    Background election loop for one process
+    """
+    def __init__(self, job_manager, control=True):
+        self.job_manager = job_manager
+        # Without a control token the leader runs schedules but serves no control endpoint
+        self.control = control
+        self.node_id = f"{socket.gethostname()}:{os.getpid()}"
+        self.is_leader = False
+        self.leader_address = None
+        self._connection = None
+        self._server = None
+        self._stop = threading.Event()
+        self._thread = None
+        self.check_interval = float(os.getenv('SCHEDULER_LEASE_CHECK', 5))
+        self.stale_after = int(os.getenv('SCHEDULER_LEADER_STALE', 30))
+
+    def start(self):
+        """Start the election loop in a daemon thread"""
+        self._thread = threading.Thread(target=self._run, name='scheduler-leadership', daemon=True)
+        self._thread.start()
+
+    def _ensure_leader_table(self, cursor):
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {LEADER_TABLE} (
+                id TINYINT NOT NULL PRIMARY KEY,
+                node_id VARCHAR(128) NOT NULL,
+                address VARCHAR(255) NOT NULL,
+                heartbeat TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.is_leader:
+                    self._renew()
+                else:
+                    self._try_acquire()
+            except Error as e:
+                logger.error(f"Scheduler leadership check failed: {e}")
+                self._demote()
+            except Exception as e:
+                logger.error(f"Scheduler leadership error: {e}")
+            self._stop.wait(self.check_interval)
+
+    def _try_acquire(self):
+        if self._connection is None or not self._connection.is_connected():
+            self._connection = connect_mysql()
+            self._connection.autocommit = True
+
+        cursor = self._connection.cursor(buffered=True)
+        try:
+            cursor.execute("SELECT GET_LOCK(%s, 0)", (LOCK_NAME,))
+            acquired = cursor.fetchone()[0] == 1
+            if not acquired:
+                self.leader_address = self._read_leader_address(cursor)
+                return
+
+            try:
+                self._ensure_leader_table(cursor)
+                address = self._start_control_server() if self.control else ''
+                cursor.execute(f"""
+                    REPLACE INTO {LEADER_TABLE} (id, node_id, address, heartbeat)
+                    VALUES (1, %s, %s, NOW())
+                """, (self.node_id, address))
+            except Exception:
+                # Could not take over - let another process lead
+                if self._server:
+                    self._server.shutdown()
+                    self._server.server_close()
+                    self._server = None
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (LOCK_NAME,))
+                cursor.fetchone()
+                raise
+        finally:
+            cursor.close()
+
+        self.is_leader = True
+        self.leader_address = address
+        logger.info(f"👑 {self.node_id} elected scheduler leader (control: {address or 'disabled'})")
+        self.job_manager.start_auto_start_jobs()
+
+    def _renew(self):
+        cursor = self._connection.cursor(buffered=True)
+        try:
+            cursor.execute("SELECT IS_USED_LOCK(%s) = CONNECTION_ID()", (LOCK_NAME,))
+            still_leader = cursor.fetchone()[0] == 1
+            if still_leader:
+                cursor.execute(f"UPDATE {LEADER_TABLE} SET heartbeat = NOW() WHERE id = 1 AND node_id = %s",
+                               (self.node_id,))
+        finally:
+            cursor.close()
+
+        if not still_leader:
+            logger.warning(f"⚠️ {self.node_id} lost the scheduler lock")
+            self._demote()
+
+    def _read_leader_address(self, cursor):
+        try:
+            cursor.execute(f"""
+                SELECT address FROM {LEADER_TABLE}
+                WHERE id = 1 AND heartbeat > DATE_SUB(NOW(), INTERVAL {self.stale_after} SECOND)
+            """)
+            row = cursor.fetchone()
+            return row[0] if row else None
+        except Error:
+            # Table not created yet - no leader has ever been elected
+            return None
+
+    def _start_control_server(self):
+        """Start the leader's control endpoint and return its advertised address"""
+        handler = type('ControlHandler', (_ControlHandler,), {'job_manager': self.job_manager})
+        port = int(os.getenv('SCHEDULER_CONTROL_PORT', 0))
+        bind_host, advertise_host = _control_hosts()
+        self._server = ThreadingHTTPServer((bind_host, port), handler)
+        self._server.daemon_threads = True
+        threading.Thread(target=self._server.serve_forever, name='scheduler-control', daemon=True).start()
+
+        return f"{advertise_host}:{self._server.server_address[1]}"
+
+    def _demote(self):
+        """Stop running schedules after losing (or failing to confirm) leadership"""
+        if self.is_leader:
+            logger.warning(f"🔻 {self.node_id} stepping down as scheduler leader")
+            self.job_manager.stop_all_jobs()
+            if self._server:
+                self._server.shutdown()
+                self._server.server_close()
+                self._server = None
+        self.is_leader = False
+        self.leader_address = None
+        if self._connection is not None:
+            try:
+                self._connection.close()
+            except Error:
+                pass
+            self._connection = None
+
+    def get_controller(self):
+        """Get the JobManager to use for control/status calls from this process"""
+        if self.is_leader:
+            return self.job_manager
+        if self.leader_address == '':
+            raise SchedulerUnavailable("The scheduler leader has no control endpoint - set SCHEDULER_CONTROL_TOKEN "
+                                       "or a real FLASK_SECRET_KEY")
+        if not self.leader_address:
+            raise SchedulerUnavailable("No scheduler leader elected yet")
+        return RemoteJobManager(self.leader_address)
+
+    def describe(self):
+        """Leadership state for the dashboard"""
+        return {
+            'enabled': True,
+            'node_id': self.node_id,
+            'role': 'leader' if self.is_leader else 'follower',
+            'leader_address': self.leader_address,
+            'control_endpoint': self.control
+        }
+
+_leadership = None
+_leadership_pid = None
+_leadership_lock = threading.Lock()
+
+def start_scheduler_leadership(job_manager):
+    """
+    Start leader election for this process (idempotent, fork-aware, never raises)
+    Without leadership enabled, this process simply runs the auto-start jobs itself
+    """
+    global _leadership, _leadership_pid
+    with _leadership_lock:
+        if _leadership_pid == os.getpid():
+            return _leadership
+        _leadership_pid = os.getpid()
+
+        if not leadership_enabled():
+            _leadership = None
+            job_manager.start_auto_start_jobs()
+            return None
+
+        control = _control_token() is not None
+        if not control:
+            # Without a real secret anyone who can reach the control port could run jobs, so
+            # still elect one leader to run the schedules but serve no control endpoint
+            logger.error("❌ Scheduler control endpoint disabled - set SCHEDULER_CONTROL_TOKEN or a real "
+                         "FLASK_SECRET_KEY; until then only the leader process can show and control jobs")
+
+        _leadership = SchedulerLeadership(job_manager, control=control)
+        _leadership.start()
+        return _leadership
+
+def get_job_controller(job_manager):
+    """Get the local JobManager or a proxy to the elected leader"""
+    if _leadership is None or _leadership_pid != os.getpid():
+        return job_manager
+    return _leadership.get_controller()
+
+def describe_leadership():
+    """Leadership state for this process"""
+    if _leadership is None or _leadership_pid != os.getpid():
+        return {'enabled': False, 'role': 'standalone', 'node_id': None, 'leader_address': None}
+    return _leadership.describe()
@@ -1,41 +1,25 @@
 import json
-import requests
 import os
-import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
 from datetime import datetime, timezone, timedelta
 import logging
+from sync_logging import setup_logging
 from rolling_update_utils import ensure_rolling_update_columns, update_sync_timestamp, log_rolling_update_analytics
+from sync_state import get_sync_state, set_sync_state, RunCheckpoint, checkpoint_interval
+from sync_runtime import (connect_mysql, sap_post, sql_literal, emit_status, run_daemon, is_daemon_mode, stage,
+                          timed_run)
+from product_index import (lookup_product_id, get_product_index, product_index_enabled, products_max_id,
+                           ProductIndexUnavailable)
+from negative_cache import (negative_cache_enabled, backoff_settings, codes_not_due, record_misses, forget_items,
+                            revalidate, cache_summary)
 
 # Load environment variables
 load_dotenv()
 
-# Setup logging with AEST timezone
+# AEST timezone for timestamps
 AEST = timezone(timedelta(hours=10))
 
-class AESTFormatter(logging.Formatter):
-    def formatTime(self, record, datefmt=None):
-        ct = datetime.fromtimestamp(record.created, AEST)
-        if datefmt:
-            s = ct.strftime(datefmt)
-        else:
-            s = ct.strftime('%Y-%m-%d %H:%M:%S')
-        return s
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('serial_number_sync.log'),
-        logging.StreamHandler()
-    ]
-)
-
-# Apply AEST formatter to all handlers
-for handler in logging.getLogger().handlers:
-    handler.setFormatter(AESTFormatter('%(asctime)s - %(levelname)s - %(message)s'))
 logger = logging.getLogger(__name__)
 
 def send_sql_query(query):
@@ -47,7 +31,7 @@ def send_sql_query(query):
     payload = json.dumps({"query": query})
 
     try:
-        response = requests.post(sql_proxy_url, headers=headers, data=payload)
+        response = sap_post(sql_proxy_url, headers=headers, data=payload)
         if response.status_code == 200:
             data = response.json()
             if "error" in data:
@@ -66,46 +50,155 @@ def get_mysql_connection():
     Get MySQL database connection
     """
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('MYSQL_HOST'),
-            database=os.getenv('MYSQL_DATABASE'),
-            user=os.getenv('MYSQL_USER'),
-            password=os.getenv('MYSQL_PASSWORD')
-        )
+        connection = connect_mysql()
         return connection
     except Error as e:
         logger.error(f"MySQL Connection Error: {e}")
         return None
 
+SYNC_JOB_NAME = 'serial_number_sync'
+
+SERIAL_ITEM_CONDITIONS = """
+    frozenFor <> 'Y'
+    AND SellItem = 'Y'
+    AND ManSerNum = 'Y'
+"""
+
+def fetch_serial_item_page(limit, after_code=None, upto_code=None):
+    """
+    Get one page of serial-managed item codes from SAP in ItemCode order
+    Returns None if the query failed
+    """
+    conditions = SERIAL_ITEM_CONDITIONS
+    if after_code:
+        conditions += f"    AND ItemCode > {sql_literal(after_code)}\n"
+    if upto_code:
+        conditions += f"    AND ItemCode <= {sql_literal(upto_code)}\n"
+
+    query = f"""
+    SELECT TOP {limit} ItemCode
+    FROM OITM
+    WHERE {conditions}
+    ORDER BY ItemCode
+    """
+
+    result = send_sql_query(query)
+    if result is None:
+        return None
+    return [item['ItemCode'] for item in result]
+
 def get_serial_number_items():
     """
-    Get items from SAP that require serial numbers
-    Returns list of item codes that require serial number tracking
+    Get the next slice of items from SAP that require serial numbers
+    Pages through the whole catalog with a persisted ItemCode cursor that wraps around, passing
+    over items cached as not found in MySQL (see negative_cache.py) until the slice is full
+    Returns (item_codes, cursor_states, skipped) - cursor_states[i] is the cursor state once item i is done
     """
     batch_size = int(os.getenv('SERIAL_SYNC_BATCH_SIZE', 50))
+    # Bounds the SAP reads of one run when most of the catalog is cached as not found
+    max_pages = max(1, int(os.getenv('SERIAL_SYNC_MAX_SCAN_PAGES', 10)))
+    skip_cached = negative_cache_enabled('SERIAL_SYNC')
+
+    cursor_state = get_sync_state(SYNC_JOB_NAME, 'item_cursor', None) or {}
+    cursor_code = cursor_state.get('cursor') or ''
+    cycle = cursor_state.get('cycle', 1)
+    cycle_started = cursor_state.get('cycle_started') or datetime.now(AEST).isoformat()
+
+    item_codes = []
+    cursor_states = []
+    skipped = 0
+    position = cursor_code  # last item code passed (synced or skipped)
+    wrapped = False
+    scanned = 0
+
+    for _ in range(max_pages):
+        page = fetch_serial_item_page(batch_size, after_code=position or None,
+                                      upto_code=cursor_code if wrapped else None)
+        if page is None:
+            break
+        scanned += len(page)
+        not_due = codes_not_due(SYNC_JOB_NAME, page) if skip_cached else set()
+
+        for code in page:
+            if len(item_codes) >= batch_size:
+                break
+            position = code
+            if code in not_due:
+                skipped += 1
+                continue
+            item_codes.append(code)
+            cursor_states.append({'cursor': code, 'cycle': cycle, 'cycle_started': cycle_started})
+
+        if len(item_codes) >= batch_size:
+            break
+        if len(page) < batch_size:
+            if wrapped:
+                # Back at the cursor this run started from - the whole catalog has been scanned
+                break
+            # Reached the end of the catalog - wrap around to the start
+            logger.info(f"🏁 Completed full catalog cycle #{cycle}")
+            cycle += 1
+            cycle_started = datetime.now(AEST).isoformat()
+            position = ''
+            if not cursor_code:
+                # Whole catalog fits in one slice
+                break
+            wrapped = True
+            logger.info("🔁 Reached end of catalog - wrapping around")
+
+    if scanned == 0 and position == cursor_code:
+        logger.warning("No serial number items found or query failed")
+        return [], [], 0
+
+    next_state = {'cursor': position, 'cycle': cycle, 'cycle_started': cycle_started}
+    if skipped:
+        logger.info(f"⏭️ Skipped {skipped} item(s) cached as not found in MySQL (not due for a re-check)")
+    if item_codes:
+        logger.info(f"Found {len(item_codes)} items requiring serial numbers (cursor: '{cursor_code}'): {item_codes}")
+        cursor_states[-1] = next_state
+    else:
+        # Nothing to sync, but the cursor still moves past the skipped items
+        set_sync_state(SYNC_JOB_NAME, 'item_cursor', next_state)
+    return item_codes, cursor_states, skipped
 
+def log_serial_cycle_progress(cursor_state):
+    """
+    Log progress through the current full catalog cycle
+    """
+    cursor_code = cursor_state.get('cursor') or ''
     query = f"""
-    SELECT TOP {batch_size} ItemCode
+    SELECT COUNT(*) AS Total,
+           SUM(CASE WHEN ItemCode <= {sql_literal(cursor_code)} THEN 1 ELSE 0 END) AS Covered
     FROM OITM
-    WHERE frozenFor <> 'Y'
-    AND SellItem = 'Y'
-    AND ManSerNum = 'Y'
+    WHERE {SERIAL_ITEM_CONDITIONS}
     """
 
     result = send_sql_query(query)
+    if not result:
+        return
 
-    if result:
-        item_codes = [item['ItemCode'] for item in result]
-        logger.info(f"Found {len(item_codes)} items requiring serial numbers: {item_codes}")
-        return item_codes
-    else:
-        logger.warning("No serial number items found or query failed")
-        return []
+    total = int(result[0].get('Total') or 0)
+    covered = int(result[0].get('Covered') or 0) if cursor_code else 0
+    if total <= 0:
+        return
+
+    batch_size = int(os.getenv('SERIAL_SYNC_BATCH_SIZE', 50))
+    remaining_runs = (total - covered + batch_size - 1) // batch_size
+    logger.info(f"📍 Cycle #{cursor_state.get('cycle', 1)} progress: {covered}/{total} items "
+                f"({covered / total * 100:.1f}%) - {remaining_runs} run(s) to complete cycle")
 
 def get_product_by_sap_code(sap_item_code):
     """
     Get product from MySQL by SAP item code
+    Resolved through the product index; queries MySQL directly only if the index is unavailable
     """
+    try:
+        with stage('product_index.lookup'):
+            product_id = lookup_product_id(sap_item_code)
+        return {'id': product_id} if product_id is not None else None
+    except ProductIndexUnavailable as e:
+        logger.debug(f"Product index unavailable ({e}) - querying MySQL for {sap_item_code}")
+
     connection = get_mysql_connection()
     if not connection:
         return None
@@ -176,6 +269,66 @@ def update_product_associated_details(product_id, sap_item_code):
             cursor.close()
             connection.close()
 
+def sync_serial_item(sap_item_code):
+    """
+    Mark one SAP serial-managed item as requiring a serial number in MySQL
+    Returns 'success', 'not_found' or 'error'
+    """
+    logger.info(f"Processing SAP item: {sap_item_code}", extra={'item_code': sap_item_code})
+
+    # Find corresponding product in MySQL
+    product = get_product_by_sap_code(sap_item_code)
+
+    if not product:
+        logger.warning(f"⚠️ Product not found in MySQL for SAP code: {sap_item_code}")
+        return 'not_found'
+
+    product_id = product['id']
+
+    # Update product_associated_details
+    if update_product_associated_details(product_id, sap_item_code):
+        # Update sync timestamp for rolling updates
+        update_sync_timestamp('product_associated_details', product_id, 'product_id')
+        return 'success'
+    return 'error'
+
+def revalidate_not_found_items():
+    """
+    Check cached not-found items again if new products appeared since they were cached
+    Returns the highest products.id (None if it could not be read)
+    """
+    highest_product_id = products_max_id()
+    if highest_product_id is None:
+        return None
+
+    if product_index_enabled():
+        try:
+            revalidate(SYNC_JOB_NAME, highest_product_id, lookup_product_id)
+            return highest_product_id
+        except ProductIndexUnavailable:
+            pass
+    # No index to check them with - make them due so this run's slice re-checks them
+    revalidate(SYNC_JOB_NAME, highest_product_id)
+    return highest_product_id
+
+def update_not_found_cache(not_found_items, found_items, highest_product_id):
+    """
+    Back off the items that are still missing from products and drop the ones that were found
+    """
+    base_seconds, max_seconds = backoff_settings('SERIAL_SYNC')
+    if highest_product_id is None:
+        # Without the products high-water mark the entries could not tell when to be re-checked
+        if not_found_items:
+            logger.warning(f"⚠️ Highest product id unknown - not caching {len(not_found_items)} not-found item(s) this run")
+    else:
+        record_misses(SYNC_JOB_NAME, not_found_items, highest_product_id, base_seconds, max_seconds)
+    forget_items(SYNC_JOB_NAME, found_items)
+
+    summary = cache_summary(SYNC_JOB_NAME)
+    if summary['cached']:
+        logger.info(f"🗃️ {summary['cached']} item(s) cached as not found in MySQL, {summary['due']} due for a re-check")
+
+@timed_run(SYNC_JOB_NAME)
 def sync_serial_number_requirements():
     """
     Main function to sync serial number requirements from SAP to MySQL
@@ -183,54 +336,109 @@ def sync_serial_number_requirements():
     logger.info("🚀 Starting serial number requirement sync process...")
 
     # Ensure table structure is ready for rolling updates
-    if not ensure_rolling_update_columns('product_associated_details', 'id'):
+    with stage('phase.schema_check'):
+        table_ready = ensure_rolling_update_columns('product_associated_details', 'id')
+    if not table_ready:
         logger.error("❌ Table structure validation failed - aborting sync")
-        return
+        return {'processed': 0, 'success': 0, 'errors': 0, 'not_found': 0,
+                'aborted': 'table structure validation failed'}
+
+    # An interrupted run saved its cursor at the last checkpoint, so this slice resumes from there
+    checkpoint = RunCheckpoint(SYNC_JOB_NAME)
 
-    # Get items requiring serial numbers from SAP
-    serial_items = get_serial_number_items()
+    # Items cached as not found that exist now are dropped from the cache before the slice is picked
+    highest_product_id = None
+    if negative_cache_enabled('SERIAL_SYNC'):
+        with stage('phase.not_found_revalidate'):
+            highest_product_id = revalidate_not_found_items()
+
+    # Get next slice of items requiring serial numbers from SAP
+    with stage('phase.fetch_items'):
+        serial_items, cursor_states, skipped = get_serial_number_items()
     if not serial_items:
-        logger.warning("No serial number items found or query failed")
         logger.info("No serial number items found to sync")
-        return
+        checkpoint.complete()
+        return {'processed': 0, 'success': 0, 'errors': 0, 'not_found': 0, 'skipped_not_found': skipped}
 
     success_count = 0
     error_count = 0
     not_found_count = 0
-
-    for sap_item_code in serial_items:
-        logger.info(f"Processing SAP item: {sap_item_code}")
-
-        # Find corresponding product in MySQL
-        product = get_product_by_sap_code(sap_item_code)
-
-        if not product:
-            logger.warning(f"⚠️ Product not found in MySQL for SAP code: {sap_item_code}")
-            not_found_count += 1
-            continue
-
-        product_id = product['id']
-
-        # Update product_associated_details
-        if update_product_associated_details(product_id, sap_item_code):
-            # Update sync timestamp for rolling updates
-            update_sync_timestamp('product_associated_details', product_id, 'product_id')
+    not_found_items = []
+    found_items = []
+    checkpoint_every = checkpoint_interval()
+    checkpoint.save(total=len(serial_items))
+
+    for index, sap_item_code in enumerate(serial_items):
+        if index and index % checkpoint_every == 0:
+            # Every item before this one is committed - persist the cursor past them
+            with stage('phase.checkpoint'):
+                set_sync_state(SYNC_JOB_NAME, 'item_cursor', cursor_states[index - 1])
+                checkpoint.save(completed=index, cursor=cursor_states[index - 1]['cursor'],
+                                cycle=cursor_states[index - 1]['cycle'])
+
+        with stage('phase.item', item_code=sap_item_code) as item_span:
+            outcome = sync_serial_item(sap_item_code)
+            item_span.set_attribute('outcome', outcome)
+
+        if outcome == 'success':
             success_count += 1
+            found_items.append(sap_item_code)
+        elif outcome == 'not_found':
+            not_found_count += 1
+            not_found_items.append(sap_item_code)
         else:
             error_count += 1
 
-    logger.info(f"🎯 Serial number sync completed: {success_count} successful, {error_count} errors, {not_found_count} not found")
-
-    # Log rolling update analytics
-    log_rolling_update_analytics('product_associated_details', 'Serial Number Sync', success_count, error_count,
-                                where_condition="fieldName = 'serial_number'", job_interval_var='SERIAL_SYNC_INTERVAL')
-
-if __name__ == "__main__":
+    logger.info(f"🎯 Serial number sync completed: {success_count} successful, {error_count} errors, "
+                f"{not_found_count} not found, {skipped} skipped as cached not found")
+
+    if negative_cache_enabled('SERIAL_SYNC'):
+        with stage('phase.not_found_cache'):
+            update_not_found_cache(not_found_items, found_items, highest_product_id)
+
+    # Advance the catalog cursor for the next run
+    next_cursor_state = cursor_states[-1]
+    with stage('phase.checkpoint'):
+        set_sync_state(SYNC_JOB_NAME, 'item_cursor', next_cursor_state)
+        checkpoint.complete(completed=len(serial_items), cursor=next_cursor_state['cursor'],
+                            cycle=next_cursor_state['cycle'])
+
+    # Log cycle progress and rolling update analytics
+    with stage('phase.analytics'):
+        log_serial_cycle_progress(next_cursor_state)
+        log_rolling_update_analytics('product_associated_details', 'Serial Number Sync', success_count, error_count,
+                                    where_condition="fieldName = 'serial_number'", job_interval_var='SERIAL_SYNC_INTERVAL')
+
+    return {
+        'processed': len(serial_items),
+        'success': success_count,
+        'errors': error_count,
+        'not_found': not_found_count,
+        'skipped_not_found': skipped,
+        'cycle': next_cursor_state.get('cycle'),
+        'cursor': next_cursor_state.get('cursor'),
+        'cache_stats': {'product_index': get_product_index().take_stats()}
+    }
+
+def main(argv=None):
+    """
+    Command line entry point
+    Usage: serial_number_sync.py [--daemon | SAP_ITEM_CODE]
+    """
     import sys
+    argv = sys.argv[1:] if argv is None else argv
+    # JSON lines to serial_number_sync.log and the job output, written off-thread
+    setup_logging('serial_number_sync')
 
-    if len(sys.argv) > 1:
+    if is_daemon_mode(argv):
+        # Long-running mode - loop internally with warm connections
+        return run_daemon('serial_number_sync', sync_serial_number_requirements,
+                          int(os.getenv('SERIAL_SYNC_INTERVAL', 900)),
+                          os.getenv('SERIAL_SYNC_QUIET_WINDOWS', os.getenv('SYNC_QUIET_WINDOWS', '')))
+
+    if argv:
         # Test mode with specific item
-        item_code = sys.argv[1]
+        item_code = argv[0]
         logger.info(f"🧪 Testing serial number sync for item: {item_code}")
 
         product = get_product_by_sap_code(item_code)
@@ -238,6 +446,13 @@ if __name__ == "__main__":
             update_product_associated_details(product['id'], item_code)
         else:
             logger.error(f"Product not found for SAP code: {item_code}")
-    else:
-        # Full sync
-        sync_serial_number_requirements()
\ No newline at end of file
+        return 0
+
+    # Full sync
+    result = sync_serial_number_requirements()
+    emit_status('run_complete', job='serial_number_sync', result=result)
+    return 0
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
@@ -1,40 +1,18 @@
 import json
-import requests
 import os
-import mysql.connector
 from mysql.connector import Error
 from dotenv import load_dotenv
-from datetime import datetime, timezone, timedelta
+from datetime import timezone, timedelta
 import logging
+from sync_logging import setup_logging
+from sync_runtime import connect_mysql, sap_post, emit_status, run_daemon, is_daemon_mode, stage, timed_run
 
 # Load environment variables
 load_dotenv()
 
-# Setup logging with AEST timezone
+# AEST timezone for timestamps
 AEST = timezone(timedelta(hours=10))
 
-class AESTFormatter(logging.Formatter):
-    def formatTime(self, record, datefmt=None):
-        ct = datetime.fromtimestamp(record.created, AEST)
-        if datefmt:
-            s = ct.strftime(datefmt)
-        else:
-            s = ct.strftime('%Y-%m-%d %H:%M:%S')
-        return s
-
-# Setup logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler('staff_sync.log'),
-        logging.StreamHandler()
-    ]
-)
-
-# Apply AEST formatter to all handlers
-for handler in logging.getLogger().handlers:
-    handler.setFormatter(AESTFormatter('%(asctime)s - %(levelname)s - %(message)s'))
 logger = logging.getLogger(__name__)
 
 def send_sql_query(query):
@@ -46,7 +24,7 @@ def send_sql_query(query):
     payload = json.dumps({"query": query})
 
     try:
-        response = requests.post(sql_proxy_url, headers=headers, data=payload)
+        response = sap_post(sql_proxy_url, headers=headers, data=payload)
         if response.status_code == 200:
             data = response.json()
             if "error" in data:
@@ -65,12 +43,7 @@ def get_mysql_connection():
     Get MySQL database connection
     """
     try:
-        connection = mysql.connector.connect(
-            host=os.getenv('MYSQL_HOST'),
-            database=os.getenv('MYSQL_DATABASE'),
-            user=os.getenv('MYSQL_USER'),
-            password=os.getenv('MYSQL_PASSWORD')
-        )
+        connection = connect_mysql()
         return connection
     except Error as e:
         logger.error(f"MySQL Connection Error: {e}")
@@ -104,6 +77,7 @@ def parse_staff_name(full_name):
 
     return first_name, last_name
 
+@timed_run('staff_sync')
 def sync_staff():
     """
     Main function to sync staff from SAP to MySQL app_users table
@@ -112,15 +86,21 @@ def sync_staff():
     logger.info("🚀 Starting staff sync process...")
 
     # Get active staff from SAP
-    sap_staff = get_sap_staff()
+    with stage('phase.fetch_staff'):
+        sap_staff = get_sap_staff()
     if not sap_staff:
         logger.info("No staff to sync")
-        return
+        return {'processed': 0, 'success': 0, 'errors': 0, 'skipped': 0}
 
-    connection = get_mysql_connection()
+    # Staff sync creates no columns or tables of its own, so connecting is its only setup step
+    with stage('phase.connect'):
+        connection = get_mysql_connection()
     if not connection:
         logger.error("Could not establish MySQL connection")
-        return
+        return {'processed': 0, 'success': 0, 'errors': 0, 'skipped': 0,
+                'aborted': 'could not establish MySQL connection'}
+
+    result = {'processed': len(sap_staff), 'success': 0, 'errors': 0, 'skipped': 0}
 
     try:
         cursor = connection.cursor(dictionary=True)
@@ -145,41 +125,46 @@ def sync_staff():
 
             first_name, last_name = parse_staff_name(staff_name_full)
 
-            try:
-                # Check if staff already exists in MySQL
-                cursor.execute("SELECT id FROM app_users WHERE id = %s", (staff_id,))
-                existing_staff = cursor.fetchone()
-
-                if existing_staff:
-                    # Skip existing records - do not update
-                    logger.debug(f"⏭️  Skipping existing staff: {staff_name_full} (ID: {staff_id})")
-                    skipped_count += 1
-                else:
-                    # Insert new staff only
-                    import uuid
-                    email = f"{uuid.uuid4()}@{uuid.uuid4()}.com"
-                    password = str(uuid.uuid4())
-
-                    insert_query = """
-                    INSERT INTO app_users
-                    (id, first_name, last_name, email_address, password, active_flag, salesman_flag, sap_import_flag)
-                    VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
-                    """
-                    cursor.execute(insert_query, (
-                        staff_id, first_name, last_name, email, password,
-                        1, 1, 1  # active_flag=1, salesman_flag=1, sap_import_flag=1
-                    ))
-
-                    staff_inserted.append(f"---> Inserted ... {staff_name_full} id: {staff_id}")
-                    logger.info(f"➕ Inserted new staff: {staff_name_full} (ID: {staff_id})")
-                    success_count += 1
-
-            except Error as e:
-                logger.error(f"Error processing staff {staff_name_full} (ID: {staff_id}): {e}")
-                error_count += 1
-                continue
-
-        connection.commit()
+            with stage('phase.item', staff_id=staff_id) as item_span:
+                try:
+                    # Check if staff already exists in MySQL
+                    cursor.execute("SELECT id FROM app_users WHERE id = %s", (staff_id,))
+                    existing_staff = cursor.fetchone()
+
+                    if existing_staff:
+                        # Skip existing records - do not update
+                        logger.debug(f"⏭️  Skipping existing staff: {staff_name_full} (ID: {staff_id})")
+                        skipped_count += 1
+                        item_span.set_attribute('outcome', 'skipped')
+                    else:
+                        # Insert new staff only
+                        import uuid
+                        email = f"{uuid.uuid4()}@{uuid.uuid4()}.com"
+                        password = str(uuid.uuid4())
+
+                        insert_query = """
+                        INSERT INTO app_users
+                        (id, first_name, last_name, email_address, password, active_flag, salesman_flag, sap_import_flag)
+                        VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                        """
+                        cursor.execute(insert_query, (
+                            staff_id, first_name, last_name, email, password,
+                            1, 1, 1  # active_flag=1, salesman_flag=1, sap_import_flag=1
+                        ))
+
+                        staff_inserted.append(f"---> Inserted ... {staff_name_full} id: {staff_id}")
+                        logger.info(f"➕ Inserted new staff: {staff_name_full} (ID: {staff_id})")
+                        success_count += 1
+                        item_span.set_attribute('outcome', 'inserted')
+
+                except Error as e:
+                    logger.error(f"Error processing staff {staff_name_full} (ID: {staff_id}): {e}")
+                    error_count += 1
+                    item_span.set_attribute('outcome', 'error')
+                    continue
+
+        with stage('phase.commit'):
+            connection.commit()
 
         # Log summary
         logger.info("=" * 60)
@@ -188,15 +173,19 @@ def sync_staff():
             logger.info(insert)
         logger.info("=" * 60)
         logger.info(f"🎯 Sync completed: {success_count} new records created, {skipped_count} existing records left unchanged, {error_count} errors")
+        result.update({'success': success_count, 'errors': error_count, 'skipped': skipped_count})
 
     except Error as e:
         logger.error(f"Error during staff sync: {e}")
         connection.rollback()
+        result['aborted'] = str(e)
     finally:
         if connection.is_connected():
             cursor.close()
             connection.close()
 
+    return result
+
 def sync_single_staff(staff_id):
     """
     Sync a single staff member by ID (for testing)
@@ -268,13 +257,32 @@ def sync_single_staff(staff_id):
             cursor.close()
             connection.close()
 
-if __name__ == "__main__":
+def main(argv=None):
+    """
+    Command line entry point
+    Usage: staff_sync.py [--daemon | STAFF_ID]
+    """
     import sys
+    argv = sys.argv[1:] if argv is None else argv
+    # JSON lines to staff_sync.log and the job output, written off-thread
+    setup_logging('staff_sync')
 
-    if len(sys.argv) > 1:
+    if is_daemon_mode(argv):
+        # Long-running mode - loop internally with warm connections
+        return run_daemon('staff_sync', sync_staff, int(os.getenv('STAFF_SYNC_INTERVAL', 7200)),
+                          os.getenv('STAFF_SYNC_QUIET_WINDOWS', os.getenv('SYNC_QUIET_WINDOWS', '')))
+
+    if argv:
         # Test mode with specific staff ID
-        staff_id = sys.argv[1]
+        staff_id = argv[0]
         sync_single_staff(staff_id)
-    else:
-        # Full sync
-        sync_staff()
\ No newline at end of file
+        return 0
+
+    # Full sync
+    result = sync_staff()
+    emit_status('run_complete', job='staff_sync', result=result)
+    return 0
+
+if __name__ == "__main__":
+    import sys
+    sys.exit(main())
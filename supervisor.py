@@ -0,0 +1,231 @@
+"""
+Job Supervisor
+One asyncio event loop that runs every job schedule and reads every job's output
+
+JobManager hands coroutines to the loop from any thread. Scheduled runs sit on a
+single timer heap, so the loop sleeps until the next one is due instead of
+polling, and child output is read without a blocked thread per job - the
+number of threads no longer grows with the number of jobs.
+"""
+
+import os
+import sys
+import heapq
+import signal
+import asyncio
+import logging
+import warnings
+import itertools
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Longest output line read in one piece (iteration_end status lines can be large)
+STREAM_LIMIT = 1024 * 1024
+
+def _use_pidfd_child_watcher(loop):
+    """
+    Wait for children with pidfds on the loop instead of a waitpid thread per child
+    Python 3.12+ does this by itself; 3.11 defaults to a thread per child
+    """
+    if sys.version_info >= (3, 12) or not hasattr(asyncio, 'PidfdChildWatcher'):
+        return
+    try:
+        os.close(os.pidfd_open(os.getpid()))
+    except (AttributeError, OSError):
+        return
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', DeprecationWarning)
+        watcher = asyncio.PidfdChildWatcher()
+        watcher.attach_loop(loop)
+        asyncio.get_event_loop_policy().set_child_watcher(watcher)
+
+class SupervisedProcess:
+    """
+    A job process as seen from the event loop: pid, stdout StreamReader, wait/terminate/kill
+    """
+    def __init__(self, process):
+        self._process = process
+        self.pid = process.pid
+        self.stdout = process.stdout
+
+    @property
+    def returncode(self):
+        return self._process.returncode
+
+    async def wait(self):
+        return await self._process.wait()
+
+    def poll(self):
+        return self._process.returncode
+
+    def terminate(self):
+        if self._process.returncode is None:
+            self._process.terminate()
+
+    def kill(self):
+        if self._process.returncode is None:
+            self._process.kill()
+
+class SupervisedWarmRun(SupervisedProcess):
+    """
+    A warm-pool run (see warm_worker_pool.WarmRun) read through the event loop
+    """
+    def __init__(self, warm_run, stdout, status):
+        self._process = warm_run
+        self.pid = warm_run.pid
+        self.stdout = stdout
+        self._status = status
+
+    async def wait(self):
+        if self._process.returncode is None:
+            # The fork server writes the worker's exit code on the status pipe
+            line = await self._status.readline()
+            self._process.returncode = int(line) if line.strip() else -signal.SIGKILL
+        return self._process.returncode
+
+async def _read_pipe(pipe):
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader(limit=STREAM_LIMIT)
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), pipe)
+    return reader
+
+async def start_subprocess(command, env=None):
+    """Start a job command with stdout and stderr merged into one stream"""
+    process = await asyncio.create_subprocess_exec(
+        *command,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.STDOUT,
+        env=env,
+        limit=STREAM_LIMIT
+    )
+    return SupervisedProcess(process)
+
+async def attach_warm_run(warm_run):
+    """Read a dispatched warm-pool run's output and exit code through the event loop"""
+    stdout = await _read_pipe(warm_run.stdout)
+    status = await _read_pipe(warm_run._status)
+    return SupervisedWarmRun(warm_run, stdout, status)
+
+async def read_lines(stream):
+    """
+    Yield decoded output lines until EOF
+    A line longer than STREAM_LIMIT comes through in STREAM_LIMIT-sized pieces
+    """
+    while True:
+        try:
+            line = await stream.readuntil(b'\n')
+        except asyncio.IncompleteReadError as e:
+            # Last line without a newline
+            line = e.partial
+        except asyncio.LimitOverrunError as e:
+            line = await stream.read(e.consumed)
+        if not line:
+            return
+        yield line.decode('utf-8', errors='replace')
+
+class JobSupervisor:
+    """
+    Event loop thread with a timer heap of due job runs
+    """
+    def __init__(self):
+        self._loop = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._timers = []        # heap of (due loop time, sequence, key, coroutine factory)
+        self._timer_keys = {}    # key -> sequence of its live heap entry
+        self._sequence = itertools.count()
+        self._wakeup = None
+        self._tasks = set()
+
+    def start(self):
+        """Start the loop thread (once per process - a forked child starts its own)"""
+        with self._lock:
+            if self._thread is not None and self._pid == os.getpid() and self._thread.is_alive():
+                return
+
+            self._timers, self._timer_keys, self._tasks = [], {}, set()
+            self._loop = asyncio.new_event_loop()
+            _use_pidfd_child_watcher(self._loop)
+            ready = threading.Event()
+            self._thread = threading.Thread(target=self._run, args=(ready,), name='job-supervisor', daemon=True)
+            self._pid = os.getpid()
+            self._thread.start()
+            ready.wait()
+
+    def _run(self, ready):
+        asyncio.set_event_loop(self._loop)
+        self._wakeup = asyncio.Event()
+        self._loop.create_task(self._timer_loop())
+        self._loop.call_soon(ready.set)
+        self._loop.run_forever()
+
+    def in_loop(self):
+        """True when called from the supervisor's own thread"""
+        return self._thread is not None and threading.current_thread() is self._thread
+
+    def submit(self, coroutine):
+        """Run a coroutine on the loop from another thread; returns a concurrent Future"""
+        self.start()
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop)
+
+    def run(self, coroutine, timeout=None):
+        """Run a coroutine on the loop and wait for its result (not callable from the loop itself)"""
+        if self.in_loop():
+            coroutine.close()
+            raise RuntimeError("JobSupervisor.run called from the supervisor loop - await the coroutine instead")
+        return self.submit(coroutine).result(timeout)
+
+    def spawn(self, coroutine):
+        """Start a background task on the loop (from the loop thread)"""
+        task = self._loop.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._task_done)
+        return task
+
+    def _task_done(self, task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            logger.error(f"Supervisor task failed: {task.exception()!r}")
+
+    def schedule(self, key, delay_seconds, coroutine_factory):
+        """
+        (Re)schedule coroutine_factory() to run after delay_seconds, replacing any pending timer for key
+        Thread-safe
+        """
+        self.start()
+        self._loop.call_soon_threadsafe(self._push_timer, key, max(0.0, delay_seconds), coroutine_factory)
+
+    def cancel(self, key):
+        """Drop the pending timer for key, if any (thread-safe)"""
+        if self._loop is not None and self._pid == os.getpid():
+            self._loop.call_soon_threadsafe(self._timer_keys.pop, key, None)
+
+    def _push_timer(self, key, delay_seconds, coroutine_factory):
+        sequence = next(self._sequence)
+        heapq.heappush(self._timers, (self._loop.time() + delay_seconds, sequence, key, coroutine_factory))
+        self._timer_keys[key] = sequence
+        self._wakeup.set()
+
+    async def _timer_loop(self):
+        while True:
+            now = self._loop.time()
+            while self._timers and self._timers[0][0] <= now:
+                _, sequence, key, coroutine_factory = heapq.heappop(self._timers)
+                if self._timer_keys.get(key) != sequence:
+                    # Cancelled or replaced by a later schedule() call
+                    continue
+                del self._timer_keys[key]
+                self.spawn(coroutine_factory())
+
+            timeout = self._timers[0][0] - now if self._timers else None
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def stats(self):
+        """Pending timers and running tasks, for the dashboard"""
+        return {'timers': len(self._timer_keys), 'tasks': len(self._tasks)}
@@ -0,0 +1,248 @@
+"""
+Sync Logging
+Non-blocking JSON-lines logging for the sync scripts, and a tail reader for their log files
+
+Records go through a QueueHandler so the sync loop never waits on file or
+pipe I/O; a QueueListener thread formats each record once as a JSON line and
+writes it to a rotating <job>.log file and to the output stream JobManager reads.
+
+Only a job's own processes open <job>.log - its entry point (main) sets logging
+up, not the import of its module, so the web app importing a job module does
+not write to or rotate the job's file. The processes of one job (pool workers,
+a manual run next to the daemon) still share the file, so rotation is done
+under a lock on <job>.log.lock and a writer whose file was rotated away by
+another process reopens the current one.
+"""
+
+import os
+import json
+import queue
+import fcntl
+import atexit
+import logging
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from datetime import datetime, timezone, timedelta
+
+AEST = timezone(timedelta(hours=10))
+
+# Attributes every LogRecord has - anything else was passed with extra={...}
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+_listener = None
+_listener_pid = None
+_log_name = None
+_level = logging.INFO
+_hooks_registered = False
+
+class JsonFormatter(logging.Formatter):
+    """
+    One JSON object per record: timestamp (AEST), level, logger, message and any extra fields
+    """
+    def format(self, record):
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created, AEST).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage()
+        }
+        if record.exc_info:
+            entry['message'] += '\n' + self.formatException(record.exc_info)
+        fields = {key: value for key, value in vars(record).items() if key not in _RECORD_ATTRIBUTES}
+        if fields:
+            entry['fields'] = fields
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+class SharedRotatingFileHandler(RotatingFileHandler):
+    """
+    RotatingFileHandler for a file that several processes append to
+    Each write holds an flock on <file>.lock; under it the handler reopens the file if
+    another process rotated it, rolls it over if it is full, then writes
+    """
+    def __init__(self, filename, **kwargs):
+        super().__init__(filename, delay=True, **kwargs)
+        self.lock_path = self.baseFilename + '.lock'
+        self._lock_file = None
+
+    def emit(self, record):
+        try:
+            if self._lock_file is None:
+                self._lock_file = open(self.lock_path, 'a')
+            fcntl.flock(self._lock_file, fcntl.LOCK_EX)
+            try:
+                self._reopen_if_rotated()
+                if self.shouldRollover(record):
+                    self.doRollover()
+                logging.FileHandler.emit(self, record)
+            finally:
+                fcntl.flock(self._lock_file, fcntl.LOCK_UN)
+        except Exception:
+            self.handleError(record)
+
+    def _reopen_if_rotated(self):
+        """Drop the open stream if the path now names a different file (rotated by another process)"""
+        if self.stream is None:
+            return
+        try:
+            current = os.stat(self.baseFilename).st_ino
+        except FileNotFoundError:
+            current = None
+        if current != os.fstat(self.stream.fileno()).st_ino:
+            self.stream.close()
+            self.stream = None
+
+    def close(self):
+        super().close()
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
+
+def setup_logging(log_name, level=logging.INFO):
+    """
+    Route the root logger through a queue to a rotating <log_name>.log and stderr, as JSON lines
+    Called from a job's entry point, never at module import; safe to call again (e.g. in a
+    forked warm-pool worker) - the previous setup is replaced
+    """
+    global _listener, _listener_pid, _log_name, _level, _hooks_registered
+
+    # A listener inherited over fork has no thread in this process - just drop it
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+    _listener = None
+
+    root = logging.getLogger()
+    for handler in list(root.handlers):
+        root.removeHandler(handler)
+
+    formatter = JsonFormatter()
+    file_handler = SharedRotatingFileHandler(
+        f'{log_name}.log',
+        maxBytes=int(os.getenv('LOG_MAX_BYTES', 10 * 1024 * 1024)),
+        backupCount=int(os.getenv('LOG_BACKUP_COUNT', 5)),
+        encoding='utf-8'
+    )
+    stream_handler = logging.StreamHandler()
+    for handler in (file_handler, stream_handler):
+        handler.setFormatter(formatter)
+
+    log_queue = queue.SimpleQueue()
+    root.addHandler(QueueHandler(log_queue))
+    root.setLevel(level)
+
+    _listener = QueueListener(log_queue, file_handler, stream_handler)
+    _listener.start()
+    _listener_pid = os.getpid()
+    _log_name, _level = log_name, level
+
+    if not _hooks_registered:
+        atexit.register(shutdown_logging)
+        # A forked child (gunicorn --preload workers) inherits the queue but not the listener thread
+        os.register_at_fork(after_in_child=_restart_after_fork)
+        _hooks_registered = True
+
+def _restart_after_fork():
+    if _listener is not None and _listener_pid != os.getpid():
+        setup_logging(_log_name, _level)
+
+def flush_logging():
+    """
+    Write out every queued record now (for processes that exit without running atexit)
+    """
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        _listener.start()
+
+def shutdown_logging():
+    """Drain the queue and stop the listener thread"""
+    global _listener
+    if _listener is not None and _listener_pid == os.getpid():
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    _listener = None
+
+def parse_log_line(line):
+    """
+    Parse a JSON log line written by JsonFormatter
+    Returns a log entry dict (timestamp, level, message, fields), or None for other output
+    """
+    if not line.startswith('{'):
+        return None
+    try:
+        entry = json.loads(line)
+    except ValueError:
+        return None
+    if not isinstance(entry, dict) or 'level' not in entry or 'message' not in entry:
+        return None
+    return entry
+
+def _log_generations(path):
+    """The log file and its rotated backups (path, path.1, path.2, ...), newest first"""
+    generations = [path] if os.path.exists(path) else []
+    index = 1
+    while os.path.exists(f"{path}.{index}"):
+        generations.append(f"{path}.{index}")
+        index += 1
+    return generations
+
+def _lines_before(f, end, wanted, chunk_size):
+    """
+    Read backward from byte offset end until wanted complete lines are found
+    Returns (lines, offset of the first returned line)
+    """
+    position = end
+    data = b''
+    while position > 0 and data.count(b'\n') <= wanted:
+        step = min(chunk_size, position)
+        position -= step
+        f.seek(position)
+        data = f.read(step) + data
+
+    trailing_newline = data.endswith(b'\n')
+    lines = (data[:-1] if trailing_newline else data).split(b'\n') if data else []
+    if position > 0 and lines:
+        # The first chunk started mid-line
+        lines = lines[1:]
+    lines = lines[-wanted:] if wanted else []
+    start = end - len(b'\n'.join(lines)) - (1 if trailing_newline and lines else 0)
+    return lines, start
+
+def read_log_tail(path, lines=100, before=None, chunk_size=8192):
+    """
+    Last lines of a log file, reading backward from the end instead of the whole file
+    Continues into rotated backups (path.1, path.2, ...) when the current file is short.
+    Pass the returned cursor as before to page further back; cursors name the file by
+    inode, so they stay valid when the log rotates in between.
+    Returns {'lines': [...] oldest first, 'cursor': str or None when nothing older remains}
+    """
+    generations = _log_generations(path)
+    index, end = 0, None
+    if before:
+        inode, _, offset = str(before).partition(':')
+        for position, candidate in enumerate(generations):
+            if str(os.stat(candidate).st_ino) == inode:
+                index, end = position, int(offset)
+                break
+        else:
+            # That file has rotated out of retention
+            return {'lines': [], 'cursor': None}
+
+    collected = []
+    cursor = None
+    while index < len(generations) and len(collected) < lines:
+        with open(generations[index], 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            end = size if end is None else min(end, size)
+            found, start = _lines_before(f, end, lines - len(collected), chunk_size)
+            inode = os.fstat(f.fileno()).st_ino
+        collected = found + collected
+        cursor = f"{inode}:{start}" if start > 0 else None
+        if start > 0:
+            break
+        index, end = index + 1, None
+
+    if cursor is None and index < len(generations):
+        # Stopped exactly at the start of a file that still has older backups
+        older = os.stat(generations[index])
+        cursor = f"{older.st_ino}:{older.st_size}"
+
+    return {'lines': [line.decode('utf-8', errors='replace') for line in collected], 'cursor': cursor}
@@ -0,0 +1,422 @@
+"""
+Sync Runtime Utilities
+Shared connection handling and long-running daemon loop for the sync scripts
+"""
+
+import os
+import sys
+import json
+import time
+import signal
+import logging
+import resource
+import functools
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+import requests
+import mysql.connector
+from mysql.connector import pooling
+from dotenv import load_dotenv
+from metrics import DEFAULT_BUCKETS
+from tracing import span, start_run_trace, end_run_trace, NOOP_SPAN
+from profiling import profile_run
+from job_schedule import QuietWindows
+from sap_budget import acquire_sap_slot, current_consumer, set_default_consumer
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AEST = timezone(timedelta(hours=10))
+
+# Prefix for structured status lines read by JobManager from the job's stdout
+STATUS_PREFIX = 'SYNC_STATUS '
+
+_warm_connections = False
+_connection_pool = None
+_http_session = None
+
+class StageTimer:
+    """
+    Collects durations per named stage (SAP query, MySQL connect/statement, job phase)
+    """
+    def __init__(self):
+        self._samples = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, seconds):
+        with self._lock:
+            self._samples.setdefault(name, []).append(seconds)
+
+    def export(self):
+        """Raw samples, for merging timings from worker processes"""
+        with self._lock:
+            return {name: list(samples) for name, samples in self._samples.items()}
+
+    def merge(self, samples):
+        with self._lock:
+            for name, durations in (samples or {}).items():
+                self._samples.setdefault(name, []).extend(durations)
+
+    def histograms(self, buckets=DEFAULT_BUCKETS):
+        """Per-stage bucket counts (last entry is +Inf) for the metrics histograms"""
+        histograms = {}
+        for name, durations in self.export().items():
+            counts = [0] * (len(buckets) + 1)
+            for duration in durations:
+                counts[next((i for i, bound in enumerate(buckets) if duration <= bound), len(buckets))] += 1
+            histograms[name] = {'counts': counts, 'sum': round(sum(durations), 6)}
+        return {'buckets': list(buckets), 'stages': histograms}
+
+    def summary(self):
+        """Per-stage count, total and p50/p95/max, slowest total first"""
+        def percentile(ordered, fraction):
+            return ordered[min(len(ordered) - 1, max(0, int(round(fraction * len(ordered))) - 1))]
+
+        summary = {}
+        for name, durations in self.export().items():
+            ordered = sorted(durations)
+            summary[name] = {
+                'count': len(ordered),
+                'total_s': round(sum(ordered), 4),
+                'p50_ms': round(percentile(ordered, 0.50) * 1000, 2),
+                'p95_ms': round(percentile(ordered, 0.95) * 1000, 2),
+                'max_ms': round(ordered[-1] * 1000, 2)
+            }
+        return dict(sorted(summary.items(), key=lambda entry: entry[1]['total_s'], reverse=True))
+
+# Stage timing is only switched on inside sync runs, so long-lived processes
+# like the web app don't accumulate samples from their own MySQL use
+_stage_timer = None
+
+def reset_stage_timings():
+    """
+    Start collecting stage timings for a new run (discarding the previous run's)
+    """
+    global _stage_timer
+    _stage_timer = StageTimer()
+    return _stage_timer
+
+def get_stage_timer():
+    """Current run's stage timer, or None when timing is off"""
+    return _stage_timer
+
+@contextmanager
+def stage(name, **attributes):
+    """
+    Time a block as the named stage of the current run, traced as a span with the given attributes
+    Yields the span so callers can add attributes (row counts, outcome) once they are known
+    """
+    timer = _stage_timer
+    if timer is None:
+        yield NOOP_SPAN
+        return
+    started = time.perf_counter()
+    try:
+        with span(name, **attributes) as current:
+            yield current
+    finally:
+        timer.record(name, time.perf_counter() - started)
+
+def log_stage_summary(summary):
+    """
+    Log a run's stage timing summary, slowest stage first
+    """
+    if not summary:
+        return
+    logger.info("⏱️ Stage timings:")
+    for name, stats in summary.items():
+        logger.info(f"   {name}: {stats['count']} call(s), total {stats['total_s']:.3f}s, "
+                    f"p50 {stats['p50_ms']:.1f}ms, p95 {stats['p95_ms']:.1f}ms, max {stats['max_ms']:.1f}ms")
+
+def timed_run(job_name):
+    """
+    Decorator factory for a sync run function - collects stage timings and a trace for
+    the run (and a cProfile profile when one was requested), logs the timing summary and adds
+    it to the run's result dict under 'timings' (and the trace id under 'trace_id')
+    """
+    def decorator(run_function):
+        @functools.wraps(run_function)
+        def wrapper(*args, **kwargs):
+            timer = reset_stage_timings()
+            set_default_consumer(job_name)
+            tracer = start_run_trace(job_name)
+            result = None
+            profile_path = None
+            try:
+                with profile_run(job_name) as profile_path:
+                    with stage('run.total', job=job_name) as run_span:
+                        result = run_function(*args, **kwargs)
+                        if isinstance(result, dict):
+                            for key in ('processed', 'updated', 'errors', 'not_found'):
+                                if key in result:
+                                    run_span.set_attribute(key, result[key])
+                return result
+            finally:
+                end_run_trace()
+                if profile_path:
+                    emit_status('profile_written', job=job_name, path=profile_path)
+                summary = timer.summary()
+                log_stage_summary(summary)
+                emit_status('stage_histograms', histograms=timer.histograms())
+                if isinstance(result, dict):
+                    result['timings'] = summary
+                    # Peak resident set size of this process so far, in KB (Linux ru_maxrss units)
+                    result['peak_rss_kb'] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+                    if tracer is not None:
+                        result['trace_id'] = tracer.trace_id
+        return wrapper
+    return decorator
+
+def _statement_stage(statement):
+    """Stage name for a SQL statement, by its leading keyword (mysql.select, mysql.update, ...)"""
+    words = str(statement).split(None, 1)
+    return f"mysql.{words[0].lower()}" if words else 'mysql.execute'
+
+def _statement_text(statement):
+    """Whitespace-collapsed statement text for span attributes (parameters are never included)"""
+    return ' '.join(str(statement).split())[:200]
+
+class TimedCursor:
+    """
+    Cursor proxy that times every execute as a mysql.<statement> stage
+    """
+    def __init__(self, cursor):
+        self._cursor = cursor
+
+    def execute(self, operation, params=None, *args, **kwargs):
+        with stage(_statement_stage(operation), statement=_statement_text(operation)) as current:
+            result = self._cursor.execute(operation, params, *args, **kwargs)
+            current.set_attribute('rows', self._cursor.rowcount)
+            return result
+
+    def executemany(self, operation, seq_params, *args, **kwargs):
+        with stage(_statement_stage(operation), statement=_statement_text(operation)) as current:
+            result = self._cursor.executemany(operation, seq_params, *args, **kwargs)
+            current.set_attribute('rows', self._cursor.rowcount)
+            return result
+
+    def __iter__(self):
+        return iter(self._cursor)
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+class TimedConnection:
+    """
+    Connection proxy whose cursors time their statements, and whose commits are timed
+    """
+    def __init__(self, connection):
+        object.__setattr__(self, '_connection', connection)
+
+    def cursor(self, *args, **kwargs):
+        return TimedCursor(self._connection.cursor(*args, **kwargs))
+
+    def commit(self):
+        with stage('mysql.commit'):
+            return self._connection.commit()
+
+    def __getattr__(self, name):
+        return getattr(self._connection, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._connection, name, value)
+
+def enable_warm_connections():
+    """
+    Keep MySQL connections pooled and the HTTP session open between calls
+    Used by daemon mode so iterations don't pay connection setup again
+    """
+    global _warm_connections
+    _warm_connections = True
+
+def _get_connection_pool():
+    """
+    Get (or lazily create) the process-wide MySQL connection pool
+    """
+    global _connection_pool
+    if _connection_pool is None:
+        _connection_pool = pooling.MySQLConnectionPool(
+            pool_name=f"d1sapsync_{os.getpid()}",
+            pool_size=int(os.getenv('MYSQL_POOL_SIZE', 5)),
+            pool_reset_session=True,
+            host=os.getenv('MYSQL_HOST'),
+            database=os.getenv('MYSQL_DATABASE'),
+            user=os.getenv('MYSQL_USER'),
+            password=os.getenv('MYSQL_PASSWORD')
+        )
+    return _connection_pool
+
+def connect_mysql():
+    """
+    Open a MySQL connection, taking it from the pool when warm connections are enabled
+    Raises mysql.connector.Error on failure
+    """
+    if _stage_timer is None:
+        return _open_mysql_connection()
+
+    with stage('mysql.connect'):
+        connection = _open_mysql_connection()
+    return TimedConnection(connection)
+
+def _open_mysql_connection():
+    if _warm_connections:
+        try:
+            return _get_connection_pool().get_connection()
+        except pooling.PoolError as e:
+            # Pool exhausted - fall back to a one-off connection
+            logger.debug(f"MySQL pool unavailable ({e}), opening direct connection")
+
+    return mysql.connector.connect(
+        host=os.getenv('MYSQL_HOST'),
+        database=os.getenv('MYSQL_DATABASE'),
+        user=os.getenv('MYSQL_USER'),
+        password=os.getenv('MYSQL_PASSWORD')
+    )
+
+def _proxy_query_text(request_kwargs):
+    """SQL text of a proxy request (sent as json= or as a JSON data= body), for span attributes"""
+    body = request_kwargs.get('json')
+    if body is None:
+        try:
+            body = json.loads(request_kwargs.get('data') or '{}')
+        except (TypeError, ValueError):
+            body = {}
+    query = body.get('query', '') if isinstance(body, dict) else ''
+    return ' '.join(str(query).split())[:200]
+
+def sql_literal(value):
+    """
+    Quote a value as a SAP (SQL Server) string literal for a query sent through the proxy
+    """
+    return "'" + str(value).replace("'", "''") + "'"
+
+def sap_post(url, **kwargs):
+    """
+    POST to the SAP SQL proxy, reusing a keep-alive session when warm connections are enabled
+    Every call first takes a slot from the host-wide SAP request budget (see sap_budget.py)
+    """
+    global _http_session
+    consumer, priority = current_consumer()
+    with stage('sap.wait', consumer=consumer, priority=priority):
+        slot = acquire_sap_slot()
+
+    try:
+        with stage('sap.query', query=_proxy_query_text(kwargs)) as current:
+            if not _warm_connections:
+                response = requests.post(url, **kwargs)
+            else:
+                if _http_session is None:
+                    _http_session = requests.Session()
+                response = _http_session.post(url, **kwargs)
+            current.set_attribute('http_status', response.status_code)
+            current.set_attribute('response_bytes', len(response.content))
+            return response
+    finally:
+        slot.release()
+
+def emit_status(event, **fields):
+    """
+    Write a structured status line to stdout for JobManager
+    """
+    payload = {
+        'event': event,
+        'timestamp': datetime.now(AEST).isoformat(),
+        'pid': os.getpid()
+    }
+    payload.update(fields)
+    # One write per line - the logging listener thread shares this pipe, and print()
+    # writes the newline separately, which lets a log line land in between
+    sys.stdout.write(STATUS_PREFIX + json.dumps(payload, default=str) + '\n')
+    sys.stdout.flush()
+
+def parse_status_line(line):
+    """
+    Parse a structured status line written by emit_status
+    Returns the payload dict, or None if the line is ordinary output
+    """
+    if not line.startswith(STATUS_PREFIX):
+        return None
+    try:
+        payload = json.loads(line[len(STATUS_PREFIX):])
+    except ValueError:
+        return None
+    return payload if isinstance(payload, dict) else None
+
+def run_daemon(job_name, run_once, interval_seconds, quiet_windows=''):
+    """
+    Run a sync function repeatedly in this process until SIGTERM/SIGINT
+    Connections stay warm between iterations and each iteration reports its status.
+    No iteration starts inside quiet_windows (e.g. '23:30-01:00'); one due there waits for the window to end.
+    """
+    enable_warm_connections()
+    stop_event = threading.Event()
+    quiet_windows = QuietWindows(quiet_windows)
+
+    def request_stop(signum, frame):
+        logger.info(f"🛑 Received signal {signum} - stopping after current iteration")
+        stop_event.set()
+
+    signal.signal(signal.SIGTERM, request_stop)
+    signal.signal(signal.SIGINT, request_stop)
+
+    logger.info(f"🔁 Starting {job_name} in daemon mode (interval: {interval_seconds}s"
+                + (f", quiet {quiet_windows})" if quiet_windows else ")"))
+    emit_status('daemon_start', job=job_name, interval=interval_seconds)
+
+    iteration = 0
+    while not stop_event.is_set():
+        now = datetime.now()
+        resume_at = quiet_windows.defer(now)
+        if resume_at > now:
+            logger.info(f"🌙 {job_name} is in a quiet window ({quiet_windows}) - next iteration at "
+                        f"{resume_at.isoformat(timespec='seconds')}")
+            emit_status('quiet_window', job=job_name,
+                        next_run_time=resume_at.astimezone(AEST).isoformat())
+            stop_event.wait((resume_at - now).total_seconds())
+            continue
+
+        iteration += 1
+        started = time.time()
+        emit_status('iteration_start', job=job_name, iteration=iteration)
+
+        status = 'success'
+        error = None
+        result = None
+        try:
+            result = run_once()
+            if isinstance(result, dict) and result.get('aborted'):
+                status = 'error'
+                error = result['aborted']
+        except Exception as e:
+            status = 'error'
+            error = str(e)
+            logger.exception(f"❌ {job_name} iteration {iteration} failed: {e}")
+
+        duration = time.time() - started
+        next_run = quiet_windows.defer(datetime.fromtimestamp(started + interval_seconds)).timestamp()
+        emit_status(
+            'iteration_end',
+            job=job_name,
+            iteration=iteration,
+            status=status,
+            error=error,
+            duration_seconds=round(duration, 3),
+            result=result if isinstance(result, dict) else None,
+            next_run_time=datetime.fromtimestamp(next_run, AEST).isoformat()
+        )
+
+        stop_event.wait(max(0.0, next_run - time.time()))
+
+    emit_status('daemon_stop', job=job_name, iterations=iteration)
+    logger.info(f"👋 {job_name} daemon stopped after {iteration} iteration(s)")
+    return 0
+
+def is_daemon_mode(argv=None):
+    """
+    Check whether --daemon was passed on the command line
+    """
+    argv = sys.argv[1:] if argv is None else argv
+    return '--daemon' in argv
@@ -0,0 +1,255 @@
+"""
+Sync State Utilities
+Small persisted key/value state (cursors, checkpoints) shared by the sync jobs
+"""
+
+import os
+import json
+import uuid
+import socket
+import logging
+from datetime import datetime
+from mysql.connector import Error
+from rolling_update_utils import get_mysql_connection
+from sync_runtime import AEST, emit_status
+
+logger = logging.getLogger(__name__)
+
+SYNC_STATE_TABLE = 'sync_state'
+
+_table_ready = False
+
+def ensure_sync_state_table():
+    """
+    Ensure the sync_state table exists
+    Auto-creates it on first use
+    """
+    global _table_ready
+    if _table_ready:
+        return True
+
+    connection = get_mysql_connection()
+    if not connection:
+        logger.error("Cannot validate sync state table - no database connection")
+        return False
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            CREATE TABLE IF NOT EXISTS {SYNC_STATE_TABLE} (
+                job_name VARCHAR(64) NOT NULL,
+                state_key VARCHAR(64) NOT NULL,
+                state_value TEXT NULL,
+                updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+                PRIMARY KEY (job_name, state_key)
+            )
+        """)
+        connection.commit()
+        _table_ready = True
+        return True
+
+    except Error as e:
+        logger.error(f"❌ Sync state table validation failed: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def get_sync_state(job_name, state_key, default=None):
+    """
+    Get a persisted state value for a job
+    Returns default if the key is missing or unreadable
+    """
+    if not ensure_sync_state_table():
+        return default
+
+    connection = get_mysql_connection()
+    if not connection:
+        return default
+
+    try:
+        cursor = connection.cursor(dictionary=True)
+        cursor.execute(
+            f"SELECT state_value FROM {SYNC_STATE_TABLE} WHERE job_name = %s AND state_key = %s",
+            (job_name, state_key)
+        )
+        row = cursor.fetchone()
+        if not row or row['state_value'] is None:
+            return default
+        return json.loads(row['state_value'])
+
+    except (Error, ValueError) as e:
+        logger.error(f"Error reading sync state {job_name}/{state_key}: {e}")
+        return default
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def set_sync_state(job_name, state_key, value):
+    """
+    Persist a state value for a job (JSON encoded)
+    """
+    if not ensure_sync_state_table():
+        return False
+
+    connection = get_mysql_connection()
+    if not connection:
+        return False
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            INSERT INTO {SYNC_STATE_TABLE} (job_name, state_key, state_value)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE state_value = VALUES(state_value)
+        """, (job_name, state_key, json.dumps(value, default=str)))
+        connection.commit()
+        return True
+
+    except Error as e:
+        logger.error(f"Error saving sync state {job_name}/{state_key}: {e}")
+        return False
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def lock_sync_state(cursor, job_name, state_key, default=None):
+    """
+    Read a state value inside the caller's transaction, locking its row until the caller commits
+    Lets concurrent workers advance a shared value (e.g. a cursor) strictly one after another
+    """
+    if not ensure_sync_state_table():
+        raise Error(msg="sync state table unavailable")
+
+    cursor.execute(f"""
+        INSERT IGNORE INTO {SYNC_STATE_TABLE} (job_name, state_key, state_value)
+        VALUES (%s, %s, NULL)
+    """, (job_name, state_key))
+    cursor.execute(
+        f"SELECT state_value FROM {SYNC_STATE_TABLE} WHERE job_name = %s AND state_key = %s FOR UPDATE",
+        (job_name, state_key)
+    )
+    row = cursor.fetchone()
+    value = row['state_value'] if isinstance(row, dict) else (row[0] if row else None)
+    if value is None:
+        return default
+    try:
+        return json.loads(value)
+    except ValueError:
+        logger.error(f"Unreadable sync state {job_name}/{state_key} - starting from the default")
+        return default
+
+def store_sync_state(cursor, job_name, state_key, value):
+    """
+    Write a state value inside the caller's transaction (the row locked by lock_sync_state)
+    """
+    cursor.execute(
+        f"UPDATE {SYNC_STATE_TABLE} SET state_value = %s WHERE job_name = %s AND state_key = %s",
+        (json.dumps(value, default=str), job_name, state_key)
+    )
+
+def prune_sync_state(job_name, key_prefix, older_than_seconds):
+    """
+    Delete a job's state values under key_prefix that were last written more than older_than_seconds ago
+    """
+    if not ensure_sync_state_table():
+        return 0
+
+    connection = get_mysql_connection()
+    if not connection:
+        return 0
+
+    try:
+        cursor = connection.cursor()
+        cursor.execute(f"""
+            DELETE FROM {SYNC_STATE_TABLE}
+            WHERE job_name = %s AND state_key LIKE %s
+              AND updated_at < NOW() - INTERVAL %s SECOND
+        """, (job_name, key_prefix.replace('%', r'\%').replace('_', r'\_') + '%', int(older_than_seconds)))
+        connection.commit()
+        return cursor.rowcount
+
+    except Error as e:
+        logger.error(f"Error pruning sync state {job_name}/{key_prefix}*: {e}")
+        return 0
+    finally:
+        if connection and connection.is_connected():
+            cursor.close()
+            connection.close()
+
+def checkpoint_interval():
+    """
+    Number of committed items between checkpoint saves
+    """
+    return max(1, int(os.getenv('SYNC_CHECKPOINT_EVERY', 10)))
+
+def checkpoint_owner_alive(checkpoint):
+    """
+    Check whether the process that wrote a 'running' checkpoint is still running
+    Only a process on this host can be checked; one recorded on another host (or before
+    owners were recorded) counts as gone, and so does this very process (an earlier
+    daemon iteration that died part-way)
+    """
+    pid = checkpoint.get('pid')
+    if not pid or checkpoint.get('host') != socket.gethostname() or pid == os.getpid():
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+class RunCheckpoint:
+    """
+    Progress record for one sync run, saved after every committed sub-batch
+    A checkpoint still marked 'running' at the start of the next run means the
+    previous run was interrupted and its progress can be resumed - unless the
+    process that owns it is still alive, in which case it is a concurrent run
+    (e.g. a manual run next to the daemon) and is left alone
+    """
+    def __init__(self, job_name, state_key='checkpoint'):
+        self.job_name = job_name
+        self.state_key = state_key
+        self.enabled = True
+        self.resumed_from = None
+
+        previous = get_sync_state(job_name, state_key, None) or {}
+        if previous.get('status') == 'running':
+            if checkpoint_owner_alive(previous):
+                # Saving would overwrite the live run's checkpoint, so this run goes without one
+                self.enabled = False
+                logger.warning(f"⚠️ {job_name} run {previous.get('run_id')} (pid {previous.get('pid')}) is still "
+                               f"running - not resuming it, and this run is not checkpointed")
+            else:
+                self.resumed_from = previous
+
+        self.state = {
+            'run_id': uuid.uuid4().hex[:12],
+            'status': 'running',
+            'host': socket.gethostname(),
+            'pid': os.getpid(),
+            'started': datetime.now(AEST).isoformat(),
+            'completed': 0
+        }
+        if self.resumed_from:
+            self.state['resumed_from'] = self.resumed_from.get('run_id')
+            logger.info(f"♻️ Previous {job_name} run {self.resumed_from.get('run_id')} was interrupted "
+                        f"after {self.resumed_from.get('completed', 0)} item(s) - resuming")
+
+    def save(self, **fields):
+        """Persist the checkpoint and report it to JobManager"""
+        self.state.update(fields)
+        self.state['updated'] = datetime.now(AEST).isoformat()
+        if not self.enabled:
+            return
+        set_sync_state(self.job_name, self.state_key, self.state)
+        emit_status('checkpoint', job=self.job_name, key=self.state_key, checkpoint=self.state)
+
+    def complete(self, **fields):
+        """Mark the run finished so the next run starts fresh"""
+        self.save(status='completed', **fields)
@@ -0,0 +1,76 @@
+import os
+import re
+import sys
+import pytest
+import sync_state
+
+# The sync modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+class FakeCursor:
+    """Records statements and answers fetches from the connection's queued results"""
+
+    def __init__(self, connection):
+        self.connection = connection
+        self.rowcount = 0
+
+    def execute(self, sql, params=None):
+        self.connection.statements.append((' '.join(sql.split()), params))
+        self.rowcount = self.connection.rowcounts.pop(0) if self.connection.rowcounts else 1
+
+    def executemany(self, sql, seq_params):
+        self.execute(sql, list(seq_params))
+
+    def fetchall(self):
+        return self.connection.results.pop(0) if self.connection.results else []
+
+    def fetchone(self):
+        rows = self.fetchall()
+        return rows[0] if rows else None
+
+    def close(self):
+        pass
+
+class FakeConnection:
+    """
+    Stand-in for a mysql.connector connection: results are queued lists of rows, one per fetch,
+    and rowcounts the row counts of the next statements (1 when none is queued)
+    """
+
+    def __init__(self):
+        self.statements = []
+        self.results = []
+        self.rowcounts = []
+        self.commits = 0
+        self.rollbacks = 0
+
+    def cursor(self, dictionary=False, buffered=False):
+        return FakeCursor(self)
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        self.rollbacks += 1
+
+    def is_connected(self):
+        return True
+
+    def close(self):
+        pass
+
+    def executed(self, pattern):
+        """Statements (and their parameters) matching a regular expression"""
+        return [(sql, params) for sql, params in self.statements if re.search(pattern, sql)]
+
+@pytest.fixture
+def fake_connection():
+    return FakeConnection()
+
+@pytest.fixture
+def sync_state_store(monkeypatch):
+    """Keep sync_state values (cursors, checkpoints) in a dict keyed by (job_name, state_key)"""
+    store = {}
+    monkeypatch.setattr(sync_state, 'get_sync_state', lambda job, key, default=None: store.get((job, key), default))
+    monkeypatch.setattr(sync_state, 'set_sync_state', lambda job, key, value: store.update({(job, key): value}) or True)
+    return store
@@ -0,0 +1,105 @@
+import sys
+import pytest
+import json
+import barcode_sync
+import sync_state
+
+@pytest.fixture
+def mysql(monkeypatch, fake_connection):
+    monkeypatch.setattr(barcode_sync, 'get_mysql_connection', lambda: fake_connection)
+    return fake_connection
+
+def test_claim_stamps_a_lease_and_reads_back_its_own_batch(monkeypatch, mysql):
+    monkeypatch.setenv('ROLLING_UPDATE_MODE', 'timestamp')
+    monkeypatch.setenv('BATCH_SIZE', '25')
+    monkeypatch.setenv('BARCODE_SYNC_CLAIM_LEASE', '300')
+    mysql.results.append([{'id': 1, 'sap_item_code': 'A', 'needs_sync': 1}])
+
+    items = barcode_sync.get_items_to_sync('host:42:0')
+    assert [item['id'] for item in items] == [1]
+
+    [(claim_sql, (token, *where_params))] = mysql.executed(r'^UPDATE products SET sync_claimed_by')
+    assert token.startswith('host:42:0:')
+    # Parked items stay out of the batch
+    assert 'AND NOT EXISTS ( SELECT 1 FROM sync_dead_letter dl' in claim_sql
+    assert where_params == [barcode_sync.SYNC_JOB_NAME]
+    assert 'INTERVAL 300 SECOND' in claim_sql and 'LIMIT 25' in claim_sql
+    # Expired leases are claimable again, so a crashed worker's batch is picked up later
+    assert '(sync_claim_expires IS NULL OR sync_claim_expires < NOW())' in claim_sql
+
+    [(_, read_params)] = mysql.executed(r'^SELECT .* WHERE sync_claimed_by = %s')
+    assert read_params == (token,)
+
+def test_each_claim_gets_a_fresh_token(monkeypatch, mysql):
+    barcode_sync.get_items_to_sync('host:42:0')
+    barcode_sync.get_items_to_sync('host:42:0')
+    tokens = [params[0] for _, params in mysql.executed(r'^UPDATE products SET sync_claimed_by')]
+    assert len(set(tokens)) == 2
+
+def test_claimed_write_is_a_compare_and_set(mysql):
+    assert barcode_sync.update_mysql_barcodes(5, ['123'], expected_version=7, claim_token='tok')
+
+    [(sql, params)] = mysql.executed(r'^UPDATE products SET barcode = ')
+    assert sql.endswith('WHERE id = %s AND sync_version = %s AND sync_claimed_by = %s')
+    assert 'sync_version = sync_version + 1' in sql
+    assert 'sync_claimed_by = NULL' in sql
+    assert params[-3:] == (5, 7, 'tok')
+
+def test_write_loses_to_a_newer_version(mysql):
+    mysql.rowcounts.append(0)
+    assert not barcode_sync.mark_item_unchanged(5, 'f' * 40, expected_version=7, claim_token='tok')
+
+def test_unclaimed_write_leaves_other_claims_alone(mysql):
+    assert barcode_sync.update_mysql_barcodes(5, ['123'])
+    assert barcode_sync.mark_item_unchanged(5, 'f' * 40)
+
+    for sql, _ in mysql.statements:
+        assert 'sync_claimed_by' not in sql and 'sync_claim_expires' not in sql
+
+def test_failed_items_are_released_for_the_next_claim(monkeypatch, sync_state_store):
+    items = [{'id': n, 'sap_item_code': f'ITEM-{n}', 'barcode': None, 'barcode1': None, 'barcode2': None,
+              'barcode3': None, 'barcode_hash': None, 'sync_version': 1, 'sync_claimed_by': 'tok'} for n in (1, 2)]
+    released = []
+    monkeypatch.setenv('BARCODE_SYNC_DEAD_LETTER', 'false')
+    monkeypatch.setattr(barcode_sync, 'get_items_to_sync', lambda worker_id: items)
+    monkeypatch.setattr(barcode_sync, 'get_sap_barcodes', lambda code: ['999'])
+    monkeypatch.setattr(barcode_sync, 'update_mysql_barcodes', lambda item_id, *args: item_id == 1)
+    monkeypatch.setattr(barcode_sync, 'release_claims', released.append)
+
+    result = barcode_sync.run_sync_worker(0)
+    assert (result['success'], result['errors']) == (1, 1)
+    assert released == ['tok']
+
+def round_robin_claim(mysql, last_id, claimed_ids):
+    """Claim a round-robin page with the cursor row holding last_id; returns the stored cursor"""
+    mysql.results.append([{'state_value': json.dumps({'last_id': last_id})}])
+    mysql.results.append([{'id': item_id, 'sap_item_code': f'ITEM-{item_id}', 'needs_sync': 0} for item_id in claimed_ids])
+    barcode_sync.get_items_to_sync('host:42:0')
+    [(_, params)] = mysql.executed(r'^UPDATE sync_state SET state_value')
+    return json.loads(params[0])
+
+def test_round_robin_cursor_moves_under_the_claim_lock(monkeypatch, mysql):
+    monkeypatch.setattr(sync_state, '_table_ready', True)
+    monkeypatch.setenv('ROLLING_UPDATE_MODE', 'round_robin')
+    monkeypatch.setenv('BATCH_SIZE', '3')
+
+    assert round_robin_claim(mysql, 10, [11, 12, 13]) == {'last_id': 13}
+
+    statements = [sql for sql, _ in mysql.statements]
+    lock = next(i for i, sql in enumerate(statements) if sql.endswith('FOR UPDATE'))
+    claim = next(i for i, sql in enumerate(statements) if sql.startswith('UPDATE products SET sync_claimed_by'))
+    store = next(i for i, sql in enumerate(statements) if sql.startswith('UPDATE sync_state'))
+    # The cursor row is locked before the claim and written in the same transaction
+    assert lock < claim < store
+    assert 'id > 10' in statements[claim]
+    assert mysql.commits == 1
+
+def test_round_robin_cursor_wraps_after_a_short_page(monkeypatch, mysql):
+    monkeypatch.setattr(sync_state, '_table_ready', True)
+    monkeypatch.setenv('ROLLING_UPDATE_MODE', 'round_robin')
+    monkeypatch.setenv('BATCH_SIZE', '3')
+
+    assert round_robin_claim(mysql, 90, [95]) == {'last_id': 0}
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,66 @@
+import sys
+import pytest
+import barcode_sync
+from barcode_sync import normalise_barcodes, compute_barcode_hash, get_stored_barcode_hash
+
+def product(item_id, barcodes, barcode_hash=None):
+    """A products row as get_items_to_sync returns it"""
+    columns = (list(barcodes) + [None] * 4)[:4]
+    return {'id': item_id, 'sap_item_code': f'ITEM-{item_id}', 'barcode': columns[0], 'barcode1': columns[1],
+            'barcode2': columns[2], 'barcode3': columns[3], 'barcode_hash': barcode_hash,
+            'sync_version': 3, 'sync_claimed_by': 'host:1:0:token'}
+
+def test_normalise_barcodes():
+    assert normalise_barcodes([' 123 ', '', None, '456', '123', '  ']) == ['123', '456']
+
+def test_hash_ignores_formatting_but_not_order():
+    assert compute_barcode_hash(['123', '456']) == compute_barcode_hash([' 123', '456 ', '', '123'])
+    # The order decides which column each barcode is written to
+    assert compute_barcode_hash(['123', '456']) != compute_barcode_hash(['456', '123'])
+    assert compute_barcode_hash([]) == compute_barcode_hash([None, ''])
+
+def test_stored_hash_falls_back_to_the_barcode_columns():
+    assert get_stored_barcode_hash(product(1, ['123', '456'])) == compute_barcode_hash(['123', '456'])
+    assert get_stored_barcode_hash(product(1, ['123'], barcode_hash='abc')) == 'abc'
+
+@pytest.fixture
+def sync_calls(monkeypatch, sync_state_store):
+    """Run a sync worker against in-memory items and SAP barcodes, recording the writes"""
+    calls = {'unchanged': [], 'updated': []}
+    monkeypatch.setenv('BARCODE_SYNC_DEAD_LETTER', 'false')
+    monkeypatch.setattr(barcode_sync, 'mark_item_unchanged',
+                        lambda item_id, barcode_hash, *args: calls['unchanged'].append(item_id) or True)
+    monkeypatch.setattr(barcode_sync, 'update_mysql_barcodes',
+                        lambda item_id, barcodes, *args: calls['updated'].append((item_id, barcodes)) or True)
+    return calls
+
+def test_sync_only_writes_changed_barcode_sets(monkeypatch, sync_calls):
+    items = [
+        product(1, ['111'], barcode_hash=compute_barcode_hash(['111'])),
+        product(2, ['222']),                                               # synced before fingerprints
+        product(3, ['333'], barcode_hash=compute_barcode_hash(['333'])),
+        product(4, ['444', '445']),
+    ]
+    sap = {'ITEM-1': ['111'], 'ITEM-2': [' 222 '], 'ITEM-3': ['333', '334'], 'ITEM-4': ['445', '444']}
+    monkeypatch.setattr(barcode_sync, 'get_items_to_sync', lambda worker_id: items)
+    monkeypatch.setattr(barcode_sync, 'get_sap_barcodes', lambda code: sap[code])
+
+    result = barcode_sync.run_sync_worker(0)
+    assert (result['processed'], result['success'], result['unchanged']) == (4, 4, 2)
+
+    assert sync_calls['unchanged'] == [1, 2]
+    assert sync_calls['updated'] == [(3, ['333', '334']), (4, ['445', '444'])]
+
+def test_unchanged_write_leaves_barcodes_and_version_alone(monkeypatch, fake_connection):
+    monkeypatch.setattr(barcode_sync, 'get_mysql_connection', lambda: fake_connection)
+
+    assert barcode_sync.mark_item_unchanged(7, 'f' * 40)
+
+    [(sql, params)] = fake_connection.statements
+    assert 'barcode_hash = %s' in sql
+    assert 'barcode1' not in sql and 'sync_version' not in sql
+    assert params == ('f' * 40, 7)
+    assert fake_connection.commits == 1
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
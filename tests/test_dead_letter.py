@@ -0,0 +1,47 @@
+import sys
+import pytest
+import barcode_sync
+import dead_letter
+
+def claimed_item(item_id=7):
+    return {'id': item_id, 'sap_item_code': f'ITEM-{item_id}', 'barcode': None, 'barcode1': None, 'barcode2': None,
+            'barcode3': None, 'barcode_hash': None, 'sync_version': 1, 'sync_claimed_by': 'tok'}
+
+@pytest.fixture
+def mysql(monkeypatch, fake_connection):
+    monkeypatch.setattr(dead_letter, '_table_ready', True)
+    monkeypatch.setattr(dead_letter, 'get_mysql_connection', lambda: fake_connection)
+    monkeypatch.setattr(barcode_sync, 'update_mysql_barcodes', lambda *args: pytest.fail('wrote the barcodes'))
+    monkeypatch.setattr(barcode_sync, 'get_sap_barcodes', lambda code: ['1', '2', '3', '4', '5'])
+    return fake_connection
+
+def test_item_with_too_many_barcodes_is_parked(monkeypatch, mysql):
+    monkeypatch.setenv('BARCODE_SYNC_DEAD_LETTER_BACKOFF', '600')
+    monkeypatch.setenv('BARCODE_SYNC_DEAD_LETTER_MAX_BACKOFF', '86400')
+    mysql.results.append([(1,)])
+
+    assert barcode_sync.sync_claimed_item(claimed_item(), 'tok') == 'dead_letter'
+
+    [(sql, params)] = mysql.executed(r'^INSERT INTO sync_dead_letter')
+    assert params[:4] == (barcode_sync.SYNC_JOB_NAME, 7, 'ITEM-7', 'too_many_barcodes')
+    assert params[4] == '5 barcodes in SAP (maximum 4): 1, 2, 3, 4, 5'
+    assert params[5] == 600
+    # Every further failure doubles the wait, up to the ceiling
+    assert 'LEAST(600 * POW(2, attempts - 1), 86400)' in sql
+    assert mysql.commits == 1
+
+def test_too_many_barcodes_is_an_error_when_dead_lettering_is_off(monkeypatch, mysql):
+    monkeypatch.setenv('BARCODE_SYNC_DEAD_LETTER', 'false')
+
+    assert barcode_sync.sync_claimed_item(claimed_item(), 'tok') == 'error'
+    assert mysql.statements == []
+
+def test_synced_items_leave_the_queue(mysql):
+    mysql.rowcounts.append(2)
+    assert dead_letter.resolve_items(barcode_sync.SYNC_JOB_NAME, [3, 4]) == 2
+
+    [(_, params)] = mysql.executed(r'^DELETE FROM sync_dead_letter')
+    assert params == (barcode_sync.SYNC_JOB_NAME, 3, 4)
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
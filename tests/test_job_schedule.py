@@ -0,0 +1,82 @@
+import sys
+import pytest
+from datetime import datetime
+from job_schedule import AEST, CronSchedule, QuietWindows
+
+def local(year, month, day, hour=0, minute=0, second=0):
+    """Naive local datetime for a wall-clock time in AEST, as the scheduler uses"""
+    return datetime(year, month, day, hour, minute, second, tzinfo=AEST).astimezone().replace(tzinfo=None)
+
+def test_every_fifteen_minutes():
+    schedule = CronSchedule('*/15 * * * *')
+    assert schedule.next_after(local(2024, 3, 5, 10, 7)) == local(2024, 3, 5, 10, 15)
+    # Strictly after - a time on the schedule moves to the next match
+    assert schedule.next_after(local(2024, 3, 5, 10, 15)) == local(2024, 3, 5, 10, 30)
+    assert schedule.next_after(local(2024, 3, 5, 23, 50)) == local(2024, 3, 6, 0, 0)
+
+def test_weekday_names_and_ranges():
+    # 2024-03-08 is a Friday
+    schedule = CronSchedule('30 9 * * mon-fri')
+    assert schedule.next_after(local(2024, 3, 8, 9, 30)) == local(2024, 3, 11, 9, 30)
+    assert schedule.next_after(local(2024, 3, 8, 8, 0)) == local(2024, 3, 8, 9, 30)
+
+def test_sunday_as_seven():
+    assert CronSchedule('0 6 * * 7').next_after(local(2024, 3, 8)) == local(2024, 3, 10, 6, 0)
+    assert CronSchedule('0 6 * * 0').weekdays == CronSchedule('0 6 * * 7').weekdays
+
+def test_day_of_month_or_weekday():
+    # Both day fields restricted: either one matching is enough, as in cron
+    schedule = CronSchedule('0 0 13 * fri')
+    assert schedule.next_after(local(2024, 3, 1, 1)) == local(2024, 3, 8)
+    assert schedule.next_after(local(2024, 3, 8, 1)) == local(2024, 3, 13)
+
+def test_stepped_star_day_field_does_not_widen_the_other():
+    # */2 counts as '*' for the OR rule: odd days that are also Mondays, not either
+    schedule = CronSchedule('0 0 */2 * mon')
+    assert schedule.next_after(local(2024, 3, 1, 1)) == local(2024, 3, 11)
+    assert CronSchedule('0 0 13 * */3').next_after(local(2024, 3, 1)) == local(2024, 3, 13)
+
+def test_month_names_and_macros():
+    assert CronSchedule('0 0 1 jan *').next_after(local(2024, 3, 5)) == local(2025, 1, 1)
+    assert CronSchedule('@daily').next_after(local(2024, 2, 28, 12)) == local(2024, 2, 29)
+    assert CronSchedule('@hourly').next_after(local(2024, 2, 28, 12, 59)) == local(2024, 2, 28, 13)
+
+def test_leap_day_schedule():
+    assert CronSchedule('0 12 29 2 *').next_after(local(2024, 3, 1)) == local(2028, 2, 29, 12)
+
+@pytest.mark.parametrize('expression', ['* * * *', '60 * * * *', '0 24 * * *', '*/0 * * * *', '5-1 * * * *', 'x * * * *'])
+def test_invalid_expressions(expression):
+    with pytest.raises(ValueError):
+        CronSchedule(expression)
+
+def test_expression_that_never_matches():
+    with pytest.raises(ValueError):
+        CronSchedule('0 0 31 2 *').next_after(local(2024, 1, 1))
+
+def test_quiet_window_defers_to_its_end():
+    windows = QuietWindows('12:00-12:15')
+    assert windows.defer(local(2024, 3, 5, 12, 5)) == local(2024, 3, 5, 12, 15)
+    assert windows.defer(local(2024, 3, 5, 12, 15)) == local(2024, 3, 5, 12, 15)
+    outside = local(2024, 3, 5, 11, 59, 59)
+    assert windows.defer(outside) is outside
+
+def test_quiet_window_across_midnight():
+    windows = QuietWindows('23:30-01:00')
+    assert windows.defer(local(2024, 3, 5, 23, 45)) == local(2024, 3, 6, 1, 0)
+    assert windows.defer(local(2024, 3, 6, 0, 30)) == local(2024, 3, 6, 1, 0)
+    assert windows.defer(local(2024, 3, 6, 1, 0)) == local(2024, 3, 6, 1, 0)
+
+def test_back_to_back_quiet_windows():
+    windows = QuietWindows('22:00-23:00, 23:00-23:30')
+    assert windows.defer(local(2024, 3, 5, 22, 30)) == local(2024, 3, 5, 23, 30)
+
+def test_empty_and_invalid_quiet_windows():
+    assert not QuietWindows('')
+    assert not QuietWindows(None)
+    assert QuietWindows('01:00-02:00')
+    for text in ('1-2', '25:00-26:00', '10:60-11:00'):
+        with pytest.raises(ValueError):
+            QuietWindows(text)
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
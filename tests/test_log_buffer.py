@@ -0,0 +1,93 @@
+import sys
+import pytest
+from job_manager import JobManager, LogBuffer
+
+def entry(n):
+    return {'timestamp': f'2024-01-01T00:00:{n:02d}', 'message': f'line {n}'}
+
+def test_sequence_numbers_and_eviction():
+    buffer = LogBuffer(3)
+    assert [buffer.append(entry(n)) for n in range(5)] == [1, 2, 3, 4, 5]
+
+    assert len(buffer) == 3
+    assert [e['message'] for e in buffer.tail(10)] == ['line 2', 'line 3', 'line 4']
+    assert [e['seq'] for e in buffer.tail(2)] == [4, 5]
+    assert buffer.tail(0) == []
+
+    stats = buffer.stats()
+    assert stats['size'] == 3
+    assert stats['first_seq'] == 3
+    assert stats['last_seq'] == 5
+    assert stats['dropped'] == 2
+    assert stats['approx_bytes'] > 0
+
+def test_append_does_not_modify_the_callers_entry():
+    buffer = LogBuffer(2)
+    original = entry(0)
+    buffer.append(original)
+    assert 'seq' not in original
+
+def test_since_returns_unseen_entries():
+    buffer = LogBuffer(10)
+    for n in range(6):
+        buffer.append(entry(n))
+
+    assert [e['seq'] for e in buffer.since(4)] == [5, 6]
+    assert [e['seq'] for e in buffer.since(0, limit=2)] == [1, 2]
+    assert buffer.since(6) == []
+
+def test_since_after_eviction_starts_at_oldest_kept():
+    buffer = LogBuffer(2)
+    for n in range(5):
+        buffer.append(entry(n))
+    assert [e['seq'] for e in buffer.since(1)] == [4, 5]
+
+def test_sequence_continues_after_clear():
+    buffer = LogBuffer(5)
+    buffer.append(entry(0))
+    buffer.append(entry(1))
+    buffer.clear()
+
+    assert len(buffer) == 0
+    assert buffer.stats()['approx_bytes'] == 0
+    assert buffer.stats()['first_seq'] is None
+    assert buffer.append(entry(2)) == 3
+    assert [e['seq'] for e in buffer.since(2)] == [3]
+
+def test_on_append_callback():
+    calls = []
+    buffer = LogBuffer(1, on_append=lambda: calls.append(len(calls)))
+    buffer.append(entry(0))
+    buffer.append(entry(1))
+    assert calls == [0, 1]
+
+def test_each_buffer_has_its_own_epoch():
+    first, second = LogBuffer(5), LogBuffer(5)
+    assert first.epoch != second.epoch
+    assert first.stats()['epoch'] == first.epoch
+
+def test_cursor_from_another_buffer_gets_the_tail():
+    manager = JobManager()
+    manager.jobs['job'] = {'logs': LogBuffer(10)}
+    for n in range(3):
+        manager.jobs['job']['logs'].append(entry(n))
+    epoch = manager.jobs['job']['logs'].epoch
+
+    updates = manager.wait_for_updates({'job': [epoch, 2]}, -1, 0)
+    assert updates['reset'] == []
+    assert [e['seq'] for e in updates['logs']['job']] == [3]
+
+    # Same sequence number, but from a buffer that no longer exists (restart, leadership move)
+    updates = manager.wait_for_updates({'job': ['00000000', 2]}, updates['change_seq'], 5)
+    assert updates['reset'] == ['job']
+    assert [e['seq'] for e in updates['logs']['job']] == [1, 2, 3]
+    assert updates['epochs'] == {'job': epoch}
+
+def test_capacity_is_at_least_one():
+    buffer = LogBuffer(0)
+    buffer.append(entry(0))
+    assert buffer.capacity == 1
+    assert len(buffer) == 1
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,56 @@
+import sys
+import pytest
+import negative_cache
+import product_index
+from negative_cache import backoff_settings, record_misses, revalidate
+
+@pytest.fixture
+def mysql(monkeypatch, fake_connection):
+    monkeypatch.setattr(negative_cache, '_table_ready', True)
+    monkeypatch.setattr(negative_cache, 'get_mysql_connection', lambda: fake_connection)
+    return fake_connection
+
+def test_backoff_settings(monkeypatch):
+    assert backoff_settings('SERIAL_SYNC') == (3600, 7 * 24 * 3600)
+    monkeypatch.setenv('SERIAL_SYNC_NOT_FOUND_BACKOFF', '600')
+    monkeypatch.setenv('SERIAL_SYNC_NOT_FOUND_MAX_BACKOFF', '60')
+    # The ceiling is never below the first delay
+    assert backoff_settings('SERIAL_SYNC') == (600, 600)
+
+def test_misses_back_off_exponentially_up_to_the_ceiling(mysql):
+    assert record_misses('serial_number_sync', ['A-1', 'B-2'], 500, 60, 3600)
+
+    [(sql, rows)] = mysql.executed(r'^INSERT INTO sync_negative_cache')
+    # First miss: re-check after the base delay
+    assert rows == [('serial_number_sync', 'A-1', 60, 500), ('serial_number_sync', 'B-2', 60, 500)]
+    # Later misses: base * 2^(misses - 1), with misses already incremented
+    assert 'next_check = NOW() + INTERVAL LEAST(60 * POW(2, misses - 1), 3600) SECOND' in sql
+    assert sql.index('misses = misses + 1') < sql.index('next_check = NOW() + INTERVAL LEAST')
+    assert mysql.commits == 1
+
+def test_nothing_is_cached_when_the_highest_product_id_is_unknown(monkeypatch, mysql):
+    monkeypatch.setenv('PRODUCT_INDEX_ENABLED', 'false')
+    monkeypatch.setattr(product_index, 'get_mysql_connection', lambda: None)
+    highest_product_id = product_index.products_max_id()
+    assert highest_product_id is None
+
+    assert not record_misses('serial_number_sync', ['A-1'], highest_product_id, 60, 3600)
+    assert mysql.statements == []
+
+def test_revalidate_makes_entries_due_without_a_lookup(mysql):
+    mysql.results.append([('A-1',), ('B-2',)])
+    assert revalidate('serial_number_sync', 900) == 0
+
+    [(_, params)] = mysql.executed(r'^UPDATE sync_negative_cache SET next_check = NOW\(\)')
+    assert params == (900, 'serial_number_sync', 900)
+
+def test_revalidate_drops_entries_that_now_exist(mysql):
+    mysql.results.append([('A-1',), ('B-2',)])
+    assert revalidate('serial_number_sync', 900, lookup={'B-2': 42}.get) == 1
+
+    [(_, params)] = mysql.executed(r'^DELETE FROM sync_negative_cache')
+    assert params == ('serial_number_sync', 'B-2')
+    assert not mysql.executed(r'next_check = NOW\(\)')
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
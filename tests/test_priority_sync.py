@@ -0,0 +1,91 @@
+import sys
+import types
+import pytest
+import barcode_sync
+import priority_sync
+from priority_sync import normalise_item_codes, take_rate_tokens
+
+class Clock:
+    """Stands in for time.time so the token bucket can be stepped"""
+    def __init__(self):
+        self.now = 1000.0
+
+    def time(self):
+        return self.now
+
+@pytest.fixture
+def clock(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(priority_sync, 'BUDGET_DIR', str(tmp_path))
+    monkeypatch.setattr(priority_sync, 'RATE_FILE', str(tmp_path / 'priority_sync_rate.json'))
+    monkeypatch.setattr(priority_sync, 'time', types.SimpleNamespace(time=clock.time))
+    monkeypatch.setenv('PRIORITY_SYNC_RATE_PER_MINUTE', '60')
+    monkeypatch.setenv('PRIORITY_SYNC_RATE_BURST', '10')
+    return clock
+
+def test_normalise_strips_and_keeps_order():
+    codes, invalid = normalise_item_codes([' B-2 ', 'A-1', 'C-3\n'])
+    assert codes == ['B-2', 'A-1', 'C-3']
+    assert invalid == []
+
+def test_normalise_dedupes_like_the_product_index():
+    # Codes MySQL and SAP would match as the same item are synced once, first spelling wins
+    codes, invalid = normalise_item_codes(['abc-1', 'ABC-1', 'Abc-1  ', 'abd-1'])
+    assert codes == ['abc-1', 'abd-1']
+    assert invalid == []
+
+def test_normalise_rejects_invalid_codes():
+    too_long = 'X' * (priority_sync.MAX_ITEM_CODE_LENGTH + 1)
+    codes, invalid = normalise_item_codes(['OK-1', '', '   ', None, 42, too_long, 'BAD\x00CODE'])
+    assert codes == ['OK-1']
+    assert invalid == ['', '   ', None, 42, too_long, 'BAD\x00CODE']
+
+def test_rate_tokens_burst_then_refill(clock):
+    assert take_rate_tokens('client', 6) == 0
+    assert take_rate_tokens('client', 4) == 0
+    # Bucket empty: one item a second comes back
+    assert take_rate_tokens('client', 3) == pytest.approx(3.0)
+
+    clock.now += 2
+    assert take_rate_tokens('client', 3) == pytest.approx(1.0)
+    clock.now += 1
+    assert take_rate_tokens('client', 3) == 0
+
+def test_rate_tokens_are_per_client(clock):
+    assert take_rate_tokens('first', 10) == 0
+    assert take_rate_tokens('first', 1) > 0
+    assert take_rate_tokens('second', 10) == 0
+
+def test_request_larger_than_burst_waits_for_a_full_bucket(clock):
+    assert take_rate_tokens('client', 5) == 0
+    assert take_rate_tokens('client', 50) == pytest.approx(5.0)
+    clock.now += 5
+    assert take_rate_tokens('client', 50) == 0
+
+def test_refilled_buckets_are_dropped(clock):
+    take_rate_tokens('idle', 5)
+    clock.now += 60
+    take_rate_tokens('active', 1)
+    with open(priority_sync.RATE_FILE) as f:
+        assert 'idle' not in f.read()
+
+def test_rate_limit_off(clock, monkeypatch):
+    monkeypatch.setenv('PRIORITY_SYNC_RATE_PER_MINUTE', '0')
+    for _ in range(5):
+        assert take_rate_tokens('client', 1000) == 0
+
+def test_priority_write_leaves_a_running_batch_claim_alone(monkeypatch, fake_connection):
+    monkeypatch.setattr(barcode_sync, 'get_mysql_connection', lambda: fake_connection)
+    product = {'id': 5, 'sap_item_code': 'ITEM-5', 'barcode': '111', 'barcode1': None, 'barcode2': None,
+               'barcode3': None, 'barcode_hash': None, 'sync_version': 3, 'sync_claimed_by': 'host:1:0:tok'}
+
+    assert priority_sync.sync_item(product, ['111', '222']) == 'updated'
+
+    [(sql, params)] = fake_connection.executed(r'^UPDATE products SET barcode = ')
+    # Still a compare-and-set on sync_version, so the batch worker's own write loses instead
+    assert sql.endswith('WHERE id = %s AND sync_version = %s')
+    assert params[-2:] == (5, 3)
+    assert 'sync_claimed_by' not in sql and 'sync_claim_expires' not in sql
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,106 @@
+import sys
+import time
+import pytest
+import product_index
+from product_index import ProductIndex, _Table, _build_table, _index_key, item_code_key
+
+def table_of(codes):
+    """A packed table of {code: id}, keyed the way rebuild keys products rows"""
+    rows = [(_index_key(code), product_id) for code, product_id in codes.items()]
+    return _Table(_build_table(rows, max(codes.values(), default=0), '2024-03-05 10:00:00'))
+
+def index_of(codes):
+    """A ProductIndex serving a snapshot of {code: id}, fresh enough not to touch MySQL"""
+    index = ProductIndex()
+    index._use_table(table_of(codes))
+    index._refreshed = time.monotonic()
+    return index
+
+def test_item_code_key_follows_the_collation():
+    assert item_code_key('abc-1') == item_code_key('ABC-1') == item_code_key('Abc-1  ')
+    # Only trailing spaces are ignored
+    assert item_code_key(' ABC-1') != item_code_key('ABC-1')
+    assert _index_key('') is None
+    assert _index_key('   ') is None
+    assert _index_key(None) is None
+
+def test_table_binary_search():
+    codes = {f'ITEM-{n:04d}': n for n in range(1, 500)}
+    table = table_of(codes)
+    assert table.count == 499
+    assert table.max_id == 499
+    assert table.updated_hwm == '2024-03-05 10:00:00'
+    for code, product_id in codes.items():
+        assert table.get(_index_key(code)) == product_id
+    assert table.get(_index_key('ITEM-0000')) is None
+    assert table.get(_index_key('ITEM-9999')) is None
+    assert table.get(_index_key('A')) is None
+
+def test_empty_table():
+    table = table_of({})
+    assert table.count == 0
+    assert table.get(_index_key('ANY')) is None
+
+def test_duplicate_codes_resolve_to_lowest_id():
+    rows = [(_index_key('dup'), 9), (_index_key('DUP'), 4), (_index_key('Dup '), 7)]
+    table = _Table(_build_table(rows, 9, None))
+    assert table.get(_index_key('dup')) == 4
+
+def test_old_file_format_is_rejected():
+    data = bytearray(table_of({'A': 1}).buffer)
+    data[:8] = b'PRODIDX1'
+    with pytest.raises(ValueError):
+        _Table(bytes(data))
+
+def test_lookup_with_mixed_case_codes():
+    index = index_of({'ABC-1': 1, 'xyz-2': 2, 'Mixed-Case-3': 3, 'PADDED-4  ': 4})
+
+    assert index.lookup('abc-1') == 1
+    assert index.lookup('ABC-1') == 1
+    assert index.lookup('XYZ-2') == 2
+    assert index.lookup('mIXED-cASE-3') == 3
+    assert index.lookup('padded-4') == 4
+    assert index.lookup('ABC-1 ') == 1
+    assert index.lookup('ABC-2') is None
+    assert index.lookup('') is None
+
+    stats = index.take_stats()
+    assert stats['hits'] == 6
+    assert stats['misses'] == 1
+    assert stats['size'] == 4
+
+def test_delta_overrides_snapshot():
+    index = index_of({'OLD-CODE': 1, 'KEPT': 2})
+    # Product 1 was renamed since the snapshot, product 3 is new
+    index._stale_ids.add(1)
+    for code, product_id in (('New-Code', 1), ('ADDED', 3)):
+        index._delta[_index_key(code)] = product_id
+        index._delta_codes[product_id] = _index_key(code)
+
+    assert index.lookup('old-code') is None
+    assert index.lookup('NEW-CODE') == 1
+    assert index.lookup('added') == 3
+    assert index.lookup('kept') == 2
+
+def test_refresh_keeps_the_lowest_id_for_duplicated_codes(monkeypatch, fake_connection):
+    monkeypatch.setattr(product_index, 'get_mysql_connection', lambda: fake_connection)
+    index = index_of({'KEPT': 5})
+    index._has_updated_at = False
+
+    fake_connection.results.append([(9, 'dup', None), (7, 'DUP ', None), (8, 'kept', None)])
+    index.refresh()
+    assert index.lookup('dup') == 7
+    assert index.lookup('KEPT') == 5
+
+    fake_connection.results.append([(10, 'Dup', None)])
+    index.refresh()
+    assert index.lookup('DUP') == 7
+    assert index._delta_codes == {7: _index_key('dup')}
+
+def test_lookup_refuses_when_disabled(monkeypatch):
+    monkeypatch.setenv('PRODUCT_INDEX_ENABLED', 'false')
+    with pytest.raises(product_index.ProductIndexUnavailable):
+        product_index.lookup_product_id('ABC-1')
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,72 @@
+import os
+import sys
+import socket
+import subprocess
+import pytest
+import barcode_sync
+from sync_state import RunCheckpoint, checkpoint_owner_alive
+
+def dead_pid():
+    """The pid of a process that has already exited"""
+    process = subprocess.Popen([sys.executable, '-c', 'pass'])
+    process.wait()
+    return process.pid
+
+def running(pid, host=None):
+    return {'run_id': 'previous', 'status': 'running', 'host': host or socket.gethostname(),
+            'pid': pid, 'completed': 20, 'claim_token': 'host:1:0:old'}
+
+def test_owner_liveness():
+    assert checkpoint_owner_alive(running(os.getppid()))
+    assert not checkpoint_owner_alive(running(dead_pid()))
+    # This very process (an earlier daemon iteration) and other hosts count as gone
+    assert not checkpoint_owner_alive(running(os.getpid()))
+    assert not checkpoint_owner_alive(running(os.getppid(), host='another-host'))
+    assert not checkpoint_owner_alive({'status': 'running'})
+
+def test_interrupted_run_is_resumed(sync_state_store):
+    sync_state_store[('job', 'checkpoint')] = running(dead_pid())
+
+    checkpoint = RunCheckpoint('job')
+    assert checkpoint.resumed_from['run_id'] == 'previous'
+    assert checkpoint.state['resumed_from'] == 'previous'
+
+    checkpoint.save(completed=5)
+    saved = sync_state_store[('job', 'checkpoint')]
+    assert (saved['status'], saved['pid'], saved['completed']) == ('running', os.getpid(), 5)
+
+    checkpoint.complete(completed=10)
+    assert sync_state_store[('job', 'checkpoint')]['status'] == 'completed'
+    assert RunCheckpoint('job').resumed_from is None
+
+def test_live_run_is_left_alone(sync_state_store):
+    live = running(os.getppid())
+    sync_state_store[('job', 'checkpoint')] = live
+
+    checkpoint = RunCheckpoint('job')
+    assert checkpoint.resumed_from is None
+    assert not checkpoint.enabled
+    checkpoint.save(completed=5)
+    checkpoint.complete()
+    assert sync_state_store[('job', 'checkpoint')] is live
+
+def test_barcode_worker_resumes_its_unfinished_claim(monkeypatch, sync_state_store):
+    key = (barcode_sync.SYNC_JOB_NAME, f"checkpoint:{socket.gethostname()[:40]}:0")
+    sync_state_store[key] = running(dead_pid())
+    unfinished = [{'id': 9, 'sap_item_code': 'ITEM-9', 'barcode': '999', 'barcode1': None, 'barcode2': None,
+                   'barcode3': None, 'barcode_hash': None, 'sync_version': 1, 'sync_claimed_by': 'host:1:0:old'}]
+    resumed = []
+    monkeypatch.setenv('BARCODE_SYNC_DEAD_LETTER', 'false')
+    monkeypatch.setattr(barcode_sync, 'resume_claims', lambda token: resumed.append(token) or unfinished)
+    monkeypatch.setattr(barcode_sync, 'get_items_to_sync', lambda worker_id: pytest.fail('claimed a new batch'))
+    monkeypatch.setattr(barcode_sync, 'get_sap_barcodes', lambda code: ['999'])
+    monkeypatch.setattr(barcode_sync, 'mark_item_unchanged', lambda *args: True)
+
+    result = barcode_sync.run_sync_worker(0)
+    assert resumed == ['host:1:0:old']
+    assert (result['processed'], result['unchanged']) == (1, 1)
+    assert sync_state_store[key]['status'] == 'completed'
+    assert sync_state_store[key]['claim_token'] == 'host:1:0:old'
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,47 @@
+import sys
+import pytest
+from datetime import date
+from run_history import _daily_rows, _percentile
+
+def test_percentile_nearest_rank():
+    assert _percentile([], 0.5) is None
+    assert _percentile([4], 0.95) == 4
+    assert _percentile([1, 2, 3, 4], 0.50) == 2
+    assert _percentile(list(range(1, 101)), 0.95) == 95
+
+def test_daily_rows_roll_up_each_day():
+    monday, tuesday = date(2024, 3, 4), date(2024, 3, 5)
+    runs = [
+        # (day, duration, outcome, processed, errors, items/s, peak rss)
+        (monday, 10.0, 'success', 100, 0, None, 1000),
+        (monday, 2.0, 'failure', None, 3, 3.0, None),
+        (monday, 5.0, 'success', 50, None, 1.0, 3000),
+        (monday, 7.0, 'timeout', 0, 1, 2.0, 2000),
+        (tuesday, 4.0, 'success', 8, 0, None, None),
+    ]
+    rows = _daily_rows(runs)
+
+    assert set(rows) == {monday, tuesday}
+    assert rows[monday] == {
+        'runs': 4,
+        'failures': 2,
+        'p50_duration': 5.0,
+        'p95_duration': 10.0,
+        'max_duration': 10.0,
+        'p50_items_per_second': 2.0,
+        'items_processed': 150,
+        'errors': 4,
+        'max_peak_rss_kb': 3000
+    }
+    # A day without rates or peak memory readings keeps those as None
+    assert rows[tuesday]['runs'] == 1
+    assert rows[tuesday]['failures'] == 0
+    assert rows[tuesday]['p50_duration'] == rows[tuesday]['max_duration'] == 4.0
+    assert rows[tuesday]['p50_items_per_second'] is None
+    assert rows[tuesday]['max_peak_rss_kb'] is None
+
+def test_daily_rows_without_runs():
+    assert _daily_rows([]) == {}
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
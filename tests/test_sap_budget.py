@@ -0,0 +1,69 @@
+import os
+import sys
+import fcntl
+import pytest
+import sap_budget
+from sap_budget import SapBudgetTimeout, acquire_sap_slot, budget_usage, sap_consumer
+
+@pytest.fixture
+def budget(monkeypatch, tmp_path):
+    """Two slot budget with one reserved for interactive callers, in a scratch directory"""
+    monkeypatch.setattr(sap_budget, 'BUDGET_DIR', str(tmp_path))
+    monkeypatch.setenv('SAP_BUDGET_CONCURRENCY', '2')
+    monkeypatch.setenv('SAP_BUDGET_RESERVED', '1')
+    return tmp_path
+
+def queued(budget, priority):
+    """Hold the waiting lock for priority as a queued caller in another process would"""
+    fd = os.open(os.path.join(str(budget), f"waiting-{sap_budget.PRIORITIES[priority]}.lock"),
+                 os.O_RDWR | os.O_CREAT, 0o644)
+    fcntl.flock(fd, fcntl.LOCK_SH)
+    return fd
+
+def test_reserved_slot_is_left_for_interactive_callers(budget):
+    with sap_consumer('barcode_sync', 'normal'):
+        held = acquire_sap_slot()
+        with pytest.raises(SapBudgetTimeout):
+            acquire_sap_slot(timeout=0.05)
+    with sap_consumer('console', 'interactive'):
+        with acquire_sap_slot(timeout=0.05) as console:
+            assert {held.index, console.index} == {0, 1}
+    held.release()
+
+def test_lower_priority_holds_back_while_a_higher_one_waits(budget):
+    waiting_fd = queued(budget, 'high')
+    try:
+        with sap_consumer('staff_sync', 'low'):
+            # A slot is free, but a high priority caller is queued for it
+            with pytest.raises(SapBudgetTimeout):
+                acquire_sap_slot(timeout=0.05)
+        with sap_consumer('console', 'interactive'):
+            acquire_sap_slot(timeout=0.05).release()
+    finally:
+        os.close(waiting_fd)
+
+    with sap_consumer('staff_sync', 'low'):
+        acquire_sap_slot(timeout=0.05).release()
+
+def test_usage_reports_holders_and_queued_priorities(budget):
+    waiting_fd = queued(budget, 'low')
+    try:
+        with sap_consumer('barcode_sync', 'high'), acquire_sap_slot():
+            usage = budget_usage()
+    finally:
+        os.close(waiting_fd)
+
+    assert usage['in_use'] == 1 and usage['reserved_interactive'] == 1
+    [holder] = usage['holders']
+    assert (holder['consumer'], holder['priority'], holder['pid']) == ('barcode_sync', 'high', os.getpid())
+    assert usage['waiting'] == ['low']
+    assert budget_usage()['in_use'] == 0
+
+def test_zero_concurrency_turns_the_budget_off(budget, monkeypatch):
+    monkeypatch.setenv('SAP_BUDGET_CONCURRENCY', '0')
+    assert acquire_sap_slot().index is None
+    assert budget_usage() == {'enabled': False, 'concurrency': 0, 'reserved_interactive': 0,
+                              'in_use': 0, 'holders': [], 'waiting': []}
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,61 @@
+import sys
+import pytest
+import scheduler_leader
+from scheduler_leader import SchedulerLeadership, SchedulerUnavailable
+
+class Jobs:
+    """JobManager stand-in that counts auto-start calls"""
+    def __init__(self):
+        self.started = 0
+
+    def start_auto_start_jobs(self):
+        self.started += 1
+
+@pytest.fixture
+def fresh_process(monkeypatch):
+    """Forget any leadership started by an earlier test and keep election threads from starting"""
+    monkeypatch.setattr(scheduler_leader, '_leadership', None)
+    monkeypatch.setattr(scheduler_leader, '_leadership_pid', None)
+    monkeypatch.setattr(SchedulerLeadership, 'start', lambda self: None)
+    monkeypatch.delenv('SCHEDULER_CONTROL_TOKEN', raising=False)
+    monkeypatch.setenv('SCHEDULER_LEADERSHIP', 'true')
+
+def test_placeholder_secret_gives_no_control_token(monkeypatch):
+    monkeypatch.delenv('SCHEDULER_CONTROL_TOKEN', raising=False)
+    monkeypatch.setenv('FLASK_SECRET_KEY', 'your-secret-key-here')
+    assert scheduler_leader._control_token() is None
+
+    monkeypatch.setenv('FLASK_SECRET_KEY', 'a-real-secret')
+    assert scheduler_leader._control_token() is not None
+
+def test_missing_token_starts_without_control_endpoint(monkeypatch, fresh_process, caplog):
+    monkeypatch.delenv('FLASK_SECRET_KEY', raising=False)
+    jobs = Jobs()
+
+    leadership = scheduler_leader.start_scheduler_leadership(jobs)
+    assert leadership is not None and leadership.control is False
+    # Once per process - later calls neither raise nor log again
+    assert scheduler_leader.start_scheduler_leadership(jobs) is leadership
+    assert len([r for r in caplog.records if 'control endpoint disabled' in r.message]) == 1
+
+    with pytest.raises(SchedulerUnavailable):
+        scheduler_leader.get_job_controller(jobs)
+    leadership.leader_address = ''
+    with pytest.raises(SchedulerUnavailable, match='no control endpoint'):
+        scheduler_leader.get_job_controller(jobs)
+
+    leadership.is_leader = True
+    assert scheduler_leader.get_job_controller(jobs) is jobs
+
+def test_leadership_disabled_runs_jobs_in_this_process(monkeypatch, fresh_process):
+    monkeypatch.setenv('SCHEDULER_LEADERSHIP', 'false')
+    jobs = Jobs()
+
+    assert scheduler_leader.start_scheduler_leadership(jobs) is None
+    scheduler_leader.start_scheduler_leadership(jobs)
+    assert jobs.started == 1
+    assert scheduler_leader.get_job_controller(jobs) is jobs
+    assert scheduler_leader.describe_leadership()['role'] == 'standalone'
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,96 @@
+import sys
+import json
+import pytest
+import serial_number_sync
+import sync_state
+
+CATALOG = [f'SER-{n:03d}' for n in range(1, 11)]
+
+@pytest.fixture
+def catalog(monkeypatch):
+    """Serve fetch_serial_item_page from an in-memory ItemCode catalog and keep sync_state in a dict"""
+    state = {}
+
+    def fetch_page(limit, after_code=None, upto_code=None):
+        codes = [code for code in CATALOG
+                 if (not after_code or code > after_code) and (not upto_code or code <= upto_code)]
+        return codes[:limit]
+
+    monkeypatch.setattr(serial_number_sync, 'fetch_serial_item_page', fetch_page)
+    monkeypatch.setenv('SERIAL_SYNC_NOT_FOUND_CACHE', 'false')
+    monkeypatch.setattr(serial_number_sync, 'get_sync_state',
+                        lambda job, key, default=None: state.get((job, key), default))
+    return state
+
+def next_slice(state):
+    """One run's slice, saving the cursor the way sync_serial_number_requirements does at the end"""
+    item_codes, cursor_states, _ = serial_number_sync.get_serial_number_items()
+    assert len(cursor_states) == len(item_codes)
+    state[(serial_number_sync.SYNC_JOB_NAME, 'item_cursor')] = cursor_states[-1]
+    return item_codes, cursor_states[-1]
+
+def test_runs_page_through_the_catalog_and_wrap(monkeypatch, catalog):
+    monkeypatch.setenv('SERIAL_SYNC_BATCH_SIZE', '4')
+
+    first, state = next_slice(catalog)
+    assert first == CATALOG[0:4]
+    assert state['cursor'] == 'SER-004' and state['cycle'] == 1
+
+    second, state = next_slice(catalog)
+    assert second == CATALOG[4:8]
+
+    # Two items left: the slice is topped up from the start of the catalog
+    third, state = next_slice(catalog)
+    assert third == CATALOG[8:10] + CATALOG[0:2]
+    assert state['cursor'] == 'SER-002'
+    assert state['cycle'] == 2
+
+    fourth, state = next_slice(catalog)
+    assert fourth == CATALOG[2:6]
+
+def test_catalog_smaller_than_a_slice(monkeypatch, catalog):
+    monkeypatch.setenv('SERIAL_SYNC_BATCH_SIZE', '50')
+
+    for cycle in (1, 2):
+        item_codes, state = next_slice(catalog)
+        assert item_codes == CATALOG
+        assert state['cursor'] == ''
+        assert state['cycle'] == cycle + 1
+
+def test_items_cached_as_not_found_are_passed_over(monkeypatch, catalog):
+    monkeypatch.setenv('SERIAL_SYNC_BATCH_SIZE', '4')
+    monkeypatch.setenv('SERIAL_SYNC_NOT_FOUND_CACHE', 'true')
+    monkeypatch.setattr(serial_number_sync, 'codes_not_due',
+                        lambda job, codes: {'SER-002', 'SER-003'} & set(codes))
+
+    item_codes, cursor_states, skipped = serial_number_sync.get_serial_number_items()
+    assert item_codes == ['SER-001', 'SER-004', 'SER-005', 'SER-006']
+    assert skipped == 2
+    assert cursor_states[-1]['cursor'] == 'SER-006'
+
+def test_failed_page_keeps_the_cursor(monkeypatch, catalog):
+    catalog[(serial_number_sync.SYNC_JOB_NAME, 'item_cursor')] = {'cursor': 'SER-004', 'cycle': 3}
+    monkeypatch.setattr(serial_number_sync, 'fetch_serial_item_page', lambda *args, **kwargs: None)
+
+    assert serial_number_sync.get_serial_number_items() == ([], [], 0)
+    assert catalog[(serial_number_sync.SYNC_JOB_NAME, 'item_cursor')] == {'cursor': 'SER-004', 'cycle': 3}
+
+def test_sync_state_is_stored_as_json(monkeypatch, fake_connection):
+    monkeypatch.setattr(sync_state, 'get_mysql_connection', lambda: fake_connection)
+    monkeypatch.setattr(sync_state, '_table_ready', True)
+
+    assert sync_state.set_sync_state('serial_number_sync', 'item_cursor', {'cursor': "O'BRIEN", 'cycle': 2})
+    [(sql, params)] = fake_connection.executed('INSERT INTO sync_state')
+    assert 'ON DUPLICATE KEY UPDATE' in sql
+    assert json.loads(params[2]) == {'cursor': "O'BRIEN", 'cycle': 2}
+
+    fake_connection.results.append([{'state_value': params[2]}])
+    assert sync_state.get_sync_state('serial_number_sync', 'item_cursor') == {'cursor': "O'BRIEN", 'cycle': 2}
+    # Missing and unreadable values fall back to the default
+    fake_connection.results.append([])
+    assert sync_state.get_sync_state('serial_number_sync', 'item_cursor', {}) == {}
+    fake_connection.results.append([{'state_value': '{not json'}])
+    assert sync_state.get_sync_state('serial_number_sync', 'item_cursor', {}) == {}
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
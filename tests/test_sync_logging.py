@@ -0,0 +1,73 @@
+import os
+import sys
+import pytest
+from sync_logging import read_log_tail
+
+def write_lines(path, start, count):
+    """Write lines 'line <n>' for n in start..start+count-1"""
+    with open(path, 'w') as f:
+        for n in range(start, start + count):
+            f.write(f"line {n}\n")
+
+def page_back(path, lines, chunk_size=16):
+    """Every line reachable from the end of path, paging back lines at a time, oldest first"""
+    collected = []
+    page = read_log_tail(path, lines, chunk_size=chunk_size)
+    while True:
+        collected = page['lines'] + collected
+        if page['cursor'] is None:
+            return collected
+        page = read_log_tail(path, lines, before=page['cursor'], chunk_size=chunk_size)
+
+def test_tail_of_single_file(tmp_path):
+    path = str(tmp_path / 'job.log')
+    write_lines(path, 0, 50)
+
+    page = read_log_tail(path, 10, chunk_size=16)
+    assert page['lines'] == [f"line {n}" for n in range(40, 50)]
+    assert page['cursor'] is not None
+
+    assert page_back(path, 7) == [f"line {n}" for n in range(50)]
+
+def test_paging_continues_into_rotated_backups(tmp_path):
+    path = str(tmp_path / 'job.log')
+    write_lines(path + '.2', 0, 13)
+    write_lines(path + '.1', 13, 13)
+    write_lines(path, 26, 4)
+
+    # The current file is shorter than one page, so the first page reaches into job.log.1
+    page = read_log_tail(path, 10, chunk_size=16)
+    assert page['lines'] == [f"line {n}" for n in range(20, 30)]
+
+    for page_size in (1, 4, 13, 100):
+        assert page_back(path, page_size) == [f"line {n}" for n in range(30)]
+
+def test_cursor_survives_rotation_between_pages(tmp_path):
+    path = str(tmp_path / 'job.log')
+    write_lines(path, 0, 20)
+    page = read_log_tail(path, 5, chunk_size=16)
+    assert page['lines'] == [f"line {n}" for n in range(15, 20)]
+
+    # The writer rotates: job.log becomes job.log.1 and a new job.log starts
+    os.rename(path, path + '.1')
+    write_lines(path, 20, 3)
+
+    older = read_log_tail(path, 5, before=page['cursor'], chunk_size=16)
+    assert older['lines'] == [f"line {n}" for n in range(10, 15)]
+
+def test_cursor_into_file_rotated_out_of_retention(tmp_path):
+    path = str(tmp_path / 'job.log')
+    write_lines(path, 0, 20)
+    page = read_log_tail(path, 5)
+
+    # Moved out of the backup chain (kept, so its inode is not reused by the new file)
+    os.rename(path, str(tmp_path / 'expired.log'))
+    write_lines(path, 20, 3)
+
+    assert read_log_tail(path, 5, before=page['cursor']) == {'lines': [], 'cursor': None}
+
+def test_missing_log_file(tmp_path):
+    assert read_log_tail(str(tmp_path / 'never.log'), 10) == {'lines': [], 'cursor': None}
+
+if __name__ == "__main__":
+    sys.exit(pytest.main([__file__, '-q']))
@@ -0,0 +1,218 @@
+"""
+Tracing
+Spans for job runs, items, SAP queries and MySQL statements with a local JSON-lines exporter
+
+Each sync run writes its spans to traces/<job>/<started>-<trace id>.jsonl, one
+JSON object per finished span, so no collector is needed. Parallel barcode
+workers append to their parent run's file.
+"""
+
+import os
+import json
+import time
+import uuid
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from datetime import datetime, timezone, timedelta
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AEST = timezone(timedelta(hours=10))
+
+TRACE_DIR = os.path.abspath(os.getenv('TRACE_DIR', 'traces'))
+
+_current_span = contextvars.ContextVar('current_span', default=None)
+_tracer = None
+
+def tracing_enabled():
+    """Check whether run tracing is turned on"""
+    return os.getenv('TRACING_ENABLED', 'true').lower() == 'true'
+
+class Span:
+    """
+    One timed operation within a run's trace
+    """
+    def __init__(self, trace_id, name, parent_id, attributes):
+        self.trace_id = trace_id
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = dict(attributes)
+        self.status = 'ok'
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration_ms = None
+
+    def set_attribute(self, key, value):
+        self.attributes[key] = value
+
+    def finish(self):
+        self.duration_ms = round((time.perf_counter() - self._started) * 1000, 3)
+
+    def to_dict(self):
+        return {
+            'trace_id': self.trace_id,
+            'span_id': self.span_id,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'start': datetime.fromtimestamp(self.start_time, AEST).isoformat(),
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'pid': os.getpid(),
+            'attributes': self.attributes
+        }
+
+class _NoopSpan:
+    """Stand-in yielded when no run is being traced"""
+    def set_attribute(self, key, value):
+        pass
+
+NOOP_SPAN = _NoopSpan()
+
+class RunTracer:
+    """
+    Exports the spans of one run to its JSON-lines file
+    """
+    def __init__(self, job_name, trace_id=None, path=None, root_parent_id=None):
+        self.job_name = job_name
+        self.trace_id = trace_id or uuid.uuid4().hex
+        self.root_parent_id = root_parent_id
+        if path is None:
+            started = datetime.now(AEST).strftime('%Y%m%d-%H%M%S-%f')
+            path = os.path.join(TRACE_DIR, job_name, f"{started}-{self.trace_id[:8]}.jsonl")
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # O_APPEND with one write per span keeps lines whole when worker processes share the file
+        self._fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_APPEND, 0o644)
+        self._lock = threading.Lock()
+
+    def export(self, span):
+        line = (json.dumps(span.to_dict(), default=str) + '\n').encode()
+        with self._lock:
+            if self._fd is not None:
+                os.write(self._fd, line)
+
+    def context(self):
+        """Trace context for continuing this trace in a worker process"""
+        current = _current_span.get()
+        return {
+            'job': self.job_name,
+            'trace_id': self.trace_id,
+            'path': self.path,
+            'parent_id': current.span_id if current else self.root_parent_id
+        }
+
+    def close(self):
+        with self._lock:
+            if self._fd is not None:
+                os.close(self._fd)
+                self._fd = None
+
+def start_run_trace(job_name, parent_context=None):
+    """
+    Start tracing a run (or continue a parent run's trace in a worker process)
+    Returns the tracer, or None when tracing is disabled
+    """
+    global _tracer
+    if not tracing_enabled():
+        _tracer = None
+        return None
+
+    try:
+        if parent_context:
+            _tracer = RunTracer(job_name, parent_context['trace_id'], parent_context['path'],
+                                parent_context.get('parent_id'))
+        else:
+            _tracer = RunTracer(job_name)
+    except OSError as e:
+        logger.warning(f"Tracing disabled for this run - cannot open trace file: {e}")
+        _tracer = None
+    return _tracer
+
+def end_run_trace(prune=True):
+    """
+    Finish the current run's trace and drop the oldest trace files beyond TRACE_RETENTION
+    """
+    global _tracer
+    tracer, _tracer = _tracer, None
+    if tracer is None:
+        return None
+    tracer.close()
+    if prune:
+        prune_traces(tracer.job_name)
+    return tracer
+
+def get_tracer():
+    """Current run's tracer, or None"""
+    return _tracer
+
+@contextmanager
+def span(name, **attributes):
+    """
+    Trace a block as a span of the current run (a no-op outside traced runs)
+    """
+    tracer = _tracer
+    if tracer is None:
+        yield NOOP_SPAN
+        return
+
+    parent = _current_span.get()
+    current = Span(tracer.trace_id, name, parent.span_id if parent else tracer.root_parent_id, attributes)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.status = 'error'
+        current.attributes['error'] = str(e)[:200]
+        raise
+    finally:
+        current.finish()
+        _current_span.reset(token)
+        tracer.export(current)
+
+def _trace_files(job_name):
+    directory = os.path.join(TRACE_DIR, job_name)
+    try:
+        return sorted(os.path.join(directory, name) for name in os.listdir(directory) if name.endswith('.jsonl'))
+    except FileNotFoundError:
+        return []
+
+def prune_traces(job_name):
+    """Keep only the newest TRACE_RETENTION trace files for a job"""
+    retention = max(1, int(os.getenv('TRACE_RETENTION', 20)))
+    for path in _trace_files(job_name)[:-retention]:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+def slowest_spans(job_name, limit=20):
+    """
+    Slowest spans of the job's most recent trace
+    """
+    files = _trace_files(job_name)
+    if not files:
+        return {'trace_file': None, 'trace_id': None, 'span_count': 0, 'spans': []}
+
+    spans = []
+    with open(files[-1]) as f:
+        for line in f:
+            try:
+                spans.append(json.loads(line))
+            except ValueError:
+                # Partially written line from a run still in progress
+                continue
+
+    spans.sort(key=lambda entry: entry.get('duration_ms') or 0, reverse=True)
+    return {
+        'trace_file': os.path.basename(files[-1]),
+        'trace_id': spans[0]['trace_id'] if spans else None,
+        'span_count': len(spans),
+        'spans': spans[:limit]
+    }
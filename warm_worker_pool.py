@@ -0,0 +1,301 @@
+"""
+Warm Worker Pool
+Pre-forked job runners so scheduled runs start with the sync modules already imported
+
+A fork server process imports the sync modules once and keeps a few idle
+children forked from it. Each run is handed to one idle child (which runs
+exactly one job and exits), so runs stay process-isolated but skip
+interpreter startup and imports.
+"""
+
+import os
+import sys
+import json
+import errno
+import select
+import signal
+import socket
+import atexit
+import logging
+import threading
+import traceback
+import subprocess
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Modules imported once in the fork server; every worker forked from it starts warm
+PRELOAD_MODULES = ['barcode_sync', 'serial_number_sync', 'staff_sync', 'job_chain']
+
+MAX_MESSAGE_SIZE = 65536
+
+def _run_task(task, output_fd):
+    """
+    Run one job inside a forked worker and return its exit code
+    """
+    # Send everything the job prints (including tracebacks) to the manager
+    os.dup2(output_fd, 1)
+    os.dup2(output_fd, 2)
+    os.close(output_fd)
+    sys.stdout.reconfigure(line_buffering=True)
+    sys.stderr.reconfigure(line_buffering=True)
+
+    try:
+        module_name = task['module']
+        # Per-run environment, e.g. a profiling request from JobManager
+        os.environ.update(task.get('env') or {})
+        module = sys.modules.get(module_name) or __import__(module_name)
+        sys.argv = [f'{module_name}.py'] + list(task['argv'])
+        return module.main(list(task['argv'])) or 0
+    except SystemExit as e:
+        return e.code if isinstance(e.code, int) else (0 if e.code is None else 1)
+    except BaseException:
+        traceback.print_exc()
+        return 1
+    finally:
+        # The worker leaves with os._exit, so drain the log queue before it goes
+        from sync_logging import shutdown_logging
+        shutdown_logging()
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+def _idle_worker(task_sock):
+    """
+    Body of a pre-forked worker - wait for one task, run it, exit
+    """
+    try:
+        message, fds, _, _ = socket.recv_fds(task_sock, MAX_MESSAGE_SIZE, 1)
+    except OSError:
+        os._exit(0)
+    task_sock.close()
+
+    if not message or not fds:
+        # Fork server released this worker without using it
+        os._exit(0)
+
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    os._exit(_run_task(json.loads(message), fds[0]))
+
+def _serve(control_fd, pool_size):
+    """
+    Fork server main loop
+    Receives run requests from JobManager, hands them to idle workers and reports exit codes
+    """
+    control = socket.socket(fileno=control_fd)
+
+    for module_name in PRELOAD_MODULES:
+        try:
+            __import__(module_name)
+        except Exception as e:
+            print(f"Warm pool could not preload {module_name}: {e}", file=sys.stderr, flush=True)
+
+    idle = []      # [(pid, task_sock)]
+    running = {}   # pid -> status fd
+
+    def prefork():
+        server_end, worker_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        pid = os.fork()
+        if pid == 0:
+            # Worker: drop every descriptor that belongs to the server
+            control.close()
+            server_end.close()
+            for _, other_sock in idle:
+                other_sock.close()
+            for status_fd in running.values():
+                os.close(status_fd)
+            _idle_worker(worker_end)
+        worker_end.close()
+        idle.append((pid, server_end))
+
+    def reap():
+        while True:
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                return
+            if pid == 0:
+                return
+            exit_code = os.waitstatus_to_exitcode(status)
+            status_fd = running.pop(pid, None)
+            if status_fd is not None:
+                try:
+                    os.write(status_fd, f"{exit_code}\n".encode())
+                except OSError:
+                    pass
+                os.close(status_fd)
+            idle[:] = [(p, s) for p, s in idle if p != pid]
+
+    while len(idle) < pool_size:
+        prefork()
+
+    while True:
+        reap()
+        while len(idle) < pool_size:
+            prefork()
+
+        try:
+            readable, _, _ = select.select([control], [], [], 0.2)
+        except InterruptedError:
+            continue
+        if not readable:
+            continue
+
+        message, fds, _, _ = socket.recv_fds(control, MAX_MESSAGE_SIZE, 2)
+        if not message:
+            # JobManager went away - release idle workers and exit
+            for pid, task_sock in idle:
+                task_sock.close()
+            return
+
+        output_fd, status_fd = fds
+        pid, task_sock = idle.pop(0) if idle else (None, None)
+        if pid is None:
+            prefork()
+            pid, task_sock = idle.pop(0)
+
+        try:
+            socket.send_fds(task_sock, [message], [output_fd])
+        finally:
+            task_sock.close()
+            os.close(output_fd)
+
+        running[pid] = status_fd
+        os.write(status_fd, f"{pid}\n".encode())
+
+class WarmRun:
+    """
+    Handle for a job run dispatched to a warm worker
+    Mirrors the parts of subprocess.Popen that JobManager uses
+    """
+    def __init__(self, pid, output_fd, status_fd):
+        self.pid = pid
+        self.returncode = None
+        self.stdout = os.fdopen(output_fd, 'r', buffering=1, errors='replace')
+        self._status = os.fdopen(status_fd, 'r')
+        self._status_lock = threading.Lock()
+
+    def poll(self):
+        return self._wait_for_exit(0)
+
+    def wait(self, timeout=None):
+        if self._wait_for_exit(timeout) is None:
+            raise subprocess.TimeoutExpired(f'warm worker {self.pid}', timeout)
+        return self.returncode
+
+    def _wait_for_exit(self, timeout):
+        if self.returncode is None:
+            try:
+                readable, _, _ = select.select([self._status], [], [], timeout)
+            except (ValueError, OSError):
+                # Another waiter already read the exit code and closed the pipe
+                readable = []
+            if readable:
+                # The reader thread and the hung-run watchdog may both get here
+                with self._status_lock:
+                    if self.returncode is None:
+                        line = self._status.readline()
+                        self.returncode = int(line) if line.strip() else -signal.SIGKILL
+                        self._status.close()
+        return self.returncode
+
+    def send_signal(self, sig):
+        if self.returncode is not None:
+            return
+        try:
+            os.kill(self.pid, sig)
+        except OSError as e:
+            if e.errno != errno.ESRCH:
+                raise
+
+    def terminate(self):
+        self.send_signal(signal.SIGTERM)
+
+    def kill(self):
+        self.send_signal(signal.SIGKILL)
+
+class WarmWorkerPool:
+    """
+    Client side of the fork server, used by JobManager to dispatch runs
+    """
+    def __init__(self, size=None):
+        self.size = size if size is not None else int(os.getenv('WARM_POOL_SIZE', 2))
+        self._server = None
+        self._control = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Start the fork server (it preloads the sync modules and pre-forks idle workers)"""
+        control, server_end = socket.socketpair(socket.AF_UNIX, socket.SOCK_STREAM)
+        self._server = subprocess.Popen(
+            [sys.executable, os.path.abspath(__file__), '--serve',
+             str(server_end.fileno()), str(self.size)],
+            pass_fds=(server_end.fileno(),),
+            cwd=os.getcwd()
+        )
+        server_end.close()
+        self._control = control
+        logger.info(f"Warm worker pool started (fork server PID {self._server.pid}, {self.size} idle worker(s))")
+
+    def run(self, module_name, argv, env=None):
+        """Dispatch a job run to an idle worker and return a Popen-like handle"""
+        with self._lock:
+            if self._server is None or self._server.poll() is not None:
+                self.start()
+
+            output_r, output_w = os.pipe()
+            status_r, status_w = os.pipe()
+            try:
+                message = json.dumps({'module': module_name, 'argv': list(argv), 'env': env or {}}).encode()
+                socket.send_fds(self._control, [message], [output_w, status_w])
+            finally:
+                os.close(output_w)
+                os.close(status_w)
+
+            # The fork server answers with the worker's PID before anything else
+            pid_line = b''
+            while not pid_line.endswith(b'\n'):
+                chunk = os.read(status_r, 1)
+                if not chunk:
+                    os.close(output_r)
+                    os.close(status_r)
+                    raise RuntimeError("Warm worker pool fork server exited")
+                pid_line += chunk
+
+        return WarmRun(int(pid_line), output_r, status_r)
+
+    def shutdown(self):
+        """Stop the fork server and release its idle workers"""
+        with self._lock:
+            if self._control:
+                self._control.close()
+                self._control = None
+            if self._server and self._server.poll() is None:
+                try:
+                    self._server.wait(timeout=5)
+                except subprocess.TimeoutExpired:
+                    self._server.kill()
+
+_warm_pool = None
+_warm_pool_lock = threading.Lock()
+
+def get_warm_pool():
+    """Get the process-wide warm worker pool, starting it on first use"""
+    global _warm_pool
+    with _warm_pool_lock:
+        if _warm_pool is None:
+            _warm_pool = WarmWorkerPool()
+            _warm_pool.start()
+            atexit.register(_warm_pool.shutdown)
+        return _warm_pool
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 3 and sys.argv[1] == '--serve':
+        size = int(sys.argv[3]) if len(sys.argv) > 3 else 2
+        _serve(int(sys.argv[2]), size)
+    else:
+        print("Usage: warm_worker_pool.py --serve <control_fd> [pool_size]")
+        sys.exit(1)